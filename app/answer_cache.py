@@ -0,0 +1,254 @@
+"""
+Cache de respostas completas para perguntas recorrentes de suporte
+("Como configurar o chatbot?", "Como configurar PIX?")
+
+Uma pergunta muito parecida (cosseno do embedding acima do limiar) com outra
+já respondida recebe a mesma resposta em milissegundos, sem chamar o Mistral
+(zero tokens). A chave é o embedding da pergunta normalizada + a versão da
+coleção klona_knowledge + o hash das instruções do agente: reprocessar os PDFs
+ou mudar as instruções invalida o cache sozinho.
+
+Só entram respostas não personalizadas, apoiadas apenas no RAG:
+- primeiro turno da sessão (sem histórico, resumo ou memórias do usuário no prompt)
+- sem ferramentas além da busca na base de conhecimento (API, memória)
+- pergunta sem referências pessoais ("meu", "minha", "sou", ...)
+E só são servidas em turnos nas mesmas condições (sem histórico, resumo ou memórias).
+
+Limpeza: POST /cache/answers/purge (tudo, em todos os workers) ou
+POST /cache/answers/purge?question=... (perguntas parecidas, neste worker)
+"""
+
+import hashlib
+import os
+import re
+from dataclasses import dataclass
+from typing import Any, Optional
+
+import numpy as np
+from agno.models.message import Message
+from agno.models.response import ModelResponse
+from agno.utils.log import log_debug
+
+from context_budget import _MEMORIES_RE, _REFERENCES_RE, _SUMMARY_RE, BudgetedMistralChat
+from embeddings import normalize_query
+from knowledge_base import collection_version, manifest_path
+from retrieval_cache import SemanticResultCache, _unit_vector
+
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE", "on").lower() not in ("0", "off", "false", "no")
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.97"))
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", str(6 * 3600)))
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "1024"))
+# Perguntas curtas ("e aí?", "obrigado") dependem do contexto da conversa
+ANSWER_CACHE_MIN_CHARS = int(os.getenv("ANSWER_CACHE_MIN_CHARS", "12"))
+
+# Única ferramenta permitida numa resposta cacheável
+KNOWLEDGE_TOOLS = {"search_knowledge_base"}
+
+_PERSONAL_RE = re.compile(
+    r"\b(eu|meu|meus|minha|minhas|me|mim|comigo|sou|estou|estava|nosso|nossa|nossos|nossas)\b", re.I
+)
+
+
+def purge_stamp_path():
+    """Arquivo tocado pela limpeza total (ao lado do manifesto da coleção)"""
+    return manifest_path().with_name("answer_cache.purge")
+
+
+def purge_stamp():
+    """Momento da última limpeza total; cada worker compara a cada consulta"""
+    try:
+        return purge_stamp_path().stat().st_mtime_ns
+    except FileNotFoundError:
+        return 0
+
+
+def cache_version():
+    return (collection_version(), purge_stamp())
+
+
+def is_personal(question):
+    return bool(_PERSONAL_RE.search(question))
+
+
+def instructions_hash(messages, model_id=None):
+    """Hash do prompt de sistema sem as partes de cada usuário (memórias e resumo)"""
+    system = next((m for m in messages if m.role == "system"), None)
+    content = system.content if system is not None and isinstance(system.content, str) else ""
+    content = " ".join(_SUMMARY_RE.sub("", _MEMORIES_RE.sub("", content)).split())
+    return hashlib.sha1(f"{model_id}\n{content}".encode("utf-8")).hexdigest()[:16]
+
+
+class AnswerCache(SemanticResultCache):
+    """SemanticResultCache de respostas finais, com limpeza explícita"""
+
+    def __init__(self, threshold=ANSWER_CACHE_THRESHOLD, max_entries=ANSWER_CACHE_SIZE, ttl_seconds=ANSWER_CACHE_TTL):
+        super().__init__(threshold=threshold, max_entries=max_entries, ttl_seconds=ttl_seconds)
+        self.stored = 0
+        self.saved_tokens = 0
+
+    def get(self, embedding, instructions, version):
+        answer = self.lookup(embedding, None, {"instructions": instructions}, version)
+        if answer is not None:
+            self.saved_tokens += answer.get("tokens", 0)
+        return answer
+
+    def put(self, embedding, instructions, version, answer):
+        self.store(embedding, None, {"instructions": instructions}, version, answer)
+        self.stored += 1
+
+    def purge(self, embedding=None):
+        """Remover respostas parecidas com a pergunta (ou todas); retorna quantas"""
+        with self._lock:
+            removed = len(self._entries)
+            if embedding is None:
+                self._entries = []
+            else:
+                query = _unit_vector(embedding)
+                self._entries = [e for e in self._entries if float(np.dot(e["vector"], query)) < self.threshold]
+                removed -= len(self._entries)
+            self._matrix = None
+        return removed
+
+    def purge_all_workers(self):
+        """Limpeza total: toca o arquivo de controle (os outros workers limpam na próxima consulta)"""
+        path = purge_stamp_path()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.touch()
+        return self.purge()
+
+    def stats(self):
+        stats = super().stats()
+        stats.update(stored=self.stored, saved_tokens=self.saved_tokens, ttl_seconds=self.ttl_seconds)
+        return stats
+
+
+# Cache compartilhado por todas as requisições do processo (AgentOS)
+answer_cache = AnswerCache()
+
+
+@dataclass
+class CachedAnswerMistralChat(BudgetedMistralChat):
+    """BudgetedMistralChat que responde perguntas recorrentes pelo AnswerCache"""
+
+    answer_cache: Optional[Any] = None
+    # Mesmo embedder da busca: a pergunta já foi vetorizada pelo RAG (cache de embeddings)
+    embedder: Optional[Any] = None
+
+    def _question(self, kwargs):
+        """Pergunta do turno, se ele puder usar o cache (senão None)"""
+        run_response = kwargs.get("run_response")
+        if not ANSWER_CACHE_ENABLED or self.embedder is None or run_response is None:
+            return None
+        if kwargs.get("response_format") is not None or run_response.input is None:
+            return None
+        run_input = run_response.input
+        if not isinstance(run_input.input_content, str) or run_input.images or run_input.files:
+            return None
+        question = normalize_query(run_input.input_content)
+        if len(question) < ANSWER_CACHE_MIN_CHARS or is_personal(question):
+            return None
+        return question
+
+    def _cache(self):
+        return self.answer_cache if self.answer_cache is not None else answer_cache
+
+    @staticmethod
+    def _without_context(messages):
+        """Turno sem histórico, resumo ou memórias no prompt (vale para guardar e para servir)"""
+        system = next((m for m in messages if m.role == "system"), None)
+        system_content = system.content if system is not None and isinstance(system.content, str) else ""
+        if _MEMORIES_RE.search(system_content) or _SUMMARY_RE.search(system_content):
+            return False
+        return not any(getattr(m, "from_history", False) for m in messages)
+
+    def _lookup(self, messages, kwargs, question, embedding):
+        # Uma pergunta genérica no meio da conversa depende do que veio antes
+        if not embedding or not self._without_context(messages):
+            return None
+        answer = self._cache().get(embedding, instructions_hash(messages, self.id), cache_version())
+        if answer is None:
+            return None
+        log_debug(f"Resposta em cache para: {question!r}")
+        messages.append(Message(role=self.assistant_message_role, content=answer["content"]))
+        run_response = kwargs["run_response"]
+        run_response.metadata = dict(run_response.metadata or {}, answer_cache="hit")
+        return answer["content"]
+
+    def _store(self, messages, kwargs, embedding, version):
+        """Guardar a resposta gerada se o turno foi só RAG e não personalizado"""
+        if not embedding or not self._without_context(messages):
+            return
+
+        user_index = max((i for i, m in enumerate(messages) if m.role == "user"), default=None)
+        if user_index is None:
+            return
+        user_content = messages[user_index].content if isinstance(messages[user_index].content, str) else ""
+        tools_used = {
+            (call.get("function") or {}).get("name")
+            for m in messages[user_index + 1:]
+            for call in (m.tool_calls or [])
+        }
+        if not tools_used <= KNOWLEDGE_TOOLS:
+            return
+        if not tools_used and not _REFERENCES_RE.search(user_content):
+            return
+
+        final = messages[-1]
+        if final.role != self.assistant_message_role or not isinstance(final.content, str) or not final.content.strip():
+            return
+        usage = kwargs["run_response"].metrics
+        tokens = getattr(usage, "total_tokens", 0) or 0
+        self._cache().put(embedding, instructions_hash(messages, self.id), version,
+                          {"content": final.content, "tokens": tokens})
+
+    def response(self, messages, *args, **kwargs):
+        question = self._question(kwargs)
+        if question is None:
+            return super().response(messages, *args, **kwargs)
+        embedding, version = self.embedder.get_embedding(question), cache_version()
+        content = self._lookup(messages, kwargs, question, embedding)
+        if content is not None:
+            return ModelResponse(role=self.assistant_message_role, content=content)
+        model_response = super().response(messages, *args, **kwargs)
+        self._store(messages, kwargs, embedding, version)
+        return model_response
+
+    async def aresponse(self, messages, *args, **kwargs):
+        question = self._question(kwargs)
+        if question is None:
+            return await super().aresponse(messages, *args, **kwargs)
+        embedding, version = await self.embedder.async_get_embedding(question), cache_version()
+        content = self._lookup(messages, kwargs, question, embedding)
+        if content is not None:
+            return ModelResponse(role=self.assistant_message_role, content=content)
+        model_response = await super().aresponse(messages, *args, **kwargs)
+        self._store(messages, kwargs, embedding, version)
+        return model_response
+
+    def response_stream(self, messages, *args, **kwargs):
+        question = self._question(kwargs)
+        if question is None:
+            yield from super().response_stream(messages, *args, **kwargs)
+            return
+        embedding, version = self.embedder.get_embedding(question), cache_version()
+        content = self._lookup(messages, kwargs, question, embedding)
+        if content is not None:
+            yield ModelResponse(role=self.assistant_message_role, content=content)
+            return
+        yield from super().response_stream(messages, *args, **kwargs)
+        self._store(messages, kwargs, embedding, version)
+
+    async def aresponse_stream(self, messages, *args, **kwargs):
+        question = self._question(kwargs)
+        if question is None:
+            async for event in super().aresponse_stream(messages, *args, **kwargs):
+                yield event
+            return
+        embedding, version = await self.embedder.async_get_embedding(question), cache_version()
+        content = self._lookup(messages, kwargs, question, embedding)
+        if content is not None:
+            yield ModelResponse(role=self.assistant_message_role, content=content)
+            return
+        async for event in super().aresponse_stream(messages, *args, **kwargs):
+            yield event
+        self._store(messages, kwargs, embedding, version)
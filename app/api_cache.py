@@ -0,0 +1,345 @@
+"""
+Camada HTTP das ferramentas de API (CustomApiTools) com pool e cache
+- uma requests.Session por processo: conexões keep-alive reaproveitadas
+  entre chamadas e conversas (pool de API_POOL_SIZE conexões por host)
+- cache dos GETs por endpoint, com TTL próprio (API_CACHE_TTLS="/users=300,/posts=60")
+  e respeitando o servidor: Cache-Control no-store/no-cache/max-age e
+  revalidação com ETag/Last-Modified (resposta 304 renova a entrada)
+- single-flight: chamadas idênticas simultâneas fazem uma única requisição
+- POST/PUT/PATCH/DELETE num endpoint invalidam os GETs em cache dele e da
+  coleção acima (PUT /users/1 invalida GET /users/1 e GET /users)
+- a resposta devolvida ao modelo passa por tool_output.py (campos, página, teto de bytes)
+
+Testes contra um servidor stub local: python -m unittest test_api_cache
+Manual, com o http.server (responde 304 a If-Modified-Since):
+    mkdir -p /tmp/stub && echo '[{"id": 1}]' > /tmp/stub/users && python -m http.server 8765 -d /tmp/stub
+    API_BASE_URL=http://localhost:8765 python klona_agent.py
+"""
+
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from email.utils import parsedate_to_datetime
+from hashlib import sha1
+from typing import Any, Dict, List, Literal, Optional
+from urllib.parse import urlparse
+
+import requests
+from agno.tools.api import CustomApiTools
+from agno.utils.log import log_debug, log_error
+from requests.adapters import HTTPAdapter
+
+from tool_output import encode, fields_for, shape, shape_headers
+
+API_BASE_URL = os.getenv("API_BASE_URL", "https://jsonplaceholder.typicode.com")
+API_POOL_SIZE = int(os.getenv("API_POOL_SIZE", "20"))
+API_CACHE_TTL = float(os.getenv("API_CACHE_TTL", "60"))
+API_CACHE_SIZE = int(os.getenv("API_CACHE_SIZE", "256"))
+# TTL por endpoint (prefixo do caminho): "/users=300,/posts=60"
+API_CACHE_TTLS = os.getenv("API_CACHE_TTLS", "")
+
+_MAX_AGE_RE = re.compile(r"(?:s-)?max-age=(\d+)")
+
+
+def parse_endpoint_ttls(value):
+    """ "/users=300,/posts=60" -> {"/users": 300.0, "/posts": 60.0}"""
+    ttls = {}
+    for item in (value or "").split(","):
+        if "=" in item:
+            endpoint, ttl = item.split("=", 1)
+            ttls["/" + endpoint.strip().strip("/")] = float(ttl)
+    return ttls
+
+
+def freshness(headers, default_ttl):
+    """Segundos de validade pela resposta (None = não guardar)"""
+    cache_control = headers.get("Cache-Control", "").lower()
+    if "no-store" in cache_control:
+        return None
+    if "no-cache" in cache_control:
+        return 0.0
+    match = _MAX_AGE_RE.search(cache_control)
+    if match:
+        return float(match.group(1))
+    if "Expires" in headers:
+        try:
+            return max(0.0, parsedate_to_datetime(headers["Expires"]).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return 0.0
+    return default_ttl
+
+
+class HttpResponseCache:
+    """LRU de respostas GET com validade, validadores (ETag) e single-flight"""
+
+    def __init__(self, max_entries=API_CACHE_SIZE, default_ttl=API_CACHE_TTL, endpoint_ttls=None):
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self.endpoint_ttls = parse_endpoint_ttls(API_CACHE_TTLS) if endpoint_ttls is None else endpoint_ttls
+        self._entries = OrderedDict()  # chave -> entrada
+        self._inflight = {}  # chave -> threading.Event
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.revalidated = 0
+        self.coalesced = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def key(url, params, headers):
+        vary = json.dumps([url, params or {}, sorted((headers or {}).items())], sort_keys=True, default=str)
+        return sha1(vary.encode("utf-8")).hexdigest()
+
+    def ttl_for(self, path):
+        """TTL do endpoint: o prefixo configurado mais longo que casa com o caminho"""
+        path = "/" + path.strip("/")
+        matches = [prefix for prefix in self.endpoint_ttls if path == prefix or path.startswith(prefix + "/")]
+        return self.endpoint_ttls[max(matches, key=len)] if matches else self.default_ttl
+
+    def get(self, key):
+        """(entrada em cache ou None, fresca); conta o acerto quando fresca"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None, False
+            self._entries.move_to_end(key)
+            fresh = entry["expires_at"] > time.monotonic()
+            if fresh:
+                self.hits += 1
+            return entry, fresh
+
+    def record_miss(self):
+        with self._lock:
+            self.misses += 1
+
+    def put(self, key, path, status_code, headers, text, ttl):
+        entry = {
+            "path": "/" + path.strip("/"),
+            "status_code": status_code,
+            "headers": dict(headers),
+            "text": text,
+            "etag": headers.get("ETag"),
+            "last_modified": headers.get("Last-Modified"),
+            "expires_at": time.monotonic() + ttl,
+        }
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return entry
+
+    def refresh(self, entry, headers, ttl):
+        """Resposta 304: a entrada continua valendo por mais um TTL"""
+        with self._lock:
+            entry["expires_at"] = time.monotonic() + ttl
+            entry["headers"].update({k: v for k, v in headers.items() if k in ("ETag", "Cache-Control", "Date")})
+            self.revalidated += 1
+
+    def invalidate(self, path=None):
+        """Esquecer os GETs de um endpoint, dos caminhos abaixo dele e das coleções acima, ou todos
+
+        Uma escrita em /users/1 muda também a listagem GET /users.
+        """
+        with self._lock:
+            self.invalidations += 1
+            if path is None:
+                self._entries.clear()
+                return
+            path = "/" + path.strip("/")
+            segments = path.strip("/").split("/")
+            parents = {"/" + "/".join(segments[:i]) for i in range(1, len(segments))}
+            stale = [
+                k for k, e in self._entries.items()
+                if e["path"] == path or e["path"].startswith(path + "/") or e["path"] in parents
+            ]
+            for key in stale:
+                del self._entries[key]
+
+    def single_flight(self, key, fetch):
+        """Executar fetch() uma vez por chave; chamadas simultâneas esperam o resultado"""
+        with self._lock:
+            event = self._inflight.get(key)
+            leader = event is None
+            if leader:
+                event = self._inflight[key] = threading.Event()
+                event.result = None
+                event.error = None
+            else:
+                self.coalesced += 1
+        if not leader:
+            event.wait()
+            if event.error is not None:
+                raise event.error
+            return event.result
+        try:
+            event.result = fetch()
+            return event.result
+        except Exception as e:
+            event.error = e
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            event.set()
+
+    def stats(self):
+        with self._lock:
+            size = len(self._entries)
+            hits, misses, revalidated = self.hits, self.misses, self.revalidated
+            coalesced, invalidations = self.coalesced, self.invalidations
+        total = hits + misses
+        return {
+            "size": size,
+            "max_entries": self.max_entries,
+            "default_ttl": self.default_ttl,
+            "endpoint_ttls": self.endpoint_ttls,
+            "hits": hits,
+            "misses": misses,
+            "revalidated": revalidated,
+            "coalesced": coalesced,
+            "invalidations": invalidations,
+            "hit_rate": round(hits / total, 4) if total else 0.0,
+        }
+
+
+# Cache compartilhado por todas as conversas do processo (AgentOS)
+api_response_cache = HttpResponseCache()
+
+
+def pooled_session(pool_size=API_POOL_SIZE):
+    """requests.Session com pool keep-alive (uma por processo)"""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+class CachedApiTools(CustomApiTools):
+    """CustomApiTools com conexões reaproveitadas e cache dos GETs"""
+
+    def __init__(self, *args, pool_size=API_POOL_SIZE, cache=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.session = pooled_session(pool_size)
+        self.cache = cache if cache is not None else api_response_cache
+
+    def _url(self, endpoint):
+        if self.base_url:
+            return f"{self.base_url.rstrip('/')}/{endpoint.lstrip('/')}"
+        return endpoint
+
+    def _send(self, method, url, headers, **kwargs):
+        return self.session.request(
+            method=method,
+            url=url,
+            headers=headers,
+            auth=self._get_auth(),
+            verify=self.verify_ssl,
+            timeout=self.timeout,
+            **kwargs,
+        )
+
+    def _cached_get(self, endpoint, url, params, headers):
+        """(status, headers, texto, origem) de um GET, passando pelo cache"""
+        key = self.cache.key(url, params, headers)
+        entry, fresh = self.cache.get(key)
+        if fresh:
+            return entry["status_code"], entry["headers"], entry["text"], "HIT"
+
+        def fetch():
+            conditional = dict(headers)
+            if entry is not None and entry["etag"]:
+                conditional["If-None-Match"] = entry["etag"]
+            if entry is not None and entry["last_modified"]:
+                conditional["If-Modified-Since"] = entry["last_modified"]
+            response = self._send("GET", url, conditional, params=params)
+            ttl = freshness(response.headers, self.cache.ttl_for(endpoint))
+            if response.status_code == 304 and entry is not None:
+                self.cache.refresh(entry, response.headers, ttl or 0.0)
+                return entry["status_code"], entry["headers"], entry["text"], "REVALIDATED"
+            self.cache.record_miss()
+            if response.ok and ttl is not None:
+                self.cache.put(key, endpoint, response.status_code, response.headers, response.text, ttl)
+            return response.status_code, dict(response.headers), response.text, "MISS"
+
+        return self.cache.single_flight(key, fetch)
+
+    def make_request(
+        self,
+        endpoint: str,
+        method: Literal["GET", "POST", "PUT", "DELETE", "PATCH"] = "GET",
+        params: Optional[Dict[str, Any]] = None,
+        data: Optional[Dict[str, Any]] = None,
+        headers: Optional[Dict[str, str]] = None,
+        json_data: Optional[Dict[str, Any]] = None,
+        fields: Optional[List[str]] = None,
+        offset: int = 0,
+        limit: Optional[int] = None,
+    ) -> str:
+        """Make an HTTP request to the API.
+
+        Lists are returned one page at a time as {"columns": [...], "rows": [[...]]};
+        "page" tells the total and the next_offset to request the next page.
+
+        Args:
+            method (str): HTTP method (GET, POST, PUT, DELETE, PATCH)
+            endpoint (str): API endpoint (will be combined with base_url if set)
+            params (Optional[Dict[str, Any]]): Query parameters
+            data (Optional[Dict[str, Any]]): Form data to send
+            headers (Optional[Dict[str, str]]): Additional headers
+            json_data (Optional[Dict[str, Any]]): JSON data to send
+            fields (Optional[List[str]]): Only return these fields (nested ones as "address.city")
+            offset (int): Index of the first list item to return (for the next page)
+            limit (Optional[int]): Maximum number of list items to return
+
+        Returns:
+            str: JSON string containing response data or error message
+        """
+        try:
+            url = self._url(endpoint)
+            request_headers = self._get_headers(headers, include_api_key=bool(self.base_url))
+            path = urlparse(endpoint).path
+
+            if method == "GET" and data is None and json_data is None:
+                status_code, response_headers, text, origin = self._cached_get(path, url, params, request_headers)
+            else:
+                log_debug(f"Making {method} request to {url}")
+                response = self._send(method, url, request_headers, params=params, data=data, json=json_data)
+                status_code, response_headers, text, origin = response.status_code, dict(response.headers), response.text, "BYPASS"
+                # Escrita no endpoint: os GETs em cache dele ficaram velhos
+                self.cache.invalidate(path)
+            log_debug(f"{method} {url}: {status_code} ({origin})")
+
+            try:
+                response_data = json.loads(text)
+            except json.JSONDecodeError:
+                response_data = {"text": text}
+
+            # Só o que cabe no contexto: campos pedidos, uma página, teto de bytes (tool_output.py)
+            shaped, page = shape(response_data, fields=fields or fields_for(path), offset=offset, limit=limit)
+            result = {
+                "status_code": status_code,
+                "headers": shape_headers(dict(response_headers, **{"X-Cache": origin})),
+                "data": shaped,
+            }
+            if page is not None:
+                result["page"] = page
+
+            if status_code >= 400:
+                log_error(f"Request failed with status {status_code}: {text[:500]}")
+                result["error"] = "Request failed"
+
+            return encode(result)
+
+        except requests.exceptions.RequestException as e:
+            error_message = f"Request failed: {str(e)}"
+            log_error(error_message)
+            return json.dumps({"error": error_message}, indent=2)
+        except Exception as e:
+            error_message = f"Unexpected error: {str(e)}"
+            log_error(error_message)
+            return json.dumps({"error": error_message}, indent=2)
@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+"""
+Benchmark dos backends do embedder: torch (sentence-transformers) x ONNX (int8/fp32)
+- Latência por pergunta (p50/p95), vazão em lote, tempo de carga e memória (RSS)
+- Concordância dos vetores com o torch (cosseno) e recall@k das buscas contra
+  os chunks embedados pelo torch (= coleção klona_knowledge já existente)
+
+Cada backend roda num processo separado, para o RSS de um não contaminar o outro.
+
+Uso:
+    cd app && python benchmark_embedder.py [--backends torch,onnx,onnx-fp32] [--k 5]
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+if sys.platform == "win32":
+    sys.stdout.reconfigure(encoding='utf-8')
+    sys.stderr.reconfigure(encoding='utf-8')
+
+import numpy as np
+
+# Perguntas típicas dos usuários (ver instruções do agente)
+QUERIES = [
+    "Como configurar o chatbot?",
+    "Como criar usuários?",
+    "Como configurar PIX para recebimento?",
+    "Como ativar a autenticação de dois fatores?",
+    "Quais permissões tem cada tipo de usuário?",
+    "Como usar os marcadores?",
+    "Configurar PIX no Itaú",
+    "Recebimento com PIX Getnet",
+    "Esqueci minha senha, como faço login?",
+    "Como editar as mensagens do chatbot Asksuite?",
+    "O que são os extras e funcionalidades avançadas?",
+    "Como desativar um usuário?",
+]
+
+# backend -> variáveis de ambiente do processo filho
+BACKENDS = {
+    "torch": {"EMBEDDER_BACKEND": "torch"},
+    "onnx": {"EMBEDDER_BACKEND": "onnx", "ONNX_QUANTIZED": "true"},
+    "onnx-fp32": {"EMBEDDER_BACKEND": "onnx", "ONNX_QUANTIZED": "false"},
+}
+
+
+def load_documents(max_chunks):
+    """Chunks dos PDFs da pasta docs (os mesmos que vão para a coleção)"""
+    from ingestion import read_pdf_chunks
+
+    texts = []
+    for pdf_file in sorted(Path("../docs").glob("*.pdf")):
+        texts.extend(content for _, content, _ in read_pdf_chunks(pdf_file))
+        if len(texts) >= max_chunks:
+            break
+    return texts[:max_chunks]
+
+
+def peak_rss_mb():
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux informa em KB, macOS em bytes
+    return round(peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024, 1)
+
+
+def run_child(out_dir, docs_file):
+    """Processo filho: carrega um backend, mede e grava os vetores"""
+    from embeddings import embed_texts
+    from knowledge_base import build_embedder
+
+    documents = json.loads(Path(docs_file).read_text(encoding="utf-8"))
+
+    start = time.perf_counter()
+    embedder = build_embedder()
+    embedder.get_embedding("aquecimento")
+    load_seconds = time.perf_counter() - start
+
+    latencies = []
+    query_vectors = []
+    for _ in range(3):
+        for query in QUERIES:
+            start = time.perf_counter()
+            vector = embedder.get_embedding(query)
+            latencies.append((time.perf_counter() - start) * 1000)
+            if len(query_vectors) < len(QUERIES):
+                query_vectors.append(vector)
+
+    start = time.perf_counter()
+    doc_vectors = embed_texts(embedder, documents)
+    batch_seconds = time.perf_counter() - start
+
+    np.save(Path(out_dir) / "queries.npy", np.asarray(query_vectors, dtype=np.float32))
+    np.save(Path(out_dir) / "documents.npy", doc_vectors)
+
+    latencies.sort()
+    print(json.dumps({
+        "load_seconds": round(load_seconds, 3),
+        "query_ms_p50": round(latencies[len(latencies) // 2], 2),
+        "query_ms_p95": round(latencies[int(len(latencies) * 0.95)], 2),
+        "docs_per_second": round(len(documents) / batch_seconds, 1) if batch_seconds else None,
+        "peak_rss_mb": peak_rss_mb(),
+    }))
+
+
+def normalize(matrix):
+    return matrix / np.clip(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12, None)
+
+
+def top_k(queries, documents, k):
+    scores = normalize(queries) @ normalize(documents).T
+    return np.argsort(-scores, axis=1)[:, :k]
+
+
+def recall_at_k(expected, found):
+    hits = sum(len(set(e) & set(f)) for e, f in zip(expected, found))
+    return hits / expected.size
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Comparar os backends do embedder (torch x ONNX)")
+    parser.add_argument("--backends", default="torch,onnx", help="Lista separada por vírgula: " + ", ".join(BACKENDS))
+    parser.add_argument("--k", type=int, default=5, help="Top-k para o recall")
+    parser.add_argument("--max-chunks", type=int, default=500, help="Chunks dos PDFs usados como documentos")
+    parser.add_argument("--child", nargs=2, metavar=("OUT_DIR", "DOCS_FILE"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(*args.child)
+        return
+
+    backends = [name.strip() for name in args.backends.split(",") if name.strip()]
+    if "torch" not in backends:
+        backends.insert(0, "torch")  # Referência para concordância e recall
+
+    print("📄 Carregando chunks dos PDFs...")
+    documents = load_documents(args.max_chunks)
+    if not documents:
+        print("❌ Nenhum PDF em ../docs")
+        sys.exit(1)
+    print(f"   {len(documents)} chunks, {len(QUERIES)} perguntas\n")
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        docs_file = Path(tmp) / "documents.json"
+        docs_file.write_text(json.dumps(documents, ensure_ascii=False), encoding="utf-8")
+
+        for name in backends:
+            out_dir = Path(tmp) / name
+            out_dir.mkdir()
+            print(f"⏱️ Medindo backend {name}...")
+            env = dict(os.environ, **BACKENDS[name])
+            result = subprocess.run(
+                [sys.executable, __file__, "--child", str(out_dir), str(docs_file)],
+                env=env, capture_output=True, text=True, encoding="utf-8",
+            )
+            if result.returncode != 0:
+                print(f"   ❌ Falhou: {result.stderr.strip().splitlines()[-1] if result.stderr.strip() else result.returncode}")
+                continue
+            stats = json.loads(result.stdout.strip().splitlines()[-1])
+            stats["queries"] = np.load(out_dir / "queries.npy")
+            stats["documents"] = np.load(out_dir / "documents.npy")
+            results[name] = stats
+
+    if "torch" not in results:
+        print("❌ O backend torch é a referência e não pôde ser medido")
+        sys.exit(1)
+
+    reference = results["torch"]
+    expected = top_k(reference["queries"], reference["documents"], args.k)
+
+    print("\n" + "=" * 78)
+    print(f"{'backend':<10} {'carga':>7} {'p50 ms':>8} {'p95 ms':>8} {'docs/s':>8} {'RSS MB':>8} "
+          f"{'cos min':>8} {'R@k col':>8} {'R@k':>6}")
+    print("-" * 78)
+    for name, stats in results.items():
+        cosine = np.sum(normalize(stats["documents"]) * normalize(reference["documents"]), axis=1)
+        # Pergunta deste backend contra a coleção embedada pelo torch (cenário da migração)
+        recall_collection = recall_at_k(expected, top_k(stats["queries"], reference["documents"], args.k))
+        # Coleção reindexada com este backend
+        recall_own = recall_at_k(expected, top_k(stats["queries"], stats["documents"], args.k))
+        print(f"{name:<10} {stats['load_seconds']:>6.2f}s {stats['query_ms_p50']:>8.2f} "
+              f"{stats['query_ms_p95']:>8.2f} {stats['docs_per_second'] or 0:>8.1f} "
+              f"{stats['peak_rss_mb'] or 0:>8.1f} {cosine.min():>8.4f} "
+              f"{recall_collection:>8.3f} {recall_own:>6.3f}")
+    print("=" * 78)
+    print("cos min: menor cosseno entre os vetores dos chunks e os do torch")
+    print(f"R@k col: recall@{args.k} buscando na coleção atual (vetores do torch)")
+    print(f"R@k: recall@{args.k} com a coleção reindexada pelo próprio backend")
+
+
+if __name__ == "__main__":
+    main()
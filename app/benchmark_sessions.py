@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+"""
+Benchmark das consultas de histórico (sessões recentes de um usuário)
+Cria um banco SQLite sintético que cresce em etapas (ex.: até 1 milhão de
+execuções) e mede, em cada etapa, a consulta que a busca em sessões anteriores
+faz a cada execução do agente:
+    get_sessions(session_type=AGENT, user_id=..., limit=5, sort_by="created_at", sort_order="desc")
+- sem índice: SqliteDb original do Agno
+- com índice: IndexedSqliteDb (session_store.py) sem cache
+- com cache: IndexedSqliteDb com o cache de sessões recentes por usuário
+
+As linhas são clonadas de uma sessão modelo gravada pelo próprio Agno, então
+o formato é o mesmo do mistral_agent.db (com ou sem a tabela de execuções).
+
+Uso:
+    cd app && python benchmark_sessions.py [--sizes 10000,50000,200000] [--runs-per-session 5]
+"""
+
+import argparse
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+if sys.platform == "win32":
+    sys.stdout.reconfigure(encoding='utf-8')
+    sys.stderr.reconfigure(encoding='utf-8')
+
+from agno.db.base import SessionType
+from agno.db.sqlite import SqliteDb
+from agno.models.message import Message
+from agno.run.agent import RunOutput
+from agno.session.agent import AgentSession
+
+from session_store import IndexedSqliteDb, RecentSessionCache, create_session_indexes, drop_session_indexes
+
+TEMPLATE_SESSION = "template-session"
+QUERY = {"session_type": SessionType.AGENT, "limit": 5, "sort_by": "created_at", "sort_order": "desc"}
+
+
+def write_template(db, runs_per_session):
+    """Sessão modelo com N execuções curtas, gravada pela API do Agno"""
+    now = int(time.time())
+    runs = [
+        RunOutput(
+            run_id=f"template-run-{i}",
+            session_id=TEMPLATE_SESSION,
+            agent_id="assistente-niara",
+            user_id="template-user",
+            created_at=now,
+            messages=[
+                Message(role="user", content=f"Como configurar o PIX? (pergunta {i})"),
+                Message(role="assistant", content="Para configurar o PIX, acesse Configurações > Recebimento."),
+            ],
+            content="Para configurar o PIX, acesse Configurações > Recebimento.",
+        )
+        for i in range(runs_per_session)
+    ]
+    session = AgentSession(
+        session_id=TEMPLATE_SESSION, agent_id="assistente-niara", user_id="template-user",
+        created_at=now, updated_at=now, runs=runs,
+    )
+    db.upsert_session(session=session)
+    if hasattr(db, "upsert_run"):
+        for index, run in enumerate(runs):
+            db.upsert_run(run=run, session_id=TEMPLATE_SESSION, user_id="template-user", run_index=index)
+
+
+def quote(name):
+    return f'"{name}"'
+
+
+def table_columns(conn, table):
+    """[(coluna, é chave primária)]"""
+    return [(row[1], bool(row[5])) for row in conn.execute(f'PRAGMA table_info("{table}")')]
+
+
+def template_rows(conn):
+    """Linhas da sessão modelo em cada tabela que tem session_id"""
+    tables = [row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type='table'")]
+    rows = {}
+    for table in tables:
+        columns = table_columns(conn, table)
+        if "session_id" not in {name for name, _ in columns}:
+            continue
+        names = [name for name, _ in columns]
+        found = conn.execute(
+            f'SELECT {", ".join(map(quote, names))} FROM "{table}" WHERE session_id = ?',
+            (TEMPLATE_SESSION,),
+        ).fetchall()
+        if found:
+            rows[table] = (columns, found)
+    return rows
+
+
+def seed(conn, templates, start, count, users, rng):
+    """Clonar a sessão modelo `count` vezes (ids, usuário e datas novos)"""
+    base_time = int(time.time()) - 365 * 24 * 3600
+    runs = 0
+    for table, (columns, rows) in templates.items():
+        names = [name for name, _ in columns]
+        placeholders = ", ".join("?" for _ in names)
+        sql = f'INSERT INTO "{table}" ({", ".join(map(quote, names))}) VALUES ({placeholders})'
+
+        def clones():
+            for n in range(start, start + count):
+                session_id = f"session-{n}"
+                user_id = f"user-{n % users}"
+                created_at = base_time + rng.randrange(365 * 24 * 3600)
+                for row in rows:
+                    values = []
+                    for (name, primary_key), value in zip(columns, row):
+                        if name == "session_id":
+                            value = session_id
+                        elif name == "user_id":
+                            value = user_id
+                        elif name in ("created_at", "updated_at") and value is not None:
+                            value = created_at
+                        elif primary_key:
+                            value = f"{value}-{n}"
+                        values.append(value)
+                    yield values
+
+        conn.executemany(sql, clones())
+        if table.endswith("runs"):
+            runs += count * len(rows)
+    conn.commit()
+    return runs
+
+
+def measure(db, probes, repeat=1):
+    """Latência (ms) de get_sessions para uma amostra de usuários"""
+    latencies = []
+    for user_id in probes:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            db.get_sessions(user_id=user_id, **QUERY)
+            latencies.append((time.perf_counter() - start) * 1000)
+    latencies.sort()
+    return statistics.median(latencies), latencies[int(len(latencies) * 0.95)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Medir a leitura de sessões recentes com o banco crescendo")
+    parser.add_argument("--sizes", default="10000,50000,200000", help="Total de sessões em cada etapa")
+    parser.add_argument("--runs-per-session", type=int, default=5, help="Execuções por sessão")
+    parser.add_argument("--sessions-per-user", type=int, default=5, help="Média de sessões por usuário")
+    parser.add_argument("--probes", type=int, default=50, help="Usuários consultados por medição")
+    parser.add_argument("--db", help="Arquivo do banco (padrão: temporário)")
+    args = parser.parse_args()
+
+    sizes = sorted(int(size) for size in args.sizes.split(","))
+    rng = random.Random(42)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_file = args.db or str(Path(tmp) / "benchmark_sessions.db")
+        if os.path.exists(db_file):
+            print(f"❌ {db_file} já existe; use um arquivo novo")
+            sys.exit(1)
+
+        base_db = SqliteDb(db_file=db_file)
+        write_template(base_db, args.runs_per_session)
+
+        conn = sqlite3.connect(db_file)
+        templates = template_rows(conn)
+        print(f"📄 Sessão modelo: {', '.join(f'{t} ({len(r)} linhas)' for t, (_, r) in templates.items())}\n")
+
+        print("=" * 84)
+        print(f"{'sessões':>9} {'execuções':>10} │ {'sem índice p50/p95':>19} │ "
+              f"{'com índice p50/p95':>19} │ {'com cache p50/p95':>18}")
+        print("-" * 84)
+
+        seeded, total_runs = 0, 0
+        for size in sizes:
+            users = max(1, size // args.sessions_per_user)
+            print(f"⏳ Gerando {size - seeded} sessões...", end="\r")
+            total_runs += seed(conn, templates, seeded, size - seeded, users, rng)
+            seeded = size
+            probes = [f"user-{rng.randrange(users)}" for _ in range(args.probes)]
+
+            drop_session_indexes(base_db.db_engine, base_db.session_table_name,
+                                 getattr(base_db, "runs_table_name", None))
+            without_index = measure(SqliteDb(db_file=db_file), probes)
+
+            indexed = IndexedSqliteDb(db_file=db_file, session_cache=RecentSessionCache(max_users=0))
+            create_session_indexes(indexed.db_engine, indexed.session_table_name,
+                                   getattr(indexed, "runs_table_name", None))
+            with_index = measure(indexed, probes)
+
+            cached = IndexedSqliteDb(db_file=db_file)
+            measure(cached, probes)  # primeira leitura preenche o cache
+            with_cache = measure(cached, probes, repeat=3)
+
+            print(f"{size:>9} {total_runs:>10} │ {without_index[0]:>8.2f} / {without_index[1]:>8.2f} │ "
+                  f"{with_index[0]:>8.2f} / {with_index[1]:>8.2f} │ {with_cache[0]:>7.3f} / {with_cache[1]:>8.3f}")
+
+        conn.close()
+        print("=" * 84)
+        print("Tempos em ms por consulta (get_sessions com as últimas 5 sessões do usuário).")
+        print("Com índice, o tempo acompanha as sessões do usuário, não o tamanho do banco.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""
+ChromaDB com parâmetros HNSW configuráveis
+- M e construction_ef valem na criação da coleção (mudar exige reindexar)
+- search_ef pode ser ajustado numa coleção existente no chromadb >= 1.0 (recall x latência)
+"""
+
+import os
+
+from agno.utils.log import log_debug, log_warning
+from agno.vectordb.chroma import ChromaDb
+
+# Padrões do hnswlib/Chroma: M=16, construction_ef=100, search_ef=10
+HNSW_M = int(os.getenv("HNSW_M", "16"))
+HNSW_CONSTRUCTION_EF = int(os.getenv("HNSW_CONSTRUCTION_EF", "100"))
+HNSW_SEARCH_EF = int(os.getenv("HNSW_SEARCH_EF", "64"))
+
+
+class HnswChromaDb(ChromaDb):
+    """ChromaDb que cria a coleção com M / construction_ef / search_ef definidos"""
+
+    def __init__(self, *args, hnsw_m=HNSW_M, hnsw_construction_ef=HNSW_CONSTRUCTION_EF,
+                 hnsw_search_ef=HNSW_SEARCH_EF, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.hnsw_m = hnsw_m
+        self.hnsw_construction_ef = hnsw_construction_ef
+        self.hnsw_search_ef = hnsw_search_ef
+
+    def hnsw_metadata(self):
+        return {
+            "hnsw:space": self.distance.value,
+            "hnsw:M": self.hnsw_m,
+            "hnsw:construction_ef": self.hnsw_construction_ef,
+            "hnsw:search_ef": self.hnsw_search_ef,
+        }
+
+    def create(self):
+        if self.exists():
+            super().create()
+            self._apply_search_ef()
+        else:
+            log_debug(f"Criando coleção {self.collection_name} com {self.hnsw_metadata()}")
+            self._collection = self.client.create_collection(
+                name=self.collection_name, metadata=self.hnsw_metadata()
+            )
+
+    def _apply_search_ef(self):
+        """Atualizar o search_ef de uma coleção já existente, se for diferente"""
+        metadata = self._collection.metadata or {}
+        if metadata.get("hnsw:search_ef", 10) == self.hnsw_search_ef:
+            return
+        try:
+            # chromadb >= 1.0: ef_search é o único parâmetro HNSW alterável após a criação
+            self._collection.modify(configuration={"hnsw": {"ef_search": self.hnsw_search_ef}})
+        except Exception as e:
+            log_warning(
+                f"Não foi possível ajustar o search_ef da coleção {self.collection_name} ({e}). "
+                "Para aplicar os parâmetros HNSW, apague a coleção e rode process_pdfs.py de novo."
+            )
@@ -0,0 +1,389 @@
+"""
+Orçamento de tokens do prompt enviado ao Mistral
+O Agno monta a cada turno: instruções + resumo da sessão + memórias (system),
+histórico das últimas execuções e os chunks do RAG (mensagem do usuário).
+Antes de cada chamada ao modelo, o ContextBudget:
+- mantém fixos as instruções, o resumo e a pergunta
+- ranqueia as memórias pela pergunta e corta as que não cabem no limite delas
+- corta os chunks menos relevantes do RAG (já vêm ordenados pela busca híbrida)
+- ranqueia as execuções do histórico (relevância + recência) e usa o que sobrar
+- registra quantos tokens cada fonte contribuiu (/context/stats)
+
+Os tokens são estimados (caracteres / CONTEXT_CHARS_PER_TOKEN), não contados
+com o tokenizer do Mistral: o orçamento deve ficar com folga em relação ao
+limite real do modelo. Só a estimativa das definições de ferramentas (JSON
+serializado) fica em cache, por conjunto de ferramentas.
+"""
+
+import json
+import math
+import os
+import re
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Optional
+
+from agno.models.mistral import MistralChat
+from agno.utils.log import log_debug
+
+from hybrid_search import tokenize
+
+# Limite total do prompt (sem contar a resposta); 0 desliga o corte
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "6000"))
+# Teto de cada fonte dentro do orçamento (o histórico fica com o resto)
+CONTEXT_MEMORY_TOKENS = int(os.getenv("CONTEXT_MEMORY_TOKENS", "400"))
+CONTEXT_KNOWLEDGE_TOKENS = int(os.getenv("CONTEXT_KNOWLEDGE_TOKENS", "2000"))
+# Execuções mais recentes que sempre ficam (continuidade da conversa)
+CONTEXT_MIN_HISTORY_RUNS = int(os.getenv("CONTEXT_MIN_HISTORY_RUNS", "2"))
+# Estimativa sem o tokenizer do Mistral: português fica perto de 3,5 caracteres por token
+CONTEXT_CHARS_PER_TOKEN = float(os.getenv("CONTEXT_CHARS_PER_TOKEN", "3.5"))
+
+# Blocos montados pelo Agno (agent/_messages.py)
+_MEMORIES_RE = re.compile(r"<memories_from_previous_interactions>\n(.*?)\n</memories_from_previous_interactions>", re.S)
+_SUMMARY_RE = re.compile(r"<summary_of_previous_interactions>\n(.*?)\n</summary_of_previous_interactions>", re.S)
+_REFERENCES_RE = re.compile(r"<references>\n(.*)\n</references>", re.S)
+
+# Cada mensagem paga alguns tokens de formatação (papel, separadores)
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+def estimate_tokens(text):
+    """Estimativa de tokens de um texto (pela quantidade de caracteres)"""
+    if not text:
+        return 0
+    return math.ceil(len(text) / CONTEXT_CHARS_PER_TOKEN)
+
+
+def message_tokens(message):
+    """Tokens estimados de uma mensagem: texto, chamadas de ferramenta e formatação"""
+    tokens = MESSAGE_OVERHEAD_TOKENS
+    if isinstance(message.content, str):
+        tokens += estimate_tokens(message.content)
+    elif message.content is not None:
+        tokens += estimate_tokens(json.dumps(message.content, ensure_ascii=False, default=str))
+    if message.tool_calls:
+        tokens += estimate_tokens(json.dumps(message.tool_calls, ensure_ascii=False, default=str))
+    return tokens
+
+
+def _tool_name(tool):
+    if isinstance(tool, dict):
+        return (tool.get("function") or {}).get("name") or tool.get("name")
+    return getattr(tool, "name", None)
+
+
+class ToolsTokenCache:
+    """Tokens das definições de ferramentas por conjunto de nomes
+
+    O Agno recria as ferramentas a cada execução, mas as definições de um mesmo
+    conjunto não mudam no processo: o JSON só é serializado na primeira vez.
+    """
+
+    def __init__(self, max_entries=64):
+        self.max_entries = max_entries
+        self._entries = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def tokens(self, tools):
+        if not tools:
+            return 0
+        key = tuple(sorted(str(_tool_name(tool)) for tool in tools))
+        with self._lock:
+            if key in self._entries:
+                self.hits += 1
+                return self._entries[key]
+        definitions = [tool.to_dict() if hasattr(tool, "to_dict") else tool for tool in tools]
+        tokens = estimate_tokens(json.dumps(definitions, ensure_ascii=False, sort_keys=True, default=str))
+        with self._lock:
+            self.misses += 1
+            if len(self._entries) >= self.max_entries:
+                self._entries.clear()
+            self._entries[key] = tokens
+        return tokens
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+tools_token_cache = ToolsTokenCache()
+
+
+def tools_tokens(tools):
+    """Tokens estimados das definições de ferramentas enviadas junto com o prompt"""
+    return tools_token_cache.tokens(tools)
+
+
+def relevance(text, query_terms):
+    """Fração dos termos da pergunta presentes no texto"""
+    if not query_terms:
+        return 0.0
+    return len(query_terms & set(tokenize(text))) / len(query_terms)
+
+
+def group_history_runs(history):
+    """Separar o histórico em execuções (cada uma começa numa mensagem do usuário)
+
+    Cortar execuções inteiras mantém chamadas de ferramenta junto com os resultados.
+    """
+    runs = []
+    for message in history:
+        if message.role == "user" or not runs:
+            runs.append([])
+        runs[-1].append(message)
+    return runs
+
+
+class ContextTelemetry:
+    """Últimos N relatórios de tokens por fonte, para /context/stats"""
+
+    def __init__(self, maxlen=200):
+        self.records = deque(maxlen=maxlen)
+        self.requests = 0
+        self.trimmed_requests = 0
+        self._lock = threading.Lock()
+
+    def record(self, report):
+        with self._lock:
+            self.records.append(report)
+            self.requests += 1
+            if any(report["dropped"].values()):
+                self.trimmed_requests += 1
+
+    def stats(self):
+        with self._lock:
+            records = list(self.records)
+            requests = self.requests
+            trimmed = self.trimmed_requests
+        averages = {}
+        if records:
+            for source in records[-1]["sources"]:
+                averages[source] = round(sum(r["sources"][source] for r in records) / len(records), 1)
+            averages["total"] = round(sum(r["total"] for r in records) / len(records), 1)
+        return {
+            "requests": requests,
+            "trimmed_requests": trimmed,
+            "avg_tokens": averages,
+            "last": records[-1] if records else None,
+            "tools_token_cache": tools_token_cache.stats(),
+        }
+
+
+context_telemetry = ContextTelemetry()
+
+
+class ContextBudget:
+    """Ajusta as mensagens de um turno a um limite de tokens (altera a lista no lugar)"""
+
+    def __init__(self, budget=CONTEXT_TOKEN_BUDGET, memory_tokens=CONTEXT_MEMORY_TOKENS,
+                 knowledge_tokens=CONTEXT_KNOWLEDGE_TOKENS, min_history_runs=CONTEXT_MIN_HISTORY_RUNS,
+                 telemetry=context_telemetry):
+        self.budget = budget
+        self.memory_tokens = memory_tokens
+        self.knowledge_tokens = knowledge_tokens
+        self.min_history_runs = min_history_runs
+        self.telemetry = telemetry
+
+    # ---------- memórias (mensagem de sistema) ----------
+
+    @staticmethod
+    def _split_summary(content):
+        """Separar o resumo da sessão (muda a cada N turnos) do resto do system prompt"""
+        match = _SUMMARY_RE.search(content)
+        if match is None:
+            return content, 0
+        return content[:match.start(1)] + content[match.end(1):], estimate_tokens(match.group(1))
+
+    def _fit_memories(self, system_message, query_terms, limit):
+        """Retorna (tokens das instruções, tokens das memórias, memórias cortadas)"""
+        content = system_message.content if isinstance(system_message.content, str) else ""
+        content_without_summary, _ = self._split_summary(content)
+        match = _MEMORIES_RE.search(content_without_summary)
+        if match is None:
+            return estimate_tokens(content_without_summary) + MESSAGE_OVERHEAD_TOKENS, 0, 0
+
+        static = content_without_summary[:match.start(1)] + content_without_summary[match.end(1):]
+        static_tokens = estimate_tokens(static) + MESSAGE_OVERHEAD_TOKENS
+        match = _MEMORIES_RE.search(content)
+
+        memories = [line for line in match.group(1).split("\n") if line.strip()]
+        ranked = sorted(
+            range(len(memories)),
+            key=lambda i: (relevance(memories[i], query_terms), -i),
+            reverse=True,
+        )
+        keep, used = set(), 0
+        for i in ranked:
+            tokens = estimate_tokens(memories[i]) + 1
+            if used + tokens > limit:
+                continue
+            keep.add(i)
+            used += tokens
+
+        if len(keep) < len(memories):
+            kept = "\n".join(memories[i] for i in sorted(keep))
+            system_message.content = content[:match.start(1)] + kept + content[match.end(1):]
+        return static_tokens, used, len(memories) - len(keep)
+
+    # ---------- chunks do RAG (mensagem do usuário) ----------
+
+    def _fit_references(self, user_message, limit):
+        """Retorna (tokens da pergunta, tokens dos chunks, chunks cortados)"""
+        content = user_message.content if isinstance(user_message.content, str) else None
+        if content is None:
+            return message_tokens(user_message), 0, 0
+        match = _REFERENCES_RE.search(content)
+        try:
+            references = json.loads(match.group(1)) if match else None
+        except ValueError:
+            references = None
+        if not isinstance(references, list):
+            return message_tokens(user_message), 0, 0
+
+        question_tokens = estimate_tokens(content[:match.start(1)] + content[match.end(1):]) + MESSAGE_OVERHEAD_TOKENS
+
+        # A busca híbrida já devolve do mais para o menos relevante: corta pelo fim
+        kept, used = [], 0
+        for reference in references:
+            tokens = estimate_tokens(json.dumps(reference, indent=2, ensure_ascii=False))
+            if used + tokens > limit:
+                break
+            kept.append(reference)
+            used += tokens
+
+        if len(kept) < len(references):
+            user_message.content = (
+                content[:match.start(1)] + json.dumps(kept, indent=2, ensure_ascii=False) + content[match.end(1):]
+            )
+        return question_tokens, used, len(references) - len(kept)
+
+    # ---------- histórico ----------
+
+    def _fit_history(self, history, query_terms, limit):
+        """Retorna (mensagens mantidas, tokens, execuções cortadas)"""
+        runs = group_history_runs(history)
+        costs = [sum(message_tokens(m) for m in run) for run in runs]
+
+        recent = set(range(max(0, len(runs) - self.min_history_runs), len(runs)))
+        # Relevância para a pergunta, com desempate pelas execuções mais recentes
+        ranked = sorted(
+            (i for i in range(len(runs)) if i not in recent),
+            key=lambda i: (relevance(" ".join(str(m.content or "") for m in runs[i]), query_terms), i),
+            reverse=True,
+        )
+
+        keep, used = set(), 0
+        for i in sorted(recent, reverse=True) + ranked:
+            if used + costs[i] > limit:
+                continue
+            keep.add(i)
+            used += costs[i]
+
+        kept = [message for i in sorted(keep) for message in runs[i]]
+        return kept, used, len(runs) - len(keep)
+
+    # ---------- turno completo ----------
+
+    def fit(self, messages, tools=None, run_id=None):
+        """Cortar memórias, chunks e histórico de `messages` até caber no orçamento"""
+        if self.budget <= 0 or not messages:
+            return None
+
+        system_message = messages[0] if messages[0].role in ("system", "developer") else None
+        user_message = next(
+            (m for m in reversed(messages) if m.role == "user" and not m.from_history), None
+        )
+        history = [m for m in messages if m.from_history]
+        others = [
+            m for m in messages
+            if m is not system_message and m is not user_message and not m.from_history
+        ]
+
+        query = user_message.content if user_message is not None and isinstance(user_message.content, str) else ""
+        match = _REFERENCES_RE.search(query)
+        query_terms = set(tokenize(query[:match.start()] if match else query))
+
+        sources = {"instructions": 0, "summary": 0, "memories": 0, "knowledge": 0, "history": 0,
+                   "user": 0, "tools": tools_tokens(tools)}
+        dropped = {"memories": 0, "knowledge": 0, "history_runs": 0}
+        sources["user"] += sum(message_tokens(m) for m in others)
+
+        # Fixos: instruções e a pergunta; as demais fontes disputam o que sobrar
+        if user_message is not None:
+            question_tokens, _, _ = self._fit_references(user_message, limit=math.inf)
+            sources["user"] += question_tokens
+        if system_message is not None:
+            instructions_tokens, _, _ = self._fit_memories(system_message, query_terms, limit=math.inf)
+            sources["instructions"] = instructions_tokens
+            if isinstance(system_message.content, str):
+                _, sources["summary"] = self._split_summary(system_message.content)
+        fixed = sources["instructions"] + sources["summary"] + sources["user"] + sources["tools"]
+        remaining = max(0, self.budget - fixed)
+
+        if user_message is not None:
+            _, used, dropped["knowledge"] = self._fit_references(user_message, min(self.knowledge_tokens, remaining))
+            sources["knowledge"] = used
+            remaining -= used
+        if system_message is not None:
+            _, used, dropped["memories"] = self._fit_memories(
+                system_message, query_terms, min(self.memory_tokens, remaining)
+            )
+            sources["memories"] = used
+            remaining -= used
+
+        if history:
+            kept, used, dropped["history_runs"] = self._fit_history(history, query_terms, remaining)
+            sources["history"] = used
+            if len(kept) < len(history):
+                kept_ids = {id(m) for m in kept}
+                messages[:] = [m for m in messages if not m.from_history or id(m) in kept_ids]
+
+        report = {
+            "run_id": run_id,
+            "timestamp": time.time(),
+            "budget": self.budget,
+            "total": sum(sources.values()),
+            "sources": sources,
+            "dropped": dropped,
+        }
+        log_debug(f"Contexto: {report['total']} tokens estimados {sources}, cortados {dropped}")
+        if self.telemetry is not None:
+            self.telemetry.record(report)
+        return report
+
+
+@dataclass
+class BudgetedMistralChat(MistralChat):
+    """MistralChat que ajusta as mensagens ao ContextBudget antes de cada execução"""
+
+    context_budget: Optional[Any] = field(default_factory=ContextBudget)
+
+    def _fit_context(self, kwargs):
+        # Só execuções do agente (com run_response); chamadas internas, como as do
+        # gerenciador de memórias, seguem intactas
+        run_response = kwargs.get("run_response")
+        if self.context_budget is None or run_response is None:
+            return
+        self.context_budget.fit(kwargs["messages"], tools=kwargs.get("tools"),
+                                run_id=getattr(run_response, "run_id", None))
+
+    def response(self, messages, *args, **kwargs):
+        self._fit_context(dict(kwargs, messages=messages))
+        return super().response(messages, *args, **kwargs)
+
+    async def aresponse(self, messages, *args, **kwargs):
+        self._fit_context(dict(kwargs, messages=messages))
+        return await super().aresponse(messages, *args, **kwargs)
+
+    def response_stream(self, messages, *args, **kwargs):
+        self._fit_context(dict(kwargs, messages=messages))
+        yield from super().response_stream(messages, *args, **kwargs)
+
+    async def aresponse_stream(self, messages, *args, **kwargs):
+        self._fit_context(dict(kwargs, messages=messages))
+        async for event in super().aresponse_stream(messages, *args, **kwargs):
+            yield event
@@ -0,0 +1,263 @@
+"""
+Utilitários de embeddings para a Base de Conhecimento
+- Embedding em lote (ingestão) usando o modelo do SentenceTransformerEmbedder
+- Cache LRU/TTL dos embeddings de perguntas (buscas do agente)
+- Backend ONNX Runtime (fp32 ou int8) do MiniLM, sem torch
+"""
+
+import asyncio
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Optional
+
+import numpy as np
+from agno.knowledge.embedder.base import Embedder
+
+# Textos por forward pass do modelo (CPU)
+ENCODE_BATCH_SIZE = 64
+
+
+def embed_texts(embedder, texts, batch_size=ENCODE_BATCH_SIZE):
+    """Embedar vários textos de uma vez e retornar uma matriz float32 (n, dim).
+
+    Os textos são ordenados por tamanho antes de irem ao modelo, assim cada
+    forward pass junta textos parecidos e quase não há padding. A matriz
+    volta na ordem original dos textos.
+    """
+    if not texts:
+        return np.empty((0, embedder.dimensions or 0), dtype=np.float32)
+
+    order = np.argsort([len(text) for text in texts], kind="stable")
+    sorted_texts = [texts[i] for i in order]
+
+    model = getattr(embedder, "sentence_transformer_client", None)
+    encode = getattr(embedder, "encode", None)
+    if model is None and encode is not None:
+        # OnnxEmbedder: já faz o lote internamente
+        vectors = encode(sorted_texts, batch_size=batch_size)
+    elif model is not None:
+        vectors = model.encode(
+            sorted_texts,
+            batch_size=batch_size,
+            prompt=getattr(embedder, "prompt", None),
+            normalize_embeddings=getattr(embedder, "normalize_embeddings", False),
+            convert_to_numpy=True,
+            show_progress_bar=False,
+        )
+    else:
+        # Embedders sem modelo local: um texto por chamada
+        vectors = [embedder.get_embedding(text) for text in sorted_texts]
+
+    vectors = np.asarray(vectors, dtype=np.float32)
+    matrix = np.empty_like(vectors)
+    matrix[order] = vectors
+    return matrix
+
+
+def normalize_query(text):
+    """Normalizar a pergunta para usar como chave do cache.
+
+    O all-MiniLM-L6-v2 é uncased (o tokenizer já converte para minúsculas)
+    e ignora espaços extras, então essas variações geram o mesmo vetor.
+    """
+    return " ".join(text.split()).lower()
+
+
+class QueryEmbeddingCache:
+    """Cache LRU com TTL: pergunta normalizada → embedding (thread-safe)"""
+
+    def __init__(self, max_size=1024, ttl_seconds=3600):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                embedding, expires_at = entry
+                if expires_at > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return list(embedding)
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, embedding):
+        with self._lock:
+            self._entries[key] = (tuple(embedding), time.monotonic() + self.ttl_seconds)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            }
+
+
+# Cache compartilhado por todas as requisições do processo (AgentOS)
+query_embedding_cache = QueryEmbeddingCache(
+    max_size=int(os.getenv("QUERY_CACHE_SIZE", "1024")),
+    ttl_seconds=float(os.getenv("QUERY_CACHE_TTL", "3600")),
+)
+
+
+@dataclass
+class CachedEmbedder(Embedder):
+    """Embedder que consulta o cache de perguntas antes de chamar o modelo"""
+
+    embedder: Optional[Embedder] = None
+    cache: Optional[QueryEmbeddingCache] = None
+
+    def __post_init__(self):
+        if self.embedder is None:
+            raise ValueError("CachedEmbedder precisa de um embedder")
+        if self.cache is None:
+            self.cache = query_embedding_cache
+        self.dimensions = self.embedder.dimensions
+
+    def get_embedding(self, text):
+        if not isinstance(text, str):
+            return self.embedder.get_embedding(text)
+        key = normalize_query(text)
+        embedding = self.cache.get(key)
+        if embedding is None:
+            embedding = self.embedder.get_embedding(text)
+            if embedding:
+                self.cache.put(key, embedding)
+        return embedding
+
+    def get_embedding_and_usage(self, text):
+        return self.get_embedding(text), None
+
+    async def async_get_embedding(self, text):
+        if not isinstance(text, str):
+            return await self.embedder.async_get_embedding(text)
+        key = normalize_query(text)
+        embedding = self.cache.get(key)
+        if embedding is None:
+            embedding = await self.embedder.async_get_embedding(text)
+            if embedding:
+                self.cache.put(key, embedding)
+        return embedding
+
+    async def async_get_embedding_and_usage(self, text):
+        return await self.async_get_embedding(text), None
+
+
+@dataclass
+class OnnxEmbedder(Embedder):
+    """all-MiniLM-L6-v2 exportado para ONNX (export_onnx.py), rodando no ONNX Runtime
+
+    Reproduz o pipeline do sentence-transformers (Transformer → mean pooling →
+    normalização L2), então os vetores são compatíveis com a coleção já
+    indexada pelo modelo em torch.
+    """
+
+    id: str = "all-MiniLM-L6-v2"
+    dimensions: int = 384
+    model_dir: str = "models/all-MiniLM-L6-v2-onnx"
+    # int8 (quantização dinâmica): ~4x menor e mais rápido em CPU
+    quantized: bool = True
+    max_length: int = 256
+    batch_size: int = ENCODE_BATCH_SIZE
+    num_threads: int = 0  # 0 = decisão do ONNX Runtime
+    _session: Any = field(default=None, init=False, repr=False)
+    _tokenizer: Any = field(default=None, init=False, repr=False)
+    _input_names: Any = field(default=None, init=False, repr=False)
+    _lock: Any = field(default_factory=threading.Lock, init=False, repr=False)
+
+    @property
+    def model_path(self):
+        return Path(self.model_dir) / ("model_int8.onnx" if self.quantized else "model.onnx")
+
+    def _load(self):
+        if self._session is not None:
+            return
+        with self._lock:
+            if self._session is not None:
+                return
+            import onnxruntime as ort
+            from tokenizers import Tokenizer
+
+            if not self.model_path.exists():
+                raise FileNotFoundError(
+                    f"Modelo ONNX não encontrado em {self.model_path}. "
+                    "Gere com: python export_onnx.py"
+                )
+
+            tokenizer = Tokenizer.from_file(str(Path(self.model_dir) / "tokenizer.json"))
+            tokenizer.enable_truncation(max_length=self.max_length)
+            tokenizer.enable_padding(pad_id=0, pad_token="[PAD]")
+
+            options = ort.SessionOptions()
+            options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+            if self.num_threads:
+                options.intra_op_num_threads = self.num_threads
+            session = ort.InferenceSession(
+                str(self.model_path), sess_options=options, providers=["CPUExecutionProvider"]
+            )
+
+            self._input_names = {model_input.name for model_input in session.get_inputs()}
+            self._tokenizer = tokenizer
+            self._session = session
+
+    def encode(self, texts, batch_size=None):
+        """Embedar uma lista de textos; retorna matriz float32 (n, dim) normalizada"""
+        self._load()
+        batch_size = batch_size or self.batch_size
+        batches = []
+        for start in range(0, len(texts), batch_size):
+            encodings = self._tokenizer.encode_batch(texts[start:start + batch_size])
+            input_ids = np.array([e.ids for e in encodings], dtype=np.int64)
+            attention_mask = np.array([e.attention_mask for e in encodings], dtype=np.int64)
+            inputs = {"input_ids": input_ids, "attention_mask": attention_mask}
+            if "token_type_ids" in self._input_names:
+                inputs["token_type_ids"] = np.zeros_like(input_ids)
+
+            token_embeddings = self._session.run(None, inputs)[0]
+
+            # Mean pooling considerando só os tokens reais (sem padding)
+            mask = attention_mask[..., None].astype(np.float32)
+            summed = (token_embeddings * mask).sum(axis=1)
+            pooled = summed / np.clip(mask.sum(axis=1), 1e-9, None)
+            norms = np.linalg.norm(pooled, axis=1, keepdims=True)
+            batches.append(pooled / np.clip(norms, 1e-12, None))
+
+        if not batches:
+            return np.empty((0, self.dimensions), dtype=np.float32)
+        return np.concatenate(batches).astype(np.float32, copy=False)
+
+    def get_embedding(self, text):
+        if isinstance(text, str):
+            return self.encode([text])[0].tolist()
+        return self.encode(list(text)).tolist()
+
+    def get_embedding_and_usage(self, text):
+        return self.get_embedding(text), None
+
+    async def async_get_embedding(self, text):
+        return await asyncio.to_thread(self.get_embedding, text)
+
+    async def async_get_embedding_and_usage(self, text):
+        return await self.async_get_embedding(text), None
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Exportar o all-MiniLM-L6-v2 para ONNX (fp32 + int8) para o EMBEDDER_BACKEND=onnx
+Precisa de torch + transformers + onnx + onnxruntime só na hora de exportar
+(ex.: no estágio de build do Dockerfile); a imagem final não leva torch.
+
+Uso:
+    python export_onnx.py [--output models/all-MiniLM-L6-v2-onnx]
+"""
+
+import argparse
+import sys
+from pathlib import Path
+
+if sys.platform == "win32":
+    sys.stdout.reconfigure(encoding='utf-8')
+    sys.stderr.reconfigure(encoding='utf-8')
+
+from knowledge_base import ONNX_MODEL_DIR
+
+HF_MODEL_ID = "sentence-transformers/all-MiniLM-L6-v2"
+
+
+def export(output_dir, opset=17):
+    import torch
+    from transformers import AutoModel, AutoTokenizer
+
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    print(f"📥 Carregando {HF_MODEL_ID}...")
+    tokenizer = AutoTokenizer.from_pretrained(HF_MODEL_ID)
+    model = AutoModel.from_pretrained(HF_MODEL_ID)
+    model.eval()
+
+    # tokenizer.json (tokenizer "fast") é o que o OnnxEmbedder carrega
+    tokenizer.save_pretrained(output_dir)
+
+    sample = tokenizer(["exemplo de entrada"], return_tensors="pt")
+    fp32_path = output_dir / "model.onnx"
+
+    print(f"📦 Exportando para {fp32_path}...")
+    with torch.no_grad():
+        torch.onnx.export(
+            model,
+            (sample["input_ids"], sample["attention_mask"], sample["token_type_ids"]),
+            str(fp32_path),
+            input_names=["input_ids", "attention_mask", "token_type_ids"],
+            output_names=["last_hidden_state"],
+            dynamic_axes={
+                "input_ids": {0: "batch", 1: "sequence"},
+                "attention_mask": {0: "batch", 1: "sequence"},
+                "token_type_ids": {0: "batch", 1: "sequence"},
+                "last_hidden_state": {0: "batch", 1: "sequence"},
+            },
+            opset_version=opset,
+            do_constant_folding=True,
+        )
+    return fp32_path
+
+
+def quantize(fp32_path):
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    int8_path = fp32_path.with_name("model_int8.onnx")
+    print(f"🗜️ Quantizando (int8 dinâmico) para {int8_path}...")
+    # Pesos em int8, ativações quantizadas em tempo de execução (bom para CPU)
+    quantize_dynamic(str(fp32_path), str(int8_path), weight_type=QuantType.QInt8)
+    return int8_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Exportar o MiniLM para ONNX (fp32 + int8)")
+    parser.add_argument("--output", default=ONNX_MODEL_DIR, help="Pasta de saída")
+    parser.add_argument("--opset", type=int, default=17)
+    parser.add_argument("--skip-int8", action="store_true", help="Não gerar a versão quantizada")
+    args = parser.parse_args()
+
+    output_dir = Path(args.output)
+    fp32_path = export(output_dir, args.opset)
+    paths = [fp32_path]
+    if not args.skip_int8:
+        paths.append(quantize(fp32_path))
+
+    print("\n✅ Exportação concluída!")
+    for path in paths:
+        print(f"   • {path} ({path.stat().st_size / 1e6:.1f} MB)")
+    print("\nPara usar: EMBEDDER_BACKEND=onnx (ONNX_QUANTIZED=false para o fp32)")
+    print("Compare com o torch: python benchmark_embedder.py")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,226 @@
+"""
+Busca híbrida: BM25 (termos exatos) + vetores, com reciprocal rank fusion
+Termos de produto como "Asksuite", "PIX Getnet", "Itaú", "MFA" e "marcadores"
+são mal representados pelo MiniLM em português; o índice invertido BM25 acha
+esses chunks pelo termo exato. O índice é montado na ingestão (process_pdfs.py)
+e fica gravado ao lado da coleção.
+"""
+
+import json
+import math
+import os
+import re
+import threading
+import unicodedata
+from collections import Counter
+from pathlib import Path
+
+from agno.knowledge.document import Document
+
+from knowledge_base import CHROMA_PATH, COLLECTION_NAME
+from numpy_store import metadata_matches
+
+INDEX_FORMAT = 1
+
+# Constante do RRF (60 é o valor do artigo original) e candidatos por ranking
+HYBRID_RRF_K = int(os.getenv("HYBRID_RRF_K", "60"))
+HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", "20"))
+
+# Palavras muito comuns em português que não ajudam a ranquear
+STOPWORDS = frozenset("""
+a ao aos as com como da das de do dos e ela ele em entre era essa esse esta este eu foi
+ha isso ja la mais mas me meu minha na nao nas nem no nos o os ou para pela pelas pelo pelos
+por qual quando que se sem ser seu sua sao tambem te tem um uma umas uns voce
+""".split())
+
+_TOKEN_RE = re.compile(r"\w+")
+
+
+def keyword_index_path():
+    """Caminho do índice BM25 (ao lado do manifesto de ingestão)"""
+    return Path(CHROMA_PATH) / f"{COLLECTION_NAME}.bm25.json"
+
+
+def tokenize(text):
+    """Minúsculas, sem acentos ("Itaú" = "itau"), sem stopwords"""
+    text = unicodedata.normalize("NFKD", text.lower())
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    return [token for token in _TOKEN_RE.findall(text) if token not in STOPWORDS and (len(token) > 1 or token.isdigit())]
+
+
+class KeywordIndex:
+    """Índice invertido BM25 persistido em JSON"""
+
+    def __init__(self, path=None, k1=1.5, b=0.75):
+        self.path = Path(path or keyword_index_path())
+        self.k1 = k1
+        self.b = b
+        self.docs = {}       # id -> {"content", "metadata", "length"}
+        self.postings = {}   # termo -> {id: frequência}
+        self.total_length = 0
+        self._stamp = None
+        self._lock = threading.Lock()
+        self.load()
+
+    @property
+    def empty(self):
+        return not self.docs
+
+    # ---------- construção (ingestão) ----------
+
+    def add(self, doc_id, content, metadata=None):
+        if doc_id in self.docs:
+            self.remove(doc_id)
+        terms = Counter(tokenize(content))
+        length = sum(terms.values())
+        self.docs[doc_id] = {"content": content, "metadata": dict(metadata or {}), "length": length}
+        self.total_length += length
+        for term, frequency in terms.items():
+            self.postings.setdefault(term, {})[doc_id] = frequency
+
+    def remove(self, doc_id):
+        doc = self.docs.pop(doc_id, None)
+        if doc is None:
+            return
+        self.total_length -= doc["length"]
+        for term in set(tokenize(doc["content"])):
+            posting = self.postings.get(term)
+            if posting is not None:
+                posting.pop(doc_id, None)
+                if not posting:
+                    del self.postings[term]
+
+    def add_from_collection(self, collection):
+        """Montar o índice a partir dos chunks já gravados no banco vetorial"""
+        result = collection.get(include=["documents", "metadatas"])
+        for doc_id, content, metadata in zip(result["ids"], result["documents"], result["metadatas"]):
+            self.add(doc_id, content or "", metadata or {})
+
+    def save(self):
+        """Gravar de forma atômica (o agente recarrega quando o arquivo muda)"""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(".tmp")
+        tmp_path.write_text(
+            json.dumps(
+                {"format": INDEX_FORMAT, "k1": self.k1, "b": self.b,
+                 "docs": self.docs, "postings": self.postings},
+                ensure_ascii=False,
+            ),
+            encoding="utf-8",
+        )
+        os.replace(tmp_path, self.path)
+
+    # ---------- leitura (agente) ----------
+
+    def load(self):
+        """Carregar o índice do disco se ele mudou desde a última leitura"""
+        try:
+            stat = self.path.stat()
+        except FileNotFoundError:
+            return
+        stamp = (stat.st_mtime_ns, stat.st_size)
+        if stamp == self._stamp:
+            return
+        with self._lock:
+            if stamp == self._stamp:
+                return
+            try:
+                data = json.loads(self.path.read_text(encoding="utf-8"))
+            except (OSError, ValueError):
+                return
+            if data.get("format") != INDEX_FORMAT:
+                return
+            self.k1 = data["k1"]
+            self.b = data["b"]
+            self.docs = data["docs"]
+            self.postings = data["postings"]
+            self.total_length = sum(doc["length"] for doc in self.docs.values())
+            self._stamp = stamp
+
+    def search(self, query, limit=HYBRID_CANDIDATES, filters=None):
+        """Top chunks por BM25: [(id, score)]"""
+        self.load()
+        n_docs = len(self.docs)
+        if not n_docs:
+            return []
+        avg_length = self.total_length / n_docs or 1.0
+
+        scores = {}
+        for term in set(tokenize(query)):
+            posting = self.postings.get(term)
+            if not posting:
+                continue
+            idf = math.log(1 + (n_docs - len(posting) + 0.5) / (len(posting) + 0.5))
+            for doc_id, frequency in posting.items():
+                length = self.docs[doc_id]["length"]
+                norm = frequency + self.k1 * (1 - self.b + self.b * length / avg_length)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * frequency * (self.k1 + 1) / norm
+
+        if filters:
+            scores = {
+                doc_id: score for doc_id, score in scores.items()
+                if metadata_matches(self.docs[doc_id]["metadata"], filters)
+            }
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:limit]
+
+    def document(self, doc_id, embedder=None):
+        """Document do Agno para um chunk que só apareceu no BM25"""
+        doc = self.docs[doc_id]
+        metadata = dict(doc["metadata"])
+        name = metadata.pop("name", None)
+        content_id = metadata.pop("content_id", None)
+        return Document(id=doc_id, name=name, meta_data=metadata, content=doc["content"],
+                        embedder=embedder, content_id=content_id)
+
+
+def reciprocal_rank_fusion(rankings, k=HYBRID_RRF_K):
+    """Combinar rankings (listas de ids): score = soma de 1 / (k + posição)"""
+    scores = {}
+    for ranking in rankings:
+        for position, doc_id in enumerate(ranking, 1):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (k + position)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+
+class HybridVectorDb:
+    """Envolve um banco vetorial do Agno e funde a busca vetorial com o BM25 (RRF)
+
+    Todos os outros atributos/métodos são repassados ao banco original,
+    então pode ser usado direto em Knowledge(vector_db=...).
+    """
+
+    def __init__(self, vector_db, keyword_index=None, rrf_k=HYBRID_RRF_K, candidates=HYBRID_CANDIDATES):
+        self.vector_db = vector_db
+        self.keyword_index = keyword_index or KeywordIndex()
+        self.rrf_k = rrf_k
+        self.candidates = candidates
+
+    def __getattr__(self, name):
+        return getattr(self.vector_db, name)
+
+    def _fuse(self, query, vector_docs, limit, filters):
+        keyword_hits = self.keyword_index.search(query, self.candidates, filters)
+        if not keyword_hits:
+            return vector_docs[:limit]
+
+        by_id = {doc.id: doc for doc in vector_docs}
+        fused = reciprocal_rank_fusion(
+            [[doc.id for doc in vector_docs], [doc_id for doc_id, _ in keyword_hits]], k=self.rrf_k
+        )
+
+        documents = []
+        for doc_id, score in fused[:limit]:
+            doc = by_id.get(doc_id)
+            if doc is None:
+                doc = self.keyword_index.document(doc_id, embedder=self.vector_db.embedder)
+            doc.meta_data["rrf_score"] = round(score, 6)
+            documents.append(doc)
+        return documents
+
+    def search(self, query, limit=5, filters=None):
+        vector_docs = self.vector_db.search(query=query, limit=max(limit, self.candidates), filters=filters)
+        return self._fuse(query, vector_docs, limit, filters)
+
+    async def async_search(self, query, limit=5, filters=None):
+        vector_docs = await self.vector_db.async_search(query=query, limit=max(limit, self.candidates), filters=filters)
+        return self._fuse(query, vector_docs, limit, filters)
@@ -0,0 +1,271 @@
+"""
+Ingestão incremental de PDFs na Base de Conhecimento
+Mantém um manifesto com o hash de cada arquivo e de cada chunk, para
+reprocessar apenas o que mudou desde a última execução. A extração dos
+PDFs pode rodar em vários processos (um por núcleo).
+"""
+
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+from pathlib import Path
+
+from embeddings import embed_texts
+
+MANIFEST_FORMAT = 1
+
+
+def file_sha256(path):
+    """Calcular o hash SHA-256 do conteúdo de um arquivo"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def chunk_id(file_name, content):
+    """ID estável do chunk: hash do arquivo de origem + conteúdo"""
+    cleaned = content.replace("\x00", "\ufffd")
+    return hashlib.sha256(f"{file_name}\x00{cleaned}".encode("utf-8")).hexdigest()
+
+
+class IngestManifest:
+    """Manifesto de ingestão: arquivo → hash do conteúdo + IDs dos chunks"""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.files = {}
+        # Versão da coleção: incrementada a cada gravação (invalida caches de busca)
+        self.version = 0
+        if self.path.exists():
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+            if data.get("format") == MANIFEST_FORMAT:
+                self.files = data.get("files", {})
+                self.version = data.get("version", 0)
+
+    def get(self, file_name):
+        return self.files.get(file_name)
+
+    def set(self, file_name, sha256, chunk_ids):
+        self.files[file_name] = {
+            "sha256": sha256,
+            "chunks": list(chunk_ids),
+            "updated_at": datetime.now().isoformat(),
+        }
+
+    def remove(self, file_name):
+        return self.files.pop(file_name, None)
+
+    def save(self):
+        """Gravar o manifesto de forma atômica (nunca deixa um JSON pela metade)"""
+        self.version += 1
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(".tmp")
+        tmp_path.write_text(
+            json.dumps(
+                {"format": MANIFEST_FORMAT, "version": self.version, "files": self.files},
+                ensure_ascii=False,
+                indent=2,
+            ),
+            encoding="utf-8",
+        )
+        os.replace(tmp_path, self.path)
+
+
+def read_pdf_chunks(pdf_file):
+    """Extrair e dividir um PDF em chunks: [(chunk_id, conteúdo, metadados)]"""
+    from agno.knowledge.reader.pdf_reader import PDFReader
+
+    pdf_file = Path(pdf_file)
+    documents = PDFReader().read(pdf_file, name=pdf_file.stem)
+
+    chunks = {}
+    for document in documents:
+        content = document.content.replace("\x00", "\ufffd")
+        if not content.strip():
+            continue
+        doc_id = chunk_id(pdf_file.name, content)
+        metadata = {
+            "name": pdf_file.stem,
+            "tipo": "pdf",
+            "categoria": "documento",
+            "arquivo": pdf_file.name,
+            "processado": "sim",
+        }
+        for key in ("page", "chunk"):
+            if key in document.meta_data:
+                metadata[key] = document.meta_data[key]
+        # Chunks idênticos no mesmo arquivo viram um só vetor
+        chunks.setdefault(doc_id, (doc_id, content, metadata))
+    return list(chunks.values())
+
+
+def _get_collection(vector_db):
+    """Coleção onde a ingestão grava em lote (ChromaDB ou NumpyVectorDb)"""
+    vector_db.create()
+    if hasattr(vector_db, "get_collection"):
+        return vector_db.get_collection()
+    return vector_db.client.get_collection(name=vector_db.collection_name)
+
+
+def _extract_changed(changed, workers):
+    """Extrair chunks dos PDFs alterados, em paralelo quando workers > 1.
+
+    Gera (pdf_file, sha256, chunks, erro) na ordem em que os arquivos terminam.
+    """
+    if workers <= 1 or len(changed) <= 1:
+        for pdf_file, sha256 in changed:
+            try:
+                yield pdf_file, sha256, read_pdf_chunks(pdf_file), None
+            except Exception as e:
+                yield pdf_file, sha256, None, e
+        return
+
+    with ProcessPoolExecutor(max_workers=min(workers, len(changed))) as pool:
+        futures = {pool.submit(read_pdf_chunks, pdf_file): (pdf_file, sha256) for pdf_file, sha256 in changed}
+        for future in as_completed(futures):
+            pdf_file, sha256 = futures[future]
+            try:
+                yield pdf_file, sha256, future.result(), None
+            except Exception as e:
+                yield pdf_file, sha256, None, e
+
+
+class _BatchWriter:
+    """Consumidor único: agrupa chunks de vários PDFs e grava em lote no banco vetorial.
+
+    O manifesto de um arquivo só é atualizado depois que todos os seus
+    chunks foram gravados, então uma interrupção nunca marca um PDF como
+    processado pela metade.
+    """
+
+    def __init__(self, collection, embedder, manifest, stats, batch_size, log, keyword_index=None):
+        self.collection = collection
+        self.embedder = embedder
+        self.manifest = manifest
+        self.keyword_index = keyword_index
+        self.stats = stats
+        self.batch_size = batch_size
+        self.log = log
+        self.pending_chunks = []
+        self.pending_files = []
+
+    def add(self, pdf_file, sha256, chunks, old_ids):
+        new_ids = [doc_id for doc_id, _, _ in chunks]
+        to_embed = [chunk for chunk in chunks if chunk[0] not in old_ids]
+        stale_ids = list(old_ids - set(new_ids))
+
+        self.pending_chunks.extend(to_embed)
+        self.pending_files.append((pdf_file, sha256, new_ids, stale_ids, len(to_embed), len(chunks)))
+        if len(self.pending_chunks) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if self.pending_chunks:
+            ids = [doc_id for doc_id, _, _ in self.pending_chunks]
+            contents = [content for _, content, _ in self.pending_chunks]
+            metadatas = [metadata for _, _, metadata in self.pending_chunks]
+
+            start_time = time.perf_counter()
+            embeddings = embed_texts(self.embedder, contents)
+            self.stats["embed_seconds"] += time.perf_counter() - start_time
+
+            # Um único upsert por lote, com a matriz NumPy direto do modelo
+            self.collection.upsert(ids=ids, embeddings=embeddings, documents=contents, metadatas=metadatas)
+            if self.keyword_index is not None:
+                for doc_id, content, metadata in self.pending_chunks:
+                    self.keyword_index.add(doc_id, content, metadata)
+
+        for pdf_file, sha256, new_ids, stale_ids, embedded, total in self.pending_files:
+            if stale_ids:
+                self.collection.delete(ids=stale_ids)
+                if self.keyword_index is not None:
+                    for doc_id in stale_ids:
+                        self.keyword_index.remove(doc_id)
+            self.manifest.set(pdf_file.name, sha256, new_ids)
+            self.stats["updated"] += 1
+            self.stats["chunks_embedded"] += embedded
+            self.stats["chunks_deleted"] += len(stale_ids)
+            self.log(f"✅ {pdf_file.name}: {embedded} chunks novos, {len(stale_ids)} removidos, "
+                     f"{total - embedded} reaproveitados")
+        if self.pending_files:
+            # Índice BM25 antes do manifesto: a versão nova só aparece com os dois prontos
+            if self.keyword_index is not None:
+                self.keyword_index.save()
+            self.manifest.save()
+
+        self.pending_chunks = []
+        self.pending_files = []
+
+
+def sync_pdfs(pdf_files, vector_db, manifest, workers=1, batch_size=256, log=print, keyword_index=None):
+    """Sincronizar a coleção com os PDFs atuais.
+
+    Arquivos inalterados são ignorados, apenas chunks novos são embedados
+    e os vetores de chunks/arquivos removidos são apagados. Com workers > 1
+    a extração e o chunking rodam em um pool de processos, enquanto o
+    processo principal embeda (uma chamada ao modelo por lote) e grava os
+    resultados no banco vetorial com um upsert por lote. Com keyword_index,
+    o índice BM25 da busca híbrida é atualizado junto.
+    """
+    stats = {
+        "unchanged": 0,
+        "updated": 0,
+        "removed": 0,
+        "failed": 0,
+        "chunks_embedded": 0,
+        "chunks_deleted": 0,
+        "embed_seconds": 0.0,
+    }
+    collection = _get_collection(vector_db)
+    current_names = {pdf.name for pdf in pdf_files}
+
+    # Coleção indexada antes do índice BM25 existir: monta a partir dos chunks gravados
+    if keyword_index is not None and keyword_index.empty and manifest.files:
+        keyword_index.add_from_collection(collection)
+        keyword_index.save()
+        log(f"🔤 Índice BM25 montado a partir da coleção ({len(keyword_index.docs)} chunks)")
+
+    changed = []
+    for i, pdf_file in enumerate(pdf_files, 1):
+        entry = manifest.get(pdf_file.name)
+        sha256 = file_sha256(pdf_file)
+        if entry and entry["sha256"] == sha256:
+            stats["unchanged"] += 1
+            log(f"⏭️  {i}/{len(pdf_files)} {pdf_file.name} (inalterado)")
+        else:
+            changed.append((pdf_file, sha256))
+
+    if changed:
+        log(f"⚙️  Extraindo {len(changed)} PDF(s) com {min(workers, len(changed))} processo(s)...")
+
+    writer = _BatchWriter(collection, vector_db.embedder, manifest, stats, batch_size, log, keyword_index)
+    for pdf_file, sha256, chunks, error in _extract_changed(changed, workers):
+        if error is not None:
+            stats["failed"] += 1
+            log(f"❌ Erro ao processar {pdf_file.name}: {error}")
+            continue
+        entry = manifest.get(pdf_file.name)
+        old_ids = set(entry["chunks"]) if entry else set()
+        writer.add(pdf_file, sha256, chunks, old_ids)
+    writer.flush()
+
+    # PDFs que saíram da pasta docs: apagar seus vetores
+    for file_name in sorted(set(manifest.files) - current_names):
+        entry = manifest.remove(file_name)
+        if entry["chunks"]:
+            collection.delete(ids=entry["chunks"])
+            if keyword_index is not None:
+                for doc_id in entry["chunks"]:
+                    keyword_index.remove(doc_id)
+                keyword_index.save()
+        manifest.save()
+        stats["removed"] += 1
+        stats["chunks_deleted"] += len(entry["chunks"])
+        log(f"🗑️  {file_name} removido da base ({len(entry['chunks'])} chunks)")
+
+    return stats
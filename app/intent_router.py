@@ -0,0 +1,321 @@
+"""
+Roteador de intenções local (sem chamar o Mistral)
+Classifica cada mensagem antes da execução e decide o que o agente precisa:
+- smalltalk ("oi", "obrigado", "tchau"): prompt mínimo, sem RAG, memórias nem ferramentas
+  (confirmações como "ok" e "sim" dependem da conversa e vão para full)
+- knowledge (documentação): RAG + busca na base de conhecimento
+- api ("liste os usuários"): só make_request, sem RAG
+- memory ("meu nome é Ana"): só update_user_memory, sem RAG
+- full: na dúvida, tudo como antes
+
+Os exemplos de cada intenção saem das listas de palavras-chave e frases que já
+estão nas instruções do agente (QUANDO USAR ..., EXEMPLOS PRÁTICOS); cada
+intenção vira um centróide de embeddings do MiniLM (o mesmo embedder do RAG,
+com cache), e a mensagem vai para o centróide mais próximo se a similaridade
+e a margem sobre o segundo forem suficientes.
+"""
+
+import asyncio
+import contextvars
+import os
+import re
+import string
+import threading
+import time
+from collections import Counter, OrderedDict
+from dataclasses import dataclass
+from typing import Any, Optional
+
+import numpy as np
+from agno.utils.log import log_debug
+
+from answer_cache import CachedAnswerMistralChat
+from context_budget import _tool_name, group_history_runs
+from embeddings import normalize_query
+from retrieval_cache import _unit_vector
+
+INTENT_ROUTER_ENABLED = os.getenv("INTENT_ROUTER", "on").lower() not in ("0", "off", "false", "no")
+# Similaridade mínima com o centróide e margem sobre a segunda intenção
+INTENT_MIN_SCORE = float(os.getenv("INTENT_MIN_SCORE", "0.35"))
+INTENT_MIN_MARGIN = float(os.getenv("INTENT_MIN_MARGIN", "0.08"))
+INTENT_CACHE_SIZE = int(os.getenv("INTENT_CACHE_SIZE", "2048"))
+
+# O que cada intenção recebe: RAG, ferramentas (None = todas), prompt mínimo, execuções de histórico
+INTENT_PLANS = {
+    "smalltalk": {"knowledge": False, "tools": set(), "minimal_prompt": True, "history_runs": 1},
+    "knowledge": {"knowledge": True, "tools": {"search_knowledge_base"}},
+    "api": {"knowledge": False, "tools": {"make_request"}},
+    "memory": {"knowledge": False, "tools": {"update_user_memory"}},
+    "full": {"knowledge": True, "tools": None},
+}
+
+# Seções das instruções -> intenção
+INSTRUCTION_SECTIONS = {
+    "QUANDO USAR make_request": "api",
+    "QUANDO USAR update_user_memory": "memory",
+    "QUANDO USAR BASE DE CONHECIMENTO": "knowledge",
+    "SUA BASE DE CONHECIMENTO": "knowledge",
+}
+# Marcadores dos EXEMPLOS PRÁTICOS -> intenção
+EXAMPLE_TAGS = {"[RAG]": "knowledge", "[update_user_memory]": "memory", "[make_request]": "api"}
+
+# Só cumprimentos, agradecimentos e despedidas: nunca pedem ferramenta
+SMALLTALK_EXAMPLES = [
+    "oi", "olá", "ola", "oie", "e aí", "bom dia", "boa tarde", "boa noite", "tudo bem?", "tudo bom?",
+    "como vai?", "obrigado", "obrigada", "muito obrigado pela ajuda", "valeu", "vlw", "tchau",
+    "até logo", "até mais",
+]
+# Confirmações respondem à última pergunta do agente ("Deseja que eu liste os usuários?"):
+# sem o contexto da conversa não dá para saber o que precisam, então vão para "full"
+ACKNOWLEDGEMENTS = [
+    "ok", "okay", "sim", "não", "nao", "certo", "beleza", "blz", "legal", "show", "perfeito",
+    "entendi", "pode ser", "pode", "claro", "isso", "com certeza", "por favor",
+]
+
+SMALLTALK_PROMPT = (
+    "Você é o assistente virtual da NIARA - empresa de tecnologia para turismo.\n"
+    "Responda SEMPRE em PORTUGUÊS BRASILEIRO, de forma breve, simpática e natural.\n"
+    "Se o usuário quiser ajuda com algum produto ou configuração, convide-o a fazer a pergunta."
+)
+
+# Plano da execução atual, decidido uma vez pela mensagem do usuário (pre-hook)
+_run_plan = contextvars.ContextVar("intent_run_plan", default=None)
+
+_QUOTED_RE = re.compile(r"'([^']+)'")
+_PUNCTUATION = str.maketrans("", "", string.punctuation + "¡¿")
+
+
+def _bare(text):
+    """Pergunta normalizada e sem pontuação (atalho para cumprimentos exatos)"""
+    return " ".join(normalize_query(text).translate(_PUNCTUATION).split())
+
+
+def intent_examples(instructions):
+    """Exemplos por intenção, extraídos das instruções do agente + conversa fiada"""
+    examples = {"smalltalk": list(SMALLTALK_EXAMPLES), "knowledge": [], "api": [], "memory": []}
+    section = None
+    for line in instructions or []:
+        line = line.strip()
+        header = next((name for name in INSTRUCTION_SECTIONS if line.startswith(name)), None)
+        if header is not None:
+            section = INSTRUCTION_SECTIONS[header]
+            continue
+        if line.isupper() or (line.endswith(":") and not line.startswith("-")):
+            section = None
+
+        if line.startswith("Usuário:"):
+            tag = next((intent for marker, intent in EXAMPLE_TAGS.items() if line.endswith(marker)), None)
+            quoted = _QUOTED_RE.findall(line)
+            if tag and quoted:
+                examples[tag].append(quoted[0])
+        elif section is not None and line.startswith("-"):
+            if line.startswith(("- Palavras-chave:", "- Frases:")):
+                examples[section].extend(q.rstrip(". ") for q in _QUOTED_RE.findall(line))
+            elif not line.startswith(("- AÇÃO", "- Endpoints")):
+                # Itens da lista de conteúdos da base ("- Configurações de recebimento e PIX")
+                examples[section].append(line.lstrip("- ").strip())
+    return {intent: [e for e in found if e] for intent, found in examples.items() if found}
+
+
+class IntentRouter:
+    """Classificador por centróides de embeddings, com cache por mensagem"""
+
+    def __init__(self, embedder, instructions=None, min_score=INTENT_MIN_SCORE, min_margin=INTENT_MIN_MARGIN,
+                 cache_size=INTENT_CACHE_SIZE):
+        self.embedder = embedder
+        self.instructions = instructions
+        self.min_score = min_score
+        self.min_margin = min_margin
+        self.cache_size = cache_size
+        self.intents = []
+        self._centroids = None
+        self._smalltalk = {_bare(example) for example in SMALLTALK_EXAMPLES}
+        self._acknowledgements = {_bare(example) for example in ACKNOWLEDGEMENTS}
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        # Separado do _lock: o cálculo dos centróides não segura as consultas ao cache
+        self._load_lock = threading.Lock()
+        self._loader = None
+        self.counts = Counter()
+        self.classify_ms = 0.0
+
+    @property
+    def loaded(self):
+        return self._centroids is not None
+
+    def load(self):
+        """Calcular os centróides (uma vez; roda no aquecimento do servidor)"""
+        if self._centroids is not None:
+            return self
+        with self._load_lock:
+            if self._centroids is not None:
+                return self
+            examples = intent_examples(self.instructions)
+            intents, centroids = [], []
+            for intent, texts in examples.items():
+                vectors = [_unit_vector(self.embedder.get_embedding(text)) for text in texts]
+                centroids.append(_unit_vector(np.mean(vectors, axis=0)))
+                intents.append(intent)
+            self.intents = intents
+            self._centroids = np.vstack(centroids)
+            log_debug(f"Roteador de intenções: {', '.join(f'{i} ({len(examples[i])})' for i in intents)}")
+        return self
+
+    def _load_in_background(self):
+        """Mensagem antes do fim do aquecimento (ou sem aquecimento): carregar numa thread"""
+        with self._lock:
+            if self._loader is not None:
+                return
+            self._loader = threading.Thread(target=self.load, name="intent-router-load", daemon=True)
+        self._loader.start()
+
+    def classify(self, text):
+        """(intenção, similaridade); 'full' quando não há confiança suficiente"""
+        key = normalize_query(text)
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key]
+
+        start = time.perf_counter()
+        bare = _bare(text)
+        if bare in self._smalltalk:
+            result = ("smalltalk", 1.0)
+        elif bare in self._acknowledgements:
+            result = ("full", 0.0)
+        elif not self.loaded:
+            # Centróides ainda no aquecimento: a mensagem segue com tudo (sem cache do resultado)
+            self._load_in_background()
+            self.counts["full"] += 1
+            return "full", 0.0
+        else:
+            scores = self._centroids @ _unit_vector(self.embedder.get_embedding(key))
+            order = np.argsort(-scores)
+            best = float(scores[order[0]])
+            second = float(scores[order[1]]) if len(order) > 1 else 0.0
+            if best >= self.min_score and best - second >= self.min_margin:
+                result = (self.intents[order[0]], round(best, 3))
+            else:
+                result = ("full", round(best, 3))
+
+        with self._lock:
+            self.classify_ms += (time.perf_counter() - start) * 1000
+            self.counts[result[0]] += 1
+            self._cache[key] = result
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return result
+
+    def plan(self, text):
+        if not INTENT_ROUTER_ENABLED or not isinstance(text, str) or not text.strip():
+            return "full", INTENT_PLANS["full"]
+        intent, _ = self.classify(text)
+        return intent, INTENT_PLANS[intent]
+
+    def route_run(self, run_input):
+        """Pre-hook do agente: decide o plano da execução pela mensagem do usuário
+
+        Roda antes do RAG automático; as buscas da execução (inclusive as que o
+        modelo faz com search_knowledge_base) seguem este plano, sem reclassificar.
+        """
+        routed = self.plan(run_input.input_content if run_input is not None else None)
+        _run_plan.set(routed)
+        return routed
+
+    async def aroute_run(self, run_input):
+        """route_run para agent.arun (AgentOS): o embedding da mensagem roda fora do event loop"""
+        routed = await asyncio.to_thread(self.plan, run_input.input_content if run_input is not None else None)
+        _run_plan.set(routed)
+        return routed
+
+    def stats(self):
+        total = sum(self.counts.values())
+        return {
+            "enabled": INTENT_ROUTER_ENABLED,
+            "intents": dict(self.counts),
+            "routed": total - self.counts.get("full", 0),
+            "avg_classify_ms": round(self.classify_ms / total, 3) if total else 0.0,
+            "min_score": self.min_score,
+            "min_margin": self.min_margin,
+        }
+
+
+def current_plan():
+    """(intenção, plano) da execução atual, ou None fora de uma execução roteada"""
+    return _run_plan.get()
+
+
+class RoutedVectorDb:
+    """Envolve o banco vetorial: execuções que não precisam de RAG não fazem busca
+
+    O texto da busca não é classificado (pode ser uma consulta escrita pelo
+    modelo); vale o plano da execução, decidido pelo pre-hook route_run.
+    """
+
+    def __init__(self, vector_db, router):
+        self.vector_db = vector_db
+        self.router = router
+
+    def __getattr__(self, name):
+        return getattr(self.vector_db, name)
+
+    @staticmethod
+    def _skip():
+        routed = current_plan()
+        return routed is not None and not routed[1]["knowledge"]
+
+    def search(self, query, limit=5, filters=None):
+        if self._skip():
+            return []
+        return self.vector_db.search(query=query, limit=limit, filters=filters)
+
+    async def async_search(self, query, limit=5, filters=None):
+        if self._skip():
+            return []
+        return await self.vector_db.async_search(query=query, limit=limit, filters=filters)
+
+
+@dataclass
+class RoutedMistralChat(CachedAnswerMistralChat):
+    """CachedAnswerMistralChat que aplica o plano do roteador a cada execução"""
+
+    intent_router: Optional[Any] = None
+
+    def _route(self, messages, kwargs):
+        run_response = kwargs.get("run_response")
+        if self.intent_router is None or run_response is None or run_response.input is None:
+            return kwargs
+        # O plano já decidido pelo pre-hook; sem ele, pela mensagem do usuário
+        intent, plan = current_plan() or self.intent_router.plan(run_response.input.input_content)
+        run_response.metadata = dict(run_response.metadata or {}, intent=intent)
+        if intent == "full":
+            return kwargs
+
+        if plan["tools"] is not None and kwargs.get("tools"):
+            kwargs = dict(kwargs, tools=[t for t in kwargs["tools"] if _tool_name(t) in plan["tools"]] or None)
+            if kwargs["tools"] is None:
+                kwargs["tool_choice"] = None
+
+        if plan.get("minimal_prompt"):
+            system = [m for m in messages if m.role == "system"]
+            history = [m for m in messages if getattr(m, "from_history", False)]
+            runs = group_history_runs(history)
+            keep = {id(m) for run in runs[len(runs) - plan.get("history_runs", 0):] for m in run} if runs else set()
+            for message in system:
+                message.content = SMALLTALK_PROMPT
+            messages[:] = [m for m in messages if not getattr(m, "from_history", False) or id(m) in keep]
+        log_debug(f"Intenção: {intent} (ferramentas: {sorted(plan['tools']) if plan['tools'] is not None else 'todas'})")
+        return kwargs
+
+    def response(self, messages, *args, **kwargs):
+        return super().response(messages, *args, **self._route(messages, kwargs))
+
+    async def aresponse(self, messages, *args, **kwargs):
+        return await super().aresponse(messages, *args, **self._route(messages, kwargs))
+
+    def response_stream(self, messages, *args, **kwargs):
+        yield from super().response_stream(messages, *args, **self._route(messages, kwargs))
+
+    async def aresponse_stream(self, messages, *args, **kwargs):
+        async for event in super().aresponse_stream(messages, *args, **self._route(messages, kwargs)):
+            yield event
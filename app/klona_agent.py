@@ -1,5 +1,6 @@
 import os
 import sys
+from contextlib import asynccontextmanager
 from pathlib import Path
 
 if sys.platform == "win32":
@@ -7,14 +8,25 @@ if sys.platform == "win32":
     sys.stderr.reconfigure(encoding='utf-8')
 
 from agno.agent import Agent
-from agno.db.sqlite import SqliteDb
-from agno.models.mistral import MistralChat
 from agno.os import AgentOS
-from agno.tools.api import CustomApiTools
 from agno.knowledge.knowledge import Knowledge
-from agno.knowledge.embedder.sentence_transformer import SentenceTransformerEmbedder
-from agno.vectordb.chroma import ChromaDb
+from agno.models.mistral import MistralChat
 from dotenv import load_dotenv
+from fastapi.responses import JSONResponse
+
+from api_cache import API_BASE_URL, CachedApiTools, api_response_cache
+from answer_cache import ANSWER_CACHE_ENABLED, ANSWER_CACHE_THRESHOLD, answer_cache
+from context_budget import CONTEXT_TOKEN_BUDGET, context_telemetry
+from embeddings import CachedEmbedder, query_embedding_cache
+from hybrid_search import HybridVectorDb
+from intent_router import INTENT_ROUTER_ENABLED, IntentRouter, RoutedVectorDb
+from knowledge_base import CHROMA_PATH, EMBEDDER_DIMENSIONS, VECTOR_STORE, build_embedder, build_vector_db
+from lazy_loading import STARTUP_MODE, LazyEmbedder, LazyVectorDb, Warmup
+from retrieval_cache import CachedVectorDb, retrieval_cache
+from session_summary import SUMMARY_EVERY_N_TURNS, SUMMARY_MODEL, SUMMARY_RAW_RUNS, RollingSummaryManager
+from storage import build_storage, storage_label
+from tool_calls import TOOL_CALL_TIMEOUT, TOOL_PARALLELISM, ParallelToolsMistralChat
+from tool_output import TOOL_MAX_BYTES, TOOL_MAX_ITEMS
 
 # Carregar variáveis de ambiente (da pasta raiz)
 load_dotenv(dotenv_path='../.env')
@@ -38,19 +50,35 @@ print("Inicializando Assistente Niara com Mistral...")
 print("📚 Configurando base de conhecimento...")
 
 # Configurar embedder (modelo para gerar vetores)
-embedder = SentenceTransformerEmbedder(
-    id="all-MiniLM-L6-v2",  # Modelo leve e eficiente
-)
+# O MiniLM (torch) só é carregado no aquecimento ou na primeira pergunta
+# Perguntas repetidas reaproveitam o vetor do cache LRU em vez de rodar o MiniLM
+model_embedder = LazyEmbedder(factory=build_embedder, dimensions=EMBEDDER_DIMENSIONS)
+embedder = CachedEmbedder(embedder=model_embedder)
 
-# Configurar banco vetorial (ChromaDB)
-vector_db = ChromaDb(
-    collection="klona_knowledge",
-    embedder=embedder,
-)
+# Configurar banco vetorial (ChromaDB persistido ou NumpyVectorDb em memória,
+# VECTOR_STORE=numpy; compartilhado com process_pdfs.py)
+# O banco vetorial também é aberto sob demanda
+# Perguntas parecidas reaproveitam o top-k em cache até a coleção mudar
+base_vector_db = LazyVectorDb(lambda: build_vector_db(embedder), embedder=embedder)
+# Busca híbrida: vetores + BM25 (termos exatos como "PIX Getnet", "MFA"), fundidos por RRF
+# Roteador de intenções local: cumprimentos, API e memória não fazem busca
+intent_router = IntentRouter(embedder)
+vector_db = RoutedVectorDb(CachedVectorDb(HybridVectorDb(base_vector_db)), intent_router)
+
+# Aquecimento: carrega o modelo (com uma inferência de teste) e abre o banco vetorial
+warmup = Warmup([
+    ("Embedder", lambda: model_embedder.get_embedding("aquecimento")),
+    ("Banco vetorial", base_vector_db.load),
+])
+
+if STARTUP_MODE == "eager":
+    warmup.run()
 
 # Criar sistema de conhecimento
+# Com a busca híbrida mais precisa, menos chunks bastam no contexto do Mistral
 knowledge = Knowledge(
     vector_db=vector_db,
+    max_results=int(os.getenv("KNOWLEDGE_MAX_RESULTS", "4")),
 )
 
 # PDFs serão processados separadamente
@@ -62,27 +90,46 @@ print("✅ Base de conhecimento configurada!")
 mistral_agent = Agent(
     name="Assistente Niara",
     
-    # Modelo Mistral
-    model=MistralChat(
+    # Modelo Mistral (prompt ajustado ao orçamento de tokens a cada turno:
+    # memórias, chunks do RAG e histórico ranqueados e cortados por relevância)
+    # Perguntas recorrentes de documentação são respondidas pelo cache de respostas
+    # e cada mensagem recebe só as ferramentas da sua intenção (prompt mínimo para cumprimentos);
+    # várias chamadas de ferramenta na mesma resposta rodam em paralelo, com timeout
+    model=ParallelToolsMistralChat(
         id="mistral-large-latest",  
         api_key=api_key,
+        embedder=embedder,
+        intent_router=intent_router,
     ),
     
     # Base de conhecimento integrada (RAG)
     knowledge=knowledge,
     add_knowledge_to_context=True,  # RAG automático
     search_knowledge=True,          # Busca inteligente
+    # Intenção decidida uma vez por execução, pela mensagem do usuário (antes do RAG);
+    # versão assíncrona: o AgentOS usa arun e o embedding não pode travar o event loop
+    pre_hooks=[intent_router.aroute_run],
     
-    # Database SQLite para persistir o histórico
-    db=SqliteDb(db_file="mistral_agent.db"),
+    # Database para persistir o histórico, escolhido pelo DATABASE_URL (storage.py):
+    # - postgresql://...: Postgres assíncrono com pool, compartilhado entre instâncias
+    # - sem DATABASE_URL: mistral_agent.db (SQLite com índices por usuário + cache das
+    #   sessões recentes; SQLITE_MODE=tuned: WAL, pool de conexões e escritas agrupadas)
+    db=build_storage(os.getenv("DATABASE_URL", "")),
     
     # Memory habilitada - o agente lembra informações sobre o usuário
     enable_agentic_memory=True,
     add_memories_to_context=True,    # Adiciona memórias ao contexto
     
     # Histórico de conversas - ESSENCIAL para contexto
+    # Resumo contínuo da sessão (atualizado a cada N turnos) + só os últimos turnos literais,
+    # para o prompt não crescer com conversas longas
+    enable_session_summaries=True,
+    add_session_summary_to_context=True,
+    session_summary_manager=RollingSummaryManager(
+        model=MistralChat(id=SUMMARY_MODEL, api_key=api_key),
+    ),
     add_history_to_context=True,     # Adiciona histórico ao contexto
-    num_history_runs=10,             # Últimas 10 execuções
+    num_history_runs=SUMMARY_RAW_RUNS,  # Últimas execuções literais (o resto está no resumo)
     search_session_history=True,     # Busca em sessões anteriores
     num_history_sessions=5,          # Últimas 5 sessões
     read_chat_history=True,          # Lê histórico de chat
@@ -92,8 +139,9 @@ mistral_agent = Agent(
     
     # Ferramentas disponíveis
     tools=[
-        CustomApiTools(
-            base_url="https://jsonplaceholder.typicode.com",  # API de teste genérica
+        # Conexões keep-alive + cache dos GETs com TTL/ETag + single-flight (api_cache.py)
+        CachedApiTools(
+            base_url=API_BASE_URL,  # API de teste genérica (jsonplaceholder)
             headers={"Content-Type": "application/json"},
             timeout=30,
             verify_ssl=True,
@@ -169,16 +217,88 @@ instructions=[
 
 print(f"Agente '{mistral_agent.name}' criado com sucesso!")
 
+# Centróides das intenções a partir das palavras-chave das instruções (calculados no aquecimento)
+intent_router.instructions = mistral_agent.instructions
+warmup.steps.append(("Roteador de intenções", intent_router.load))
+if STARTUP_MODE == "eager":
+    intent_router.load()
+
 # ============================================
 # CRIAR AGENTOS (Runtime FastAPI)
 # ============================================
+@asynccontextmanager
+async def lifespan(app):
+    """Aquecer os componentes pesados em segundo plano (o servidor já responde)"""
+    warmup.start()
+    yield
+
+
 agent_os = AgentOS(
     agents=[mistral_agent],
+    lifespan=lifespan,
 )
 
 # Obter a aplicação FastAPI do AgentOS
 app = agent_os.get_app()
 
+
+@app.get("/health/ready")
+def health_ready():
+    """Prontidão: 200 só depois de modelo e banco vetorial carregados (/health = liveness)"""
+    status = warmup.status()
+    status["startup_mode"] = STARTUP_MODE
+    # Escritas agrupadas perdidas não tiram o worker do ar, mas ficam visíveis aqui
+    batcher = getattr(mistral_agent.db, "write_batcher", None)
+    if batcher is not None:
+        writes = batcher.stats()
+        status["sqlite_writes"] = {
+            "status": "degraded" if writes["lost"] else "ok",
+            **{key: writes[key] for key in ("pending", "failures", "retried", "lost", "last_error", "last_failure_at")},
+        }
+    return JSONResponse(status, status_code=200 if warmup.ready else 503)
+
+
+@app.get("/cache/stats")
+def cache_stats():
+    """Estatísticas dos caches de embeddings e de resultados da busca"""
+    return {
+        "query_embedding_cache": query_embedding_cache.stats(),
+        "retrieval_cache": retrieval_cache.stats(),
+        "answer_cache": answer_cache.stats(),
+        "api_response_cache": api_response_cache.stats(),
+        "recent_session_cache": (
+            mistral_agent.db.session_cache.stats() if hasattr(mistral_agent.db, "session_cache") else None
+        ),
+        "sqlite_write_batches": (
+            mistral_agent.db.write_batcher.stats() if hasattr(mistral_agent.db, "write_batcher") else None
+        ),
+    }
+
+
+@app.get("/context/stats")
+def context_stats():
+    """Tokens por fonte (instruções, memórias, RAG, histórico) nas últimas requisições"""
+    stats = context_telemetry.stats()
+    stats["budget"] = CONTEXT_TOKEN_BUDGET
+    stats["intent_router"] = intent_router.stats()
+    return stats
+
+
+@app.post("/cache/answers/purge")
+def purge_answer_cache(question: str = None):
+    """Limpar o cache de respostas (tudo, em todos os workers, ou só perguntas parecidas com `question`)"""
+    if question:
+        removed = answer_cache.purge(embedder.get_embedding(question))
+    else:
+        removed = answer_cache.purge_all_workers()
+    return {"removed": removed, "question": question}
+
+
+if VECTOR_STORE == "numpy":
+    vector_store_label = "NumpyVectorDb (busca exata em memória)"
+else:
+    vector_store_label = f"ChromaDB ({CHROMA_PATH})"
+
 print("\n" + "="*70)
 print("🤖 ASSISTENTE NIARA COM RAG PRONTO!")
 print("="*70)
@@ -188,22 +308,33 @@ print(f"   • Modelo: Mistral Large Latest")
 print(f"   • Tipo: Assistente Niara - Tecnologia para Turismo")
 print(f"   • Reasoning: Desabilitado (respostas diretas em português)")
 print(f"   • Memory: Agentic Memory (controle total)")
-print(f"   • Histórico: Últimas 10 execuções + 5 sessões")
-print(f"   • Contexto: Memórias + Histórico de chat")
+print(f"   • Histórico: Últimas {SUMMARY_RAW_RUNS} execuções + resumo da sessão (a cada {SUMMARY_EVERY_N_TURNS} turnos, {SUMMARY_MODEL}) + 5 sessões")
+print(f"   • 🆕 Orçamento de contexto: {CONTEXT_TOKEN_BUDGET} tokens (memórias, RAG e histórico por relevância)")
+print(f"   • 🆕 Cache de respostas: {'Ativo' if ANSWER_CACHE_ENABLED else 'Desligado'} (similaridade ≥ {ANSWER_CACHE_THRESHOLD}, perguntas só de RAG)")
+print(f"   • 🆕 Roteador de intenções: {'Ativo' if INTENT_ROUTER_ENABLED else 'Desligado'} (cumprimentos com prompt mínimo; RAG e ferramentas só quando a mensagem precisa)")
+print(f"   • Contexto: Memórias + Resumo da sessão + Histórico de chat")
 print(f"   • Inteligência: Detecção automática de intenções")
 print(f"   • Ferramentas: Uso automático sem permissão")
-print(f"   • Database: mistral_agent.db")
-print(f"   • Ferramentas: CustomApiTools (HTTP Requests)")
-print(f"   • API Base: https://jsonplaceholder.typicode.com")
+print(f"   • Database: {storage_label(mistral_agent.db)}")
+print(f"   • Ferramentas: CustomApiTools (HTTP Requests, conexões keep-alive + cache dos GETs)")
+print(f"   • API Base: {API_BASE_URL}")
+print(f"   • 🆕 Chamadas de ferramenta: até {TOOL_PARALLELISM} em paralelo por turno (timeout {TOOL_CALL_TIMEOUT:g}s)")
+print(f"   • 🆕 Respostas da API: {TOOL_MAX_ITEMS} itens por página, até {TOOL_MAX_BYTES} bytes (colunas + linhas)")
 print(f"   • 🆕 Base de Conhecimento: Pronta para documentos")
 print(f"   • 🆕 RAG: Habilitado (busca automática)")
-print(f"   • 🆕 Banco Vetorial: ChromaDB")
-print(f"   • 🆕 Embedder: all-MiniLM-L6-v2")
+print(f"   • 🆕 Banco Vetorial: {vector_store_label}")
+print(f"   • 🆕 Busca: híbrida (vetores + BM25, RRF), {knowledge.max_results} chunks por pergunta")
+print(f"   • 🆕 Embedder: all-MiniLM-L6-v2 (cache LRU de perguntas)")
+print(f"   • 🆕 Inicialização: {STARTUP_MODE} (modelo e banco vetorial {'já carregados' if warmup.ready else 'aquecendo em segundo plano'})")
 print("\nPara iniciar o servidor:")
 print("   cd app && python klona_agent.py")
 print("\nEndpoints disponíveis:")
 print("   • API Documentation: http://localhost:8000/docs")
 print("   • Health Check: http://localhost:8000/health")
+print("   • Readiness: http://localhost:8000/health/ready")
+print("   • Cache Stats: http://localhost:8000/cache/stats")
+print("   • Context Stats: http://localhost:8000/context/stats")
+print("   • Limpar cache de respostas: POST http://localhost:8000/cache/answers/purge")
 print("\nConectar ao AgentOS UI:")
 print("   1. Acesse: https://os.agno.com")
 print("   2. Faça login")
@@ -0,0 +1,98 @@
+"""
+Configuração compartilhada da Base de Conhecimento (RAG)
+Usada pelo agente (klona_agent.py) e pela ingestão de PDFs (process_pdfs.py),
+para que os dois apontem sempre para a mesma coleção ChromaDB persistida.
+"""
+
+import json
+import os
+from pathlib import Path
+
+# Coleção e diretório do ChromaDB (persistido em disco)
+COLLECTION_NAME = "klona_knowledge"
+CHROMA_PATH = os.getenv("CHROMA_PATH", "tmp/chromadb")
+
+# Modelo de embeddings
+EMBEDDER_ID = "all-MiniLM-L6-v2"
+EMBEDDER_DIMENSIONS = 384
+
+# Backend do embedder: "torch" (sentence-transformers) ou "onnx" (ONNX Runtime,
+# modelo gerado por export_onnx.py; mesmos vetores, sem torch na imagem)
+EMBEDDER_BACKEND = os.getenv("EMBEDDER_BACKEND", "torch").lower()
+ONNX_MODEL_DIR = os.getenv("ONNX_MODEL_DIR", "models/all-MiniLM-L6-v2-onnx")
+ONNX_QUANTIZED = os.getenv("ONNX_QUANTIZED", "true").lower() in ("1", "true", "yes")
+
+# Banco vetorial: "chroma" (ChromaDB + HNSW) ou "numpy" (matriz em memória, busca exata)
+VECTOR_STORE = os.getenv("VECTOR_STORE", "chroma").lower()
+
+
+def manifest_path():
+    """Caminho do manifesto de ingestão (fica ao lado da coleção ChromaDB)"""
+    return Path(CHROMA_PATH) / f"{COLLECTION_NAME}.manifest.json"
+
+
+_version_cache = {"stamp": None, "version": 0}
+
+
+def collection_version():
+    """Versão atual da coleção, gravada no manifesto pelo process_pdfs.py.
+
+    Só relê o JSON quando o arquivo muda (mtime/tamanho), então pode ser
+    chamada a cada busca.
+    """
+    path = manifest_path()
+    try:
+        stat = path.stat()
+    except FileNotFoundError:
+        return 0
+
+    stamp = (stat.st_mtime_ns, stat.st_size)
+    if stamp != _version_cache["stamp"]:
+        try:
+            version = json.loads(path.read_text(encoding="utf-8")).get("version", 0)
+        except (OSError, ValueError):
+            # Manifesto sendo substituído neste instante: tenta de novo na próxima busca
+            return _version_cache["version"]
+        _version_cache.update(stamp=stamp, version=version)
+    return _version_cache["version"]
+
+
+def build_embedder(backend=None):
+    """Criar o embedder usado na ingestão e nas buscas"""
+    if (backend or EMBEDDER_BACKEND) == "onnx":
+        from embeddings import OnnxEmbedder
+
+        return OnnxEmbedder(
+            id=EMBEDDER_ID,
+            dimensions=EMBEDDER_DIMENSIONS,
+            model_dir=ONNX_MODEL_DIR,
+            quantized=ONNX_QUANTIZED,
+            num_threads=int(os.getenv("ONNX_THREADS", "0")),
+        )
+
+    from agno.knowledge.embedder.sentence_transformer import SentenceTransformerEmbedder
+
+    return SentenceTransformerEmbedder(
+        id=EMBEDDER_ID,  # Modelo leve e eficiente
+        dimensions=EMBEDDER_DIMENSIONS,
+    )
+
+
+def build_vector_db(embedder=None, store=None):
+    """Criar o banco vetorial (ChromaDB persistente ou NumpyVectorDb)"""
+    if (store or VECTOR_STORE) == "numpy":
+        from numpy_store import NumpyVectorDb
+
+        return NumpyVectorDb(
+            collection=COLLECTION_NAME,
+            embedder=embedder or build_embedder(),
+        )
+
+    from chroma_store import HnswChromaDb
+
+    return HnswChromaDb(
+        collection=COLLECTION_NAME,
+        embedder=embedder or build_embedder(),
+        path=CHROMA_PATH,
+        persistent_client=True,
+    )
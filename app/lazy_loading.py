@@ -0,0 +1,185 @@
+"""
+Carregamento sob demanda dos componentes pesados do agente
+O modelo de embeddings (torch + sentence-transformers) e o ChromaDB só são
+criados no primeiro uso ou pelo aquecimento em segundo plano, então o app HTTP
+sobe na hora (cold start do Render e cada reload do uvicorn).
+"""
+
+import asyncio
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Optional
+
+from agno.knowledge.embedder.base import Embedder
+
+# "lazy": app sobe antes e os componentes aquecem em segundo plano
+# "eager": carrega tudo no import (comportamento antigo)
+STARTUP_MODE = os.getenv("STARTUP_MODE", "lazy").lower()
+
+
+@dataclass
+class LazyEmbedder(Embedder):
+    """Embedder criado por factory() no primeiro uso (ou no aquecimento)"""
+
+    factory: Optional[Callable[[], Embedder]] = None
+    _embedder: Optional[Embedder] = field(default=None, init=False, repr=False)
+    _lock: Any = field(default_factory=threading.Lock, init=False, repr=False)
+
+    def __post_init__(self):
+        if self.factory is None:
+            raise ValueError("LazyEmbedder precisa de uma factory")
+
+    @property
+    def loaded(self):
+        return self._embedder is not None
+
+    def load(self):
+        """Criar o embedder (uma única vez, mesmo com várias threads)"""
+        if self._embedder is None:
+            with self._lock:
+                if self._embedder is None:
+                    self._embedder = self.factory()
+        return self._embedder
+
+    async def async_load(self):
+        # Carregar o modelo leva segundos: fora do event loop
+        if self._embedder is None:
+            await asyncio.to_thread(self.load)
+        return self._embedder
+
+    def __getattr__(self, name):
+        # Atributos do embedder real (ex.: sentence_transformer_client)
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return getattr(self.load(), name)
+
+    def get_embedding(self, text):
+        return self.load().get_embedding(text)
+
+    def get_embedding_and_usage(self, text):
+        return self.load().get_embedding_and_usage(text)
+
+    async def async_get_embedding(self, text):
+        return await (await self.async_load()).async_get_embedding(text)
+
+    async def async_get_embedding_and_usage(self, text):
+        return await (await self.async_load()).async_get_embedding_and_usage(text)
+
+
+class LazyVectorDb:
+    """Banco vetorial criado por factory() no primeiro uso (ou no aquecimento)
+
+    O Knowledge chama exists()/create() no construtor; aqui isso fica para o
+    carregamento, que cria a coleção se ela ainda não existir.
+    """
+
+    def __init__(self, factory, embedder=None):
+        self.factory = factory
+        self.embedder = embedder
+        self._vector_db = None
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self):
+        return self._vector_db is not None
+
+    def load(self):
+        if self._vector_db is None:
+            with self._lock:
+                if self._vector_db is None:
+                    vector_db = self.factory()
+                    if not vector_db.exists():
+                        vector_db.create()
+                    self._vector_db = vector_db
+        return self._vector_db
+
+    async def async_load(self):
+        if self._vector_db is None:
+            await asyncio.to_thread(self.load)
+        return self._vector_db
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return getattr(self.load(), name)
+
+    @property
+    def search_type(self):
+        # Consultado pelo Knowledge a cada busca: não deve forçar o carregamento
+        if self._vector_db is None:
+            from agno.vectordb.search import SearchType
+
+            return SearchType.vector
+        return self._vector_db.search_type
+
+    @search_type.setter
+    def search_type(self, value):
+        self.load().search_type = value
+
+    def exists(self):
+        return True if self._vector_db is None else self._vector_db.exists()
+
+    def create(self):
+        self.load()
+
+    def search(self, query, limit=5, filters=None):
+        return self.load().search(query=query, limit=limit, filters=filters)
+
+    async def async_search(self, query, limit=5, filters=None):
+        return await (await self.async_load()).async_search(query=query, limit=limit, filters=filters)
+
+
+class Warmup:
+    """Aquecimento dos componentes em segundo plano + estado de prontidão"""
+
+    def __init__(self, steps):
+        # steps: lista de (nome, função sem argumentos)
+        self.steps = steps
+        self.state = "pending"
+        self.error = None
+        self.timings = {}
+        self.started_at = None
+        self.finished_at = None
+        self._thread = None
+
+    @property
+    def ready(self):
+        return self.state == "ready"
+
+    def run(self):
+        """Executar todos os passos (bloqueante)"""
+        self.state = "warming"
+        self.started_at = time.time()
+        try:
+            for name, step in self.steps:
+                start = time.perf_counter()
+                step()
+                self.timings[name] = round(time.perf_counter() - start, 3)
+                print(f"🔥 {name} pronto em {self.timings[name]:.2f}s")
+            self.state = "ready"
+        except Exception as e:
+            self.state = "failed"
+            self.error = str(e)
+            print(f"❌ Falha no aquecimento: {e}")
+        finally:
+            self.finished_at = time.time()
+
+    def start(self):
+        """Aquecer numa thread daemon (o app já aceita requisições)"""
+        if self._thread is None and self.state == "pending":
+            self._thread = threading.Thread(target=self.run, name="warmup", daemon=True)
+            self._thread.start()
+
+    def status(self):
+        return {
+            "ready": self.ready,
+            "state": self.state,
+            "error": self.error,
+            "components_seconds": dict(self.timings),
+            "warmup_seconds": (
+                round(self.finished_at - self.started_at, 3)
+                if self.started_at and self.finished_at else None
+            ),
+        }
@@ -0,0 +1,159 @@
+"""
+Fila de mensagens dos webhooks (aceitar agora, processar depois)
+- /webhook só enfileira e responde 202; um pool de workers processa a fila
+- Mensagens do mesmo usuário são processadas uma de cada vez, na ordem de chegada
+- Limites de backpressure (total e por usuário) e métricas de profundidade/latência
+"""
+
+import asyncio
+import os
+import time
+import uuid
+from collections import deque
+
+WEBHOOK_WORKERS = int(os.getenv("WEBHOOK_WORKERS", "8"))
+WEBHOOK_QUEUE_MAX = int(os.getenv("WEBHOOK_QUEUE_MAX", "1000"))
+WEBHOOK_QUEUE_MAX_PER_USER = int(os.getenv("WEBHOOK_QUEUE_MAX_PER_USER", "20"))
+
+# Amostras guardadas para calcular as latências
+LATENCY_SAMPLES = 1000
+
+
+class QueueFull(Exception):
+    """Fila cheia (total ou do usuário): o chamador deve tentar de novo mais tarde"""
+
+    def __init__(self, message, per_user=False):
+        super().__init__(message)
+        self.per_user = per_user
+
+
+class Job:
+    """Mensagem enfileirada"""
+
+    def __init__(self, user_id, message, metadata=None, dedup_key=None, stream=False):
+        self.id = uuid.uuid4().hex
+        self.user_id = user_id
+        self.message = message
+        self.metadata = metadata or {}
+        self.dedup_key = dedup_key
+        self.stream = stream
+        self.enqueued_at = time.monotonic()
+
+
+def _percentile(samples, pct):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct))]
+
+
+class MessageQueue:
+    """Fila com pool de workers, ordem por usuário e backpressure"""
+
+    def __init__(self, handler, workers=WEBHOOK_WORKERS, max_pending=WEBHOOK_QUEUE_MAX,
+                 max_per_user=WEBHOOK_QUEUE_MAX_PER_USER):
+        self.handler = handler
+        self.workers = workers
+        self.max_pending = max_pending
+        self.max_per_user = max_per_user
+
+        # Uma "faixa" por usuário; o user_id só entra em _ready quando
+        # nenhum worker está processando mensagens dele
+        self._lanes = {}
+        self._ready = asyncio.Queue()
+        self._tasks = []
+        self._pending = 0
+        self._in_progress = 0
+
+        self.enqueued = 0
+        self.processed = 0
+        self.failed = 0
+        self.rejected = 0
+        self._wait_times = deque(maxlen=LATENCY_SAMPLES)
+        self._run_times = deque(maxlen=LATENCY_SAMPLES)
+
+    def submit(self, user_id, message, metadata=None, dedup_key=None, stream=False):
+        """Enfileirar uma mensagem (levanta QueueFull se não houver espaço)"""
+        if self._pending >= self.max_pending:
+            self.rejected += 1
+            raise QueueFull(f"Fila cheia ({self._pending} mensagens pendentes)")
+
+        lane = self._lanes.get(user_id)
+        if lane is not None and len(lane) >= self.max_per_user:
+            self.rejected += 1
+            raise QueueFull(f"Muitas mensagens pendentes para {user_id}", per_user=True)
+
+        job = Job(user_id, message, metadata, dedup_key, stream)
+        if lane is None:
+            self._lanes[user_id] = deque([job])
+            self._ready.put_nowait(user_id)
+        else:
+            lane.append(job)
+
+        self._pending += 1
+        self.enqueued += 1
+        return job
+
+    async def start(self):
+        """Iniciar os workers (chamar no startup do app ASGI)"""
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        """Parar os workers (mensagens ainda na fila são descartadas)"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _worker(self):
+        while True:
+            user_id = await self._ready.get()
+            lane = self._lanes[user_id]
+            job = lane.popleft()
+            self._pending -= 1
+            self._in_progress += 1
+
+            started_at = time.monotonic()
+            self._wait_times.append(started_at - job.enqueued_at)
+            try:
+                await self.handler(job)
+                self.processed += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.failed += 1
+                print(f"❌ Erro ao processar mensagem de {job.user_id}: {e}")
+            finally:
+                self._run_times.append(time.monotonic() - started_at)
+                self._in_progress -= 1
+                # Próxima mensagem do mesmo usuário volta para o fim da fila
+                if lane:
+                    self._ready.put_nowait(user_id)
+                else:
+                    del self._lanes[user_id]
+
+    def metrics(self):
+        """Profundidade da fila, contadores e latências (segundos)"""
+        wait_times = list(self._wait_times)
+        run_times = list(self._run_times)
+        return {
+            "workers": self.workers,
+            "depth": self._pending,
+            "in_progress": self._in_progress,
+            "users_waiting": len(self._lanes),
+            "max_pending": self.max_pending,
+            "max_per_user": self.max_per_user,
+            "enqueued": self.enqueued,
+            "processed": self.processed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "wait_seconds": {
+                "avg": round(sum(wait_times) / len(wait_times), 4) if wait_times else 0.0,
+                "p95": round(_percentile(wait_times, 0.95), 4),
+            },
+            "processing_seconds": {
+                "avg": round(sum(run_times) / len(run_times), 4) if run_times else 0.0,
+                "p95": round(_percentile(run_times, 0.95), 4),
+            },
+        }
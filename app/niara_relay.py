@@ -0,0 +1,254 @@
+"""
+Relay assíncrono para o Assistente Niara
+Compartilhado pelos servidores de webhook (webhook_server.py e simple_webhook.py).
+Usa um único httpx.AsyncClient por processo: conexões keep-alive reaproveitadas
+para a API do Niara e para o webhook de resposta, sem bloquear o event loop
+enquanto o agente gera a resposta. As respostas passam por um outbox durável
+(outbox.py) antes de irem para o webhook. No modo streaming, a resposta é
+repassada em pedaços conforme o modelo gera (streaming.py).
+"""
+
+import json
+import os
+from datetime import datetime
+
+import httpx
+
+from outbox import OUTBOX_DB, Outbox
+from single_flight import SingleFlight
+from streaming import NiaraStreamError, iter_chunks, iter_content_deltas
+
+# Webhook fixo para respostas
+RESPONSE_WEBHOOK_URL = "https://webhook.fiqon.app/webhook/a02bb210-fabb-4bcf-9976-601014ae05af/05e23f61-0a62-48da-b7c1-a31507aab6a2"
+
+NIARA_API_URL = os.getenv("NIARA_API_URL", "https://assistente-niara.onrender.com")
+AGENT_NAME = "assistente-niara"
+
+# Pool de conexões HTTP
+RELAY_MAX_CONNECTIONS = int(os.getenv("RELAY_MAX_CONNECTIONS", "200"))
+RELAY_MAX_KEEPALIVE = int(os.getenv("RELAY_MAX_KEEPALIVE", "50"))
+NIARA_TIMEOUT = float(os.getenv("NIARA_TIMEOUT", "30"))
+WEBHOOK_TIMEOUT = float(os.getenv("WEBHOOK_TIMEOUT", "10"))
+
+
+class NiaraRelay:
+    """Cliente assíncrono (pool keep-alive) para o Assistente Niara"""
+
+    def __init__(self, niara_api=NIARA_API_URL, agent_name=AGENT_NAME, response_webhook_url=RESPONSE_WEBHOOK_URL,
+                 outbox_db=OUTBOX_DB):
+        self.niara_api = niara_api
+        self.agent_name = agent_name
+        self.response_webhook_url = response_webhook_url
+        self.outbox_db = outbox_db
+        self.outbox = None
+        # Deduplicação de mensagens repetidas (reenvios do webhook, clique duplo)
+        self.single_flight = SingleFlight()
+        self._client = None
+
+    async def start(self):
+        """Abrir o pool de conexões e o outbox (chamar no startup do app ASGI)"""
+        if self.outbox is None:
+            self.outbox = Outbox(self.outbox_db)
+            await self.outbox.start(self.send_webhook_response)
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=RELAY_MAX_CONNECTIONS,
+                    max_keepalive_connections=RELAY_MAX_KEEPALIVE,
+                ),
+                timeout=httpx.Timeout(NIARA_TIMEOUT, connect=10.0),
+            )
+
+    async def close(self):
+        """Fechar o pool de conexões e o outbox (chamar no shutdown do app ASGI)"""
+        if self.outbox is not None:
+            await self.outbox.stop()
+            self.outbox.close()
+            self.outbox = None
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    @property
+    def client(self):
+        if self._client is None:
+            raise RuntimeError("NiaraRelay não iniciado: chame await relay.start() no startup do app")
+        return self._client
+
+    async def send_to_niara(self, message, user_id=None, metadata=None):
+        """Enviar mensagem para o Assistente Niara"""
+        try:
+            payload = {
+                "message": message,
+                "stream": False,
+                "webhook_url": self.response_webhook_url  # Sempre usar o webhook fixo
+            }
+
+            if user_id:
+                payload["user_id"] = user_id
+
+            if metadata:
+                payload["metadata"] = metadata
+
+            response = await self.client.post(
+                f"{self.niara_api}/agents/{self.agent_name}/run",
+                json=payload,
+            )
+
+            if response.status_code == 200:
+                return response.json()
+            else:
+                return {"error": f"Erro HTTP {response.status_code}: {response.text}"}
+
+        except httpx.TimeoutException:
+            return {"error": "Timeout ao conectar com Niara"}
+        except httpx.ConnectError:
+            return {"error": "Erro de conexão com Niara"}
+        except Exception as e:
+            return {"error": f"Erro inesperado: {str(e)}"}
+
+    async def stream_from_niara(self, message, user_id=None, metadata=None):
+        """Enviar mensagem com stream=True e gerar os trechos da resposta conforme chegam"""
+        payload = {
+            "message": message,
+            "stream": True,
+            "webhook_url": self.response_webhook_url
+        }
+
+        if user_id:
+            payload["user_id"] = user_id
+
+        if metadata:
+            payload["metadata"] = metadata
+
+        try:
+            async with self.client.stream(
+                "POST",
+                f"{self.niara_api}/agents/{self.agent_name}/run",
+                json=payload,
+            ) as response:
+                if response.status_code != 200:
+                    body = (await response.aread()).decode("utf-8", errors="replace")
+                    raise NiaraStreamError(f"Erro HTTP {response.status_code}: {body}")
+                async for delta in iter_content_deltas(response.aiter_lines()):
+                    yield delta
+        except NiaraStreamError:
+            raise
+        except httpx.TimeoutException:
+            raise NiaraStreamError("Timeout ao conectar com Niara")
+        except httpx.ConnectError:
+            raise NiaraStreamError("Erro de conexão com Niara")
+        except httpx.HTTPError as e:
+            # Conexão caiu no meio da resposta (ReadError, RemoteProtocolError, ...)
+            raise NiaraStreamError(f"Conexão com Niara interrompida: {str(e) or type(e).__name__}")
+        except Exception as e:
+            raise NiaraStreamError(f"Erro inesperado: {str(e)}")
+
+    async def stream_events(self, message, user_id=None, metadata=None):
+        """Eventos SSE para o endpoint /stream: pedaços da resposta, depois done (ou error)"""
+        seq = 0
+        try:
+            async for chunk in iter_chunks(self.stream_from_niara(message, user_id, metadata)):
+                seq += 1
+                yield f"event: chunk\ndata: {json.dumps({'seq': seq, 'delta': chunk}, ensure_ascii=False)}\n\n"
+            yield f"event: done\ndata: {json.dumps({'chunks': seq})}\n\n"
+        except NiaraStreamError as e:
+            yield f"event: error\ndata: {json.dumps({'error': str(e)}, ensure_ascii=False)}\n\n"
+
+    async def send_webhook_response(self, webhook_url, data):
+        """Enviar resposta para webhook externo"""
+        try:
+            response = await self.client.post(
+                webhook_url,
+                json=data,
+                timeout=WEBHOOK_TIMEOUT
+            )
+            return response.status_code == 200
+        except Exception as e:
+            print(f"❌ Erro ao enviar webhook: {e}")
+            return False
+
+    async def process_job(self, job):
+        """Processar uma mensagem da fila: chamar o agente e enviar a resposta ao webhook"""
+        try:
+            response_data = await self._run_job(job)
+        except BaseException as e:
+            if job.dedup_key:
+                self.single_flight.release(job.dedup_key, e)
+            raise
+        if job.dedup_key:
+            self.single_flight.resolve(job.dedup_key, response_data)
+        return response_data
+
+    async def _run_job(self, job):
+        if job.stream:
+            return await self._run_streaming_job(job)
+
+        niara_response = await self.send_to_niara(job.message, job.user_id, job.metadata)
+
+        response_data = {
+            "success": "error" not in niara_response,
+            "job_id": job.id,
+            "user_id": job.user_id,
+            "message": job.message,
+            "response": niara_response.get("content", "Erro ao processar mensagem"),
+            "timestamp": datetime.now().isoformat()
+        }
+        if "error" in niara_response:
+            response_data["error"] = niara_response["error"]
+            print(f"❌ Erro do Niara: {niara_response['error']}")
+
+        # Grava antes de entregar: se o receptor falhar, só o POST é repetido
+        await self.outbox.enqueue(self.response_webhook_url, response_data)
+        print(f"📬 Resposta de {job.user_id} no outbox para: {self.response_webhook_url}")
+        return response_data
+
+    async def _run_streaming_job(self, job):
+        """Repassar a resposta ao webhook em pedaços (partial) e depois a resposta final"""
+        parts = []
+        seq = 0
+        error = None
+
+        async def send_partial(chunk):
+            nonlocal seq
+            seq += 1
+            # Pelo outbox: entregas ao mesmo receptor saem na ordem de gravação
+            await self.outbox.enqueue(self.response_webhook_url, {
+                "job_id": job.id,
+                "user_id": job.user_id,
+                "partial": True,
+                "seq": seq,
+                "delta": chunk,
+                "timestamp": datetime.now().isoformat()
+            })
+
+        try:
+            # Os pedaços juntos formam a resposta completa (o buffer não descarta texto)
+            async for chunk in iter_chunks(self.stream_from_niara(job.message, job.user_id, job.metadata)):
+                parts.append(chunk)
+                await send_partial(chunk)
+        except NiaraStreamError as e:
+            error = str(e)
+            print(f"❌ Erro do Niara (streaming): {error}")
+        except Exception as e:
+            # Qualquer falha ainda fecha a sequência: o receptor sempre recebe a final
+            error = f"Erro inesperado: {str(e)}"
+            print(f"❌ Erro no streaming: {error}")
+
+        response_data = {
+            "success": error is None,
+            "job_id": job.id,
+            "user_id": job.user_id,
+            "message": job.message,
+            "response": "".join(parts) if parts else "Erro ao processar mensagem",
+            "partial": False,
+            "final": True,
+            "seq": seq + 1,
+            "timestamp": datetime.now().isoformat()
+        }
+        if error is not None:
+            response_data["error"] = error
+
+        await self.outbox.enqueue(self.response_webhook_url, response_data)
+        print(f"📬 Resposta de {job.user_id} ({seq} pedaços) no outbox para: {self.response_webhook_url}")
+        return response_data
@@ -0,0 +1,395 @@
+"""
+Banco vetorial em memória (NumPy) para a Base de Conhecimento
+Os manuais da pasta docs cabem inteiros na RAM: os vetores ficam numa matriz
+float32 contígua (memory-mapped do disco) e a busca é exata, com um único
+produto matriz-vetor, sem o overhead de um banco.
+
+Layout em disco (NUMPY_STORE_PATH/<coleção>/):
+- current.json: geração atual
+- vectors-<geração>.npy: matriz (n, dim) float32 já normalizada
+- records-<geração>.json: [id, conteúdo, metadados] de cada linha
+Cada gravação cria uma geração nova e troca o current.json de forma atômica,
+então o agente nunca lê uma matriz pela metade enquanto o process_pdfs.py grava.
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import shutil
+import threading
+from pathlib import Path
+
+import numpy as np
+from agno.knowledge.document import Document
+from agno.utils.log import log_debug, log_info, log_warning
+from agno.vectordb.base import VectorDb
+from agno.vectordb.search import SearchType
+
+from embeddings import embed_texts
+
+NUMPY_STORE_PATH = os.getenv("NUMPY_STORE_PATH", "tmp/numpy_store")
+
+
+def _normalize(matrix):
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return (matrix / np.clip(norms, 1e-12, None)).astype(np.float32, copy=False)
+
+
+def _write_atomic(path, write):
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "wb") as f:
+        write(f)
+    os.replace(tmp_path, path)
+
+
+def metadata_matches(metadata, filters):
+    """Filtro simples de metadados: valor exato ou {"$eq"|"$ne"|"$in"|"$nin": ...}"""
+    for key, condition in filters.items():
+        value = metadata.get(key)
+        if isinstance(condition, dict):
+            for op, expected in condition.items():
+                if op == "$eq" and value != expected:
+                    return False
+                if op == "$ne" and value == expected:
+                    return False
+                if op == "$in" and value not in expected:
+                    return False
+                if op == "$nin" and value in expected:
+                    return False
+        elif value != condition:
+            return False
+    return True
+
+
+class NumpyCollection:
+    """Interface de gravação compatível com a coleção do ChromaDB usada na ingestão"""
+
+    def __init__(self, store):
+        self.store = store
+
+    def upsert(self, ids, embeddings, documents, metadatas):
+        self.store.upsert_rows(ids, embeddings, documents, metadatas)
+
+    def delete(self, ids):
+        self.store.delete_rows(set(ids))
+
+    def get(self, include=None):
+        self.store._refresh()
+        return {
+            "ids": list(self.store._ids),
+            "documents": list(self.store._contents),
+            "metadatas": [dict(metadata) for metadata in self.store._metadatas],
+        }
+
+    def count(self):
+        return self.store.count()
+
+
+class NumpyVectorDb(VectorDb):
+    """VectorDb do Agno em NumPy: busca exata (cosseno) em uma matriz memory-mapped"""
+
+    def __init__(self, collection, embedder, path=NUMPY_STORE_PATH, name=None, description=None, id=None):
+        super().__init__(id=id, name=name or collection, description=description)
+        self.collection_name = collection
+        self.embedder = embedder
+        self.path = path
+        self.dir = Path(path) / collection
+        self.search_type = SearchType.vector
+
+        self._lock = threading.Lock()
+        self._stamp = None
+        self._generation = 0
+        self._matrix = np.empty((0, embedder.dimensions or 0), dtype=np.float32)
+        self._ids = []
+        self._contents = []
+        self._metadatas = []
+        self._index = {}
+
+    # ---------- leitura ----------
+
+    @property
+    def current_path(self):
+        return self.dir / "current.json"
+
+    def _refresh(self):
+        """Recarregar se outra execução (ex.: process_pdfs.py) gravou uma geração nova"""
+        try:
+            stat = self.current_path.stat()
+        except FileNotFoundError:
+            return
+        stamp = (stat.st_mtime_ns, stat.st_size)
+        if stamp == self._stamp:
+            return
+        with self._lock:
+            if stamp == self._stamp:
+                return
+            generation = json.loads(self.current_path.read_text(encoding="utf-8"))["generation"]
+            records = json.loads((self.dir / f"records-{generation}.json").read_text(encoding="utf-8"))
+            # mmap: as páginas vêm do page cache do SO, compartilhadas entre workers
+            matrix = np.load(self.dir / f"vectors-{generation}.npy", mmap_mode="r")
+
+            self._ids = [record[0] for record in records]
+            self._contents = [record[1] for record in records]
+            self._metadatas = [record[2] for record in records]
+            self._index = {doc_id: row for row, doc_id in enumerate(self._ids)}
+            self._matrix = matrix
+            self._generation = generation
+            self._stamp = stamp
+            log_debug(f"NumpyVectorDb: geração {generation} carregada ({len(self._ids)} vetores)")
+
+    def count(self):
+        self._refresh()
+        return len(self._ids)
+
+    # ---------- gravação ----------
+
+    def _save(self, ids, contents, metadatas, matrix):
+        self.dir.mkdir(parents=True, exist_ok=True)
+        generation = self._generation + 1
+        matrix = np.ascontiguousarray(matrix, dtype=np.float32)
+
+        _write_atomic(self.dir / f"vectors-{generation}.npy", lambda f: np.save(f, matrix))
+        records = json.dumps(
+            [[doc_id, content, metadata] for doc_id, content, metadata in zip(ids, contents, metadatas)],
+            ensure_ascii=False,
+        )
+        _write_atomic(self.dir / f"records-{generation}.json", lambda f: f.write(records.encode("utf-8")))
+        _write_atomic(
+            self.current_path,
+            lambda f: f.write(json.dumps({"generation": generation, "count": len(ids)}).encode("utf-8")),
+        )
+
+        # Mantém a geração anterior (leitores que ainda não recarregaram)
+        for old in self.dir.glob("*-*.*"):
+            try:
+                old_generation = int(old.stem.split("-", 1)[1])
+            except ValueError:
+                continue
+            if old_generation < generation - 1:
+                try:
+                    old.unlink(missing_ok=True)
+                except OSError:
+                    # Windows: arquivo ainda mapeado por outro processo; sai na próxima gravação
+                    pass
+
+        self._stamp = None
+        self._generation = generation
+        self._refresh()
+
+    def upsert_rows(self, ids, embeddings, contents, metadatas):
+        """Inserir/substituir linhas (ids, matriz de embeddings, textos, metadados)"""
+        self._refresh()
+        vectors = _normalize(np.asarray(embeddings, dtype=np.float32).reshape(len(ids), -1))
+
+        all_ids = list(self._ids)
+        all_contents = list(self._contents)
+        all_metadatas = list(self._metadatas)
+        index = dict(self._index)
+        new_rows = []
+        matrix = np.array(self._matrix, dtype=np.float32)
+        if matrix.size == 0:
+            matrix = matrix.reshape(0, vectors.shape[1])
+
+        for i, doc_id in enumerate(ids):
+            row = index.get(doc_id)
+            if row is None:
+                index[doc_id] = len(all_ids)
+                all_ids.append(doc_id)
+                all_contents.append(contents[i])
+                all_metadatas.append(dict(metadatas[i] or {}))
+                new_rows.append(vectors[i])
+            elif row < len(matrix):
+                matrix[row] = vectors[i]
+                all_contents[row] = contents[i]
+                all_metadatas[row] = dict(metadatas[i] or {})
+            else:
+                # Id repetido dentro do mesmo lote
+                new_rows[row - len(matrix)] = vectors[i]
+                all_contents[row] = contents[i]
+                all_metadatas[row] = dict(metadatas[i] or {})
+
+        if new_rows:
+            matrix = np.vstack([matrix, np.stack(new_rows)])
+        self._save(all_ids, all_contents, all_metadatas, matrix)
+
+    def delete_rows(self, ids=None, where=None):
+        """Apagar linhas por id e/ou por filtro de metadados. Retorna quantas saíram"""
+        self._refresh()
+        keep = [
+            row for row, (doc_id, metadata) in enumerate(zip(self._ids, self._metadatas))
+            if not ((ids is not None and doc_id in ids) or (where is not None and metadata_matches(metadata, where)))
+        ]
+        removed = len(self._ids) - len(keep)
+        if removed:
+            self._save(
+                [self._ids[row] for row in keep],
+                [self._contents[row] for row in keep],
+                [self._metadatas[row] for row in keep],
+                np.asarray(self._matrix)[keep],
+            )
+        return removed
+
+    def get_collection(self):
+        """Coleção para a ingestão (process_pdfs.py) gravar em lote"""
+        return NumpyCollection(self)
+
+    # ---------- VectorDb ----------
+
+    def create(self):
+        if not self.exists():
+            log_debug(f"Criando NumpyVectorDb: {self.dir}")
+            self._save([], [], [], np.empty((0, self.embedder.dimensions or 0), dtype=np.float32))
+        self._refresh()
+
+    async def async_create(self):
+        await asyncio.to_thread(self.create)
+
+    def exists(self):
+        return self.current_path.exists()
+
+    async def async_exists(self):
+        return self.exists()
+
+    def name_exists(self, name):
+        self._refresh()
+        return any(metadata.get("name") == name for metadata in self._metadatas)
+
+    async def async_name_exists(self, name):
+        return self.name_exists(name)
+
+    def id_exists(self, id):
+        self._refresh()
+        return id in self._index
+
+    def content_hash_exists(self, content_hash, user_id=None):
+        self._refresh()
+        return any(metadata.get("content_hash") == content_hash for metadata in self._metadatas)
+
+    def _document_rows(self, content_hash, documents, filters=None):
+        ids, contents, metadatas = [], [], []
+        for document in documents:
+            content = document.content.replace("\x00", "\ufffd")
+            metadata = dict(document.meta_data or {})
+            if filters:
+                metadata.update(filters)
+            metadata["content_hash"] = content_hash
+            if document.name:
+                metadata["name"] = document.name
+            if document.content_id:
+                metadata["content_id"] = document.content_id
+            ids.append(document.id or hashlib.md5(content.encode("utf-8")).hexdigest())
+            contents.append(content)
+            metadatas.append(metadata)
+        return ids, contents, metadatas
+
+    def insert(self, content_hash, documents, filters=None, user_id=None):
+        # Um único dono (a base da Niara): user_id não separa coleções aqui
+        log_info(f"Inserindo {len(documents)} documentos no NumpyVectorDb")
+        ids, contents, metadatas = self._document_rows(content_hash, documents, filters)
+        if ids:
+            self.upsert_rows(ids, embed_texts(self.embedder, contents), contents, metadatas)
+
+    async def async_insert(self, content_hash, documents, filters=None, user_id=None):
+        await asyncio.to_thread(self.insert, content_hash, documents, filters, user_id)
+
+    def upsert_available(self):
+        return True
+
+    def upsert(self, content_hash, documents, filters=None, user_id=None):
+        self.insert(content_hash, documents, filters, user_id)
+
+    async def async_upsert(self, content_hash, documents, filters=None, user_id=None):
+        await asyncio.to_thread(self.upsert, content_hash, documents, filters, user_id)
+
+    def search(self, query, limit=5, filters=None, user_id=None):
+        self._refresh()
+        if isinstance(filters, list):
+            log_warning("Filter Expressions não são suportadas no NumpyVectorDb. Nenhum filtro será aplicado.")
+            filters = None
+        if not self._ids:
+            return []
+
+        embedding = self.embedder.get_embedding(query)
+        if not embedding:
+            return []
+        query_vector = np.asarray(embedding, dtype=np.float32)
+        query_vector /= max(float(np.linalg.norm(query_vector)), 1e-12)
+
+        # Busca exata: um produto matriz-vetor sobre todos os chunks
+        scores = self._matrix @ query_vector
+        if filters:
+            allowed = np.fromiter(
+                (metadata_matches(metadata, filters) for metadata in self._metadatas), dtype=bool, count=len(self._ids)
+            )
+            scores = np.where(allowed, scores, -np.inf)
+
+        k = min(limit, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+
+        documents = []
+        for row in top:
+            score = float(scores[row])
+            if score == -np.inf:
+                break
+            metadata = dict(self._metadatas[row])
+            # Mesmo formato do ChromaDb: distância de cosseno (menor = mais parecido)
+            metadata["distances"] = 1.0 - score
+            metadata["similarity_score"] = 1.0 - score
+            name = metadata.pop("name", None)
+            content_id = metadata.pop("content_id", None)
+            documents.append(Document(
+                id=self._ids[row],
+                name=name,
+                meta_data=metadata,
+                content=self._contents[row],
+                embedder=self.embedder,
+                content_id=content_id,
+            ))
+        return documents
+
+    async def async_search(self, query, limit=5, filters=None, user_id=None):
+        return self.search(query=query, limit=limit, filters=filters)
+
+    def drop(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+        self._stamp = None
+        self._generation = 0
+        self._ids, self._contents, self._metadatas, self._index = [], [], [], {}
+        self._matrix = np.empty((0, self.embedder.dimensions or 0), dtype=np.float32)
+
+    async def async_drop(self):
+        await asyncio.to_thread(self.drop)
+
+    def delete(self):
+        self._refresh()
+        if not self._ids:
+            return False
+        self._save([], [], [], np.empty((0, self._matrix.shape[1]), dtype=np.float32))
+        return True
+
+    def delete_by_id(self, id):
+        return self.delete_rows(ids={id}) > 0
+
+    def delete_by_name(self, name):
+        return self.delete_rows(where={"name": name}) > 0
+
+    def delete_by_metadata(self, metadata):
+        return self.delete_rows(where=metadata) > 0
+
+    def delete_by_content_id(self, content_id, user_id=None):
+        return self.delete_rows(where={"content_id": content_id}) > 0
+
+    def update_metadata(self, content_id, metadata):
+        self._refresh()
+        rows = [row for row, m in enumerate(self._metadatas) if m.get("content_id") == content_id]
+        if not rows:
+            return
+        metadatas = [dict(m) for m in self._metadatas]
+        for row in rows:
+            metadatas[row].update(metadata)
+        self._save(self._ids, self._contents, metadatas, np.asarray(self._matrix))
+
+    def get_supported_search_types(self):
+        return [SearchType.vector.value]
@@ -0,0 +1,252 @@
+"""
+Outbox durável para entrega das respostas no webhook
+A resposta do agente é gravada em SQLite (WAL) antes de qualquer tentativa de
+entrega. Falhas do receptor viram novas tentativas com backoff exponencial e
+jitter, em vez de uma nova execução (cara) do modelo. Cada receptor (URL) tem
+sua própria fila de entrega, então um receptor lento não atrasa os outros.
+Dentro de um receptor a ordem é garantida: enquanto a entrega mais antiga
+espera o backoff, as mais novas (ex.: partial -> final) esperam junto.
+Vários workers (gunicorn) podem dividir o mesmo OUTBOX_DB: cada entrega é
+reservada (status 'sending' + lease) antes do envio, então só um worker a
+envia; reservas de um worker que morreu voltam para 'pending' quando vencem.
+"""
+
+import asyncio
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+
+OUTBOX_DB = os.getenv("OUTBOX_DB", "webhook_outbox.db")
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "12"))
+OUTBOX_BASE_DELAY = float(os.getenv("OUTBOX_BASE_DELAY", "1"))
+OUTBOX_MAX_DELAY = float(os.getenv("OUTBOX_MAX_DELAY", "300"))
+# Tempo de reserva de uma entrega em envio (maior que o timeout do webhook)
+OUTBOX_LEASE_SECONDS = float(os.getenv("OUTBOX_LEASE_SECONDS", "60"))
+# Entregas concluídas ficam guardadas por este tempo (auditoria)
+OUTBOX_RETENTION_SECONDS = 7 * 24 * 3600
+
+# Intervalo máximo entre verificações de entregas vencidas
+POLL_INTERVAL = 1.0
+
+
+class Outbox:
+    """Fila persistente de entregas HTTP com retry por receptor"""
+
+    def __init__(self, db_file=OUTBOX_DB, max_attempts=OUTBOX_MAX_ATTEMPTS,
+                 base_delay=OUTBOX_BASE_DELAY, max_delay=OUTBOX_MAX_DELAY, lease_seconds=OUTBOX_LEASE_SECONDS):
+        self.db_file = db_file
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.lease_seconds = lease_seconds
+
+        self._conn = sqlite3.connect(db_file, check_same_thread=False, isolation_level=None)
+        self._db_lock = threading.Lock()
+        self._init_db()
+
+        self._send = None
+        self._dispatcher = None
+        self._wakeup = None
+        self._receivers = {}
+
+        self.delivered = 0
+        self.retried = 0
+        self.dead = 0
+
+    def _init_db(self):
+        with self._db_lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute("PRAGMA busy_timeout=5000")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS outbox (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    url TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    status TEXT NOT NULL DEFAULT 'pending',
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    next_attempt_at REAL NOT NULL,
+                    last_error TEXT,
+                    created_at REAL NOT NULL,
+                    delivered_at REAL,
+                    lease_until REAL
+                )
+            """)
+            # Bancos criados antes das reservas
+            columns = {row[1] for row in self._conn.execute("PRAGMA table_info(outbox)")}
+            if "lease_until" not in columns:
+                self._conn.execute("ALTER TABLE outbox ADD COLUMN lease_until REAL")
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_outbox_due ON outbox (status, next_attempt_at)"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_outbox_receiver ON outbox (url, status, id)"
+            )
+
+    def _execute(self, sql, params=()):
+        with self._db_lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def _claim(self, row_id):
+        """Reservar a entrega para este worker; False se outro já reservou (ou entregou)"""
+        now = time.time()
+        with self._db_lock:
+            cursor = self._conn.execute(
+                "UPDATE outbox SET status = 'sending', lease_until = ? "
+                "WHERE id = ? AND status = 'pending' AND next_attempt_at <= ?",
+                (now + self.lease_seconds, row_id, now),
+            )
+            return cursor.rowcount == 1
+
+    def _insert(self, url, payload):
+        now = time.time()
+        with self._db_lock:
+            cursor = self._conn.execute(
+                "INSERT INTO outbox (url, payload, next_attempt_at, created_at) VALUES (?, ?, ?, ?)",
+                (url, json.dumps(payload, ensure_ascii=False), now, now),
+            )
+            return cursor.lastrowid
+
+    async def _db(self, sql, params=()):
+        return await asyncio.to_thread(self._execute, sql, params)
+
+    async def enqueue(self, url, payload):
+        """Gravar uma entrega no outbox (já persistida quando retorna)"""
+        row_id = await asyncio.to_thread(self._insert, url, payload)
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return row_id
+
+    async def start(self, send):
+        """Iniciar o despachante. send(url, payload) -> bool (True = entregue)"""
+        if self._dispatcher is not None:
+            return
+        self._send = send
+        self._wakeup = asyncio.Event()
+        await self._db(
+            "DELETE FROM outbox WHERE status = 'delivered' AND delivered_at < ?",
+            (time.time() - OUTBOX_RETENTION_SECONDS,),
+        )
+        self._dispatcher = asyncio.create_task(self._dispatch_loop())
+
+    async def stop(self):
+        """Parar as entregas (o que estiver pendente continua gravado para o próximo start)"""
+        tasks = list(self._receivers.values())
+        if self._dispatcher is not None:
+            tasks.append(self._dispatcher)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._dispatcher = None
+        self._receivers = {}
+
+    def close(self):
+        with self._db_lock:
+            self._conn.close()
+
+    async def _dispatch_loop(self):
+        while True:
+            try:
+                # Reservas vencidas (worker morto ou reiniciado) voltam para a fila
+                await self._db(
+                    "UPDATE outbox SET status = 'pending', lease_until = NULL "
+                    "WHERE status = 'sending' AND lease_until < ?",
+                    (time.time(),),
+                )
+                # Só a entrega mais antiga de cada receptor decide se ele está pronto:
+                # enquanto ela espera o backoff (ou está em envio em outro worker),
+                # as mais novas esperam junto
+                rows = await self._db(
+                    "SELECT url FROM outbox WHERE id IN ("
+                    "SELECT MIN(id) FROM outbox WHERE status IN ('pending', 'sending') GROUP BY url"
+                    ") AND status = 'pending' AND next_attempt_at <= ?",
+                    (time.time(),),
+                )
+                for (url,) in rows:
+                    # Uma tarefa por receptor: entregas em ordem, sem travar os outros
+                    if url not in self._receivers:
+                        self._receivers[url] = asyncio.create_task(self._deliver_receiver(url))
+            except Exception as e:
+                print(f"❌ Erro no outbox: {e}")
+
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _deliver_receiver(self, url):
+        try:
+            while True:
+                rows = await self._db(
+                    "SELECT id, payload, attempts, next_attempt_at, status FROM outbox "
+                    "WHERE url = ? AND status IN ('pending', 'sending') ORDER BY id LIMIT 50",
+                    (url,),
+                )
+                if not rows:
+                    return
+                for row_id, payload, attempts, next_attempt_at, status in rows:
+                    # Fila por receptor: nada mais novo sai antes de uma entrega em backoff
+                    # ou em envio por outro worker
+                    if status != "pending" or next_attempt_at > time.time():
+                        return
+                    if not await asyncio.to_thread(self._claim, row_id):
+                        return
+                    if not await self._deliver(row_id, url, json.loads(payload), attempts):
+                        # Receptor com problema: espera o backoff antes de tentar os próximos
+                        return
+        finally:
+            self._receivers.pop(url, None)
+
+    async def _deliver(self, row_id, url, payload, attempts):
+        try:
+            ok = await self._send(url, payload)
+            error = None if ok else "resposta diferente de 200"
+        except Exception as e:
+            ok, error = False, str(e)
+
+        if ok:
+            await self._db(
+                "UPDATE outbox SET status = 'delivered', attempts = ?, delivered_at = ?, last_error = NULL, "
+                "lease_until = NULL WHERE id = ?",
+                (attempts + 1, time.time(), row_id),
+            )
+            self.delivered += 1
+            return True
+
+        attempts += 1
+        if attempts >= self.max_attempts:
+            await self._db(
+                "UPDATE outbox SET status = 'dead', attempts = ?, last_error = ?, lease_until = NULL WHERE id = ?",
+                (attempts, error, row_id),
+            )
+            self.dead += 1
+            print(f"❌ Entrega {row_id} para {url} descartada após {attempts} tentativas: {error}")
+        else:
+            # Backoff exponencial com "full jitter"
+            delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempts))
+            await self._db(
+                "UPDATE outbox SET status = 'pending', attempts = ?, next_attempt_at = ?, last_error = ?, "
+                "lease_until = NULL WHERE id = ?",
+                (attempts, time.time() + delay, error, row_id),
+            )
+            self.retried += 1
+            print(f"⚠️ Entrega {row_id} para {url} falhou ({error}); nova tentativa em {delay:.1f}s")
+        return False
+
+    async def metrics(self):
+        """Contagem de entregas por status"""
+        counts = dict(await self._db("SELECT status, COUNT(*) FROM outbox GROUP BY status"))
+        return {
+            "pending": counts.get("pending", 0),
+            "sending": counts.get("sending", 0),
+            "delivered": counts.get("delivered", 0),
+            "dead": counts.get("dead", 0),
+            "receivers_in_flight": len(self._receivers),
+            "delivered_since_start": self.delivered,
+            "retries_since_start": self.retried,
+            "dead_since_start": self.dead,
+        }
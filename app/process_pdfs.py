@@ -1,95 +1,105 @@
+import argparse
 import os
 import sys
-import glob
+import time
 from pathlib import Path
 
 if sys.platform == "win32":
     sys.stdout.reconfigure(encoding='utf-8')
     sys.stderr.reconfigure(encoding='utf-8')
 
-from agno.knowledge.knowledge import Knowledge
-from agno.knowledge.embedder.sentence_transformer import SentenceTransformerEmbedder
-from agno.vectordb.chroma import ChromaDb
 from dotenv import load_dotenv
 
-# Carregar variáveis de ambiente
-load_dotenv(dotenv_path='../.env')
-
-print("📚 Processando PDFs da pasta docs...")
-
-# Configurar embedder
-embedder = SentenceTransformerEmbedder(
-    id="all-MiniLM-L6-v2",
-)
-
-# Configurar banco vetorial
-vector_db = ChromaDb(
-    collection="klona_knowledge",
-    embedder=embedder,
-)
-
-# Criar sistema de conhecimento
-knowledge = Knowledge(
-    vector_db=vector_db,
-)
-
-# Caminho para a pasta docs
-docs_path = Path("../docs")
-
-# Verificar se a pasta docs existe
-if not docs_path.exists():
-    print("❌ Pasta 'docs' não encontrada!")
-    print("Crie a pasta 'docs' na raiz do projeto e coloque seus PDFs lá.")
-    sys.exit(1)
-
-# Buscar todos os PDFs na pasta docs
-pdf_files = list(docs_path.glob("*.pdf"))
-
-if not pdf_files:
-    print("❌ Nenhum arquivo PDF encontrado na pasta 'docs'!")
-    print("Coloque seus arquivos PDF na pasta 'docs' e execute novamente.")
-    sys.exit(1)
-
-print(f"📄 Encontrados {len(pdf_files)} arquivos PDF:")
-for pdf in pdf_files:
-    print(f"   • {pdf.name}")
-
-print("\n🔄 Processando PDFs...")
-
-# Processar cada PDF
-for i, pdf_file in enumerate(pdf_files, 1):
-    print(f"\n📄 Processando {i}/{len(pdf_files)}: {pdf_file.name}")
-    
-    try:
-        # Extrair nome do arquivo sem extensão para usar como nome
-        file_name = pdf_file.stem
-        
-        # Adicionar PDF à base de conhecimento
-        knowledge.add_content(
-            path=str(pdf_file),
-            name=file_name,
-            description=f"Documento PDF: {file_name}",
-            metadata={
-                "tipo": "pdf",
-                "categoria": "documento",
-                "arquivo": pdf_file.name,
-                "processado": "sim"
-            }
-        )
-        
-        print(f"✅ {pdf_file.name} processado com sucesso!")
-        
-    except Exception as e:
-        print(f"❌ Erro ao processar {pdf_file.name}: {e}")
-        continue
-
-print(f"\n🎯 Processamento concluído!")
-print(f"📚 Total de PDFs processados: {len(pdf_files)}")
-print("\n🚀 Próximos passos:")
-print("1. Reinicie o agente para carregar os novos documentos")
-print("2. Faça perguntas sobre o conteúdo dos PDFs")
-print("3. O agente usará automaticamente a base de conhecimento!")
-
-print(f"\n📋 PDFs processados:")
-for pdf in pdf_files:
-    print(f"   • {pdf.name}")
+from hybrid_search import KeywordIndex
+from ingestion import IngestManifest, sync_pdfs
+from knowledge_base import build_embedder, build_vector_db, manifest_path
+
+
+def parse_args():
+    """Opções de linha de comando"""
+    parser = argparse.ArgumentParser(description="Processar PDFs da pasta docs na base de conhecimento")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=int(os.getenv("INGEST_WORKERS", os.cpu_count() or 1)),
+        help="Processos para extração/chunking dos PDFs (padrão: número de núcleos)",
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=int(os.getenv("INGEST_BATCH_SIZE", "256")),
+        help="Chunks (de vários PDFs) por lote enviado ao embedder e ao banco vetorial",
+    )
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+
+    # Carregar variáveis de ambiente
+    load_dotenv(dotenv_path='../.env')
+
+    print("📚 Processando PDFs da pasta docs...")
+
+    # Configurar embedder e banco vetorial (mesma coleção usada pelo agente)
+    embedder = build_embedder()
+    vector_db = build_vector_db(embedder)
+
+    # Manifesto de ingestão (hash por arquivo e por chunk)
+    manifest = IngestManifest(manifest_path())
+
+    # Índice invertido BM25 da busca híbrida (atualizado junto com os vetores)
+    keyword_index = KeywordIndex()
+
+    # Caminho para a pasta docs
+    docs_path = Path("../docs")
+
+    # Verificar se a pasta docs existe
+    if not docs_path.exists():
+        print("❌ Pasta 'docs' não encontrada!")
+        print("Crie a pasta 'docs' na raiz do projeto e coloque seus PDFs lá.")
+        sys.exit(1)
+
+    # Buscar todos os PDFs na pasta docs
+    pdf_files = sorted(docs_path.glob("*.pdf"))
+
+    if not pdf_files:
+        print("❌ Nenhum arquivo PDF encontrado na pasta 'docs'!")
+        print("Coloque seus arquivos PDF na pasta 'docs' e execute novamente.")
+        sys.exit(1)
+
+    print(f"📄 Encontrados {len(pdf_files)} arquivos PDF:")
+    for pdf in pdf_files:
+        print(f"   • {pdf.name}")
+
+    print("\n🔄 Sincronizando PDFs (apenas arquivos alterados são reprocessados)...")
+
+    start_time = time.perf_counter()
+    stats = sync_pdfs(
+        pdf_files, vector_db, manifest,
+        workers=args.workers, batch_size=args.batch_size, keyword_index=keyword_index,
+    )
+    elapsed = time.perf_counter() - start_time
+
+    print(f"\n🎯 Processamento concluído!")
+    print(f"📚 PDFs atualizados: {stats['updated']} | inalterados: {stats['unchanged']} | "
+          f"removidos: {stats['removed']} | com erro: {stats['failed']}")
+    print(f"🧩 Chunks embedados: {stats['chunks_embedded']} | chunks apagados: {stats['chunks_deleted']}")
+    print(f"🔤 Índice BM25: {len(keyword_index.docs)} chunks, {len(keyword_index.postings)} termos")
+    if stats["chunks_embedded"] and stats["embed_seconds"] > 0:
+        throughput = stats["chunks_embedded"] / stats["embed_seconds"]
+        print(f"⚡ Embedding: {throughput:.1f} chunks/s ({stats['embed_seconds']:.1f}s no modelo)")
+    print(f"⏱️  Tempo total: {elapsed:.1f}s ({args.workers} processo(s) de extração)")
+    print("\n🚀 Próximos passos:")
+    print("1. Reinicie o agente para carregar os novos documentos")
+    print("2. Faça perguntas sobre o conteúdo dos PDFs")
+    print("3. O agente usará automaticamente a base de conhecimento!")
+
+    print(f"\n📋 PDFs processados:")
+    for pdf in pdf_files:
+        print(f"   • {pdf.name}")
+
+
+# O pool de processos reimporta este módulo nos workers (spawn no Windows/macOS)
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Relatório de tempo de inicialização do klona_agent.py
+Roda o import do agente com `python -X importtime` num processo separado e
+mostra os módulos mais caros, o tempo até o app existir e (opcionalmente)
+quanto leva o aquecimento do modelo e do ChromaDB.
+
+Uso:
+    cd app && python profile_startup.py [--top 25] [--eager] [--warmup]
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+if sys.platform == "win32":
+    sys.stdout.reconfigure(encoding='utf-8')
+    sys.stderr.reconfigure(encoding='utf-8')
+
+# Executado no processo filho: importa o agente e, se pedido, aquece os componentes
+CHILD_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+import klona_agent
+import_seconds = time.perf_counter() - start
+if "--warmup" in sys.argv and not klona_agent.warmup.ready:
+    klona_agent.warmup.run()
+print("__PROFILE__" + json.dumps({
+    "import_seconds": import_seconds,
+    "warmup": klona_agent.warmup.status(),
+}))
+"""
+
+
+def parse_importtime(stderr):
+    """Linhas do -X importtime -> lista de (self_us, cumulative_us, módulo)"""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        try:
+            self_us, cumulative_us, module = line[len("import time:"):].split("|", 2)
+            # Formato: " <indentação de 2 espaços por nível>módulo"
+            rows.append((int(self_us), int(cumulative_us), module[1:].rstrip()))
+        except ValueError:
+            continue
+    return rows
+
+
+def top_level_packages(rows):
+    """Tempo de import por pacote de primeiro nível (ex.: torch, chromadb, agno)
+
+    Soma o tempo próprio de todos os módulos do pacote, em qualquer nível do
+    relatório: torch importado por sentence_transformers, que foi importado
+    pelo klona_agent, conta para torch (e não para quem o importou).
+    """
+    totals = {}
+    for self_us, _, module in rows:
+        package = module.strip().split(".")[0]
+        totals[package] = totals.get(package, 0) + self_us
+    return sorted(totals.items(), key=lambda item: item[1], reverse=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Perfil de inicialização do klona_agent.py")
+    parser.add_argument("--top", type=int, default=25, help="Quantos módulos mostrar")
+    parser.add_argument("--eager", action="store_true", help="Medir com STARTUP_MODE=eager")
+    parser.add_argument("--warmup", action="store_true", help="Medir também o aquecimento")
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    env["STARTUP_MODE"] = "eager" if args.eager else "lazy"
+    # A chave só é usada nas chamadas ao modelo, não no import
+    env.setdefault("MISTRAL_API_KEY", "profile-startup")
+    env["PYTHONIOENCODING"] = "utf-8"
+
+    command = [sys.executable, "-X", "importtime", "-c", CHILD_SCRIPT]
+    if args.warmup:
+        command.append("--warmup")
+
+    print(f"⏱️ Perfilando import do klona_agent (STARTUP_MODE={env['STARTUP_MODE']})...")
+    start = time.perf_counter()
+    result = subprocess.run(command, env=env, capture_output=True, text=True, encoding="utf-8")
+    wall_seconds = time.perf_counter() - start
+
+    profile = None
+    for line in result.stdout.splitlines():
+        if line.startswith("__PROFILE__"):
+            profile = json.loads(line[len("__PROFILE__"):])
+
+    if result.returncode != 0 or profile is None:
+        print("❌ Falha ao importar klona_agent:")
+        print(result.stderr[-3000:])
+        sys.exit(1)
+
+    rows = parse_importtime(result.stderr)
+
+    print("\n" + "=" * 70)
+    print("📊 INICIALIZAÇÃO DO KLONA_AGENT")
+    print("=" * 70)
+    print(f"   • Processo completo: {wall_seconds:.2f}s")
+    print(f"   • Import do klona_agent (app pronto para bind): {profile['import_seconds']:.2f}s")
+    warmup = profile["warmup"]
+    if warmup["components_seconds"]:
+        for name, seconds in warmup["components_seconds"].items():
+            print(f"   • Aquecimento {name}: {seconds:.2f}s")
+    else:
+        print("   • Aquecimento: não executado (fica para o startup do servidor)")
+
+    print("\n📦 Pacotes por tempo de import (tempo próprio somado em todos os níveis):")
+    for package, self_us in top_level_packages(rows)[:args.top]:
+        print(f"   {self_us / 1e6:8.3f}s  {package}")
+
+    print(f"\n🐢 Top {args.top} módulos por tempo próprio:")
+    for self_us, cumulative_us, module in sorted(rows, reverse=True)[:args.top]:
+        print(f"   {self_us / 1e6:8.3f}s  (cumulativo {cumulative_us / 1e6:7.3f}s)  {module.strip()}")
+    print("=" * 70)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+"""
+Cache semântico de resultados da Base de Conhecimento
+Perguntas com embedding muito parecido (similaridade de cosseno acima do
+limiar) reaproveitam o top-k já buscado, sem nova consulta ao banco vetorial.
+O cache é invalidado sozinho quando o process_pdfs.py altera a coleção.
+"""
+
+import copy
+import json
+import os
+import threading
+import time
+
+import numpy as np
+
+from knowledge_base import collection_version
+
+
+def _filters_key(filters):
+    return json.dumps(filters, sort_keys=True, default=str) if filters else ""
+
+
+def _unit_vector(embedding):
+    vector = np.asarray(embedding, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm > 0 else vector
+
+
+class SemanticResultCache:
+    """Cache LRU de resultados de busca, indexado pelo embedding da pergunta"""
+
+    def __init__(self, threshold=0.95, max_entries=512, ttl_seconds=3600):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._version = None
+        self._entries = []
+        self._matrix = None
+        self._lock = threading.Lock()
+
+    def _check_version(self, version):
+        if version != self._version:
+            if self._entries:
+                self.invalidations += 1
+            self._entries = []
+            self._matrix = None
+            self._version = version
+
+    def lookup(self, embedding, limit, filters, version):
+        """Retornar os documentos de uma pergunta parecida já buscada (ou None)"""
+        query = _unit_vector(embedding)
+        filters_key = _filters_key(filters)
+        now = time.monotonic()
+
+        with self._lock:
+            self._check_version(version)
+            if self._entries:
+                if self._matrix is None:
+                    self._matrix = np.vstack([entry["vector"] for entry in self._entries])
+                scores = self._matrix @ query
+                for idx in np.argsort(-scores):
+                    if scores[idx] < self.threshold:
+                        break
+                    entry = self._entries[idx]
+                    if entry["limit"] == limit and entry["filters"] == filters_key and entry["expires_at"] > now:
+                        self.hits += 1
+                        entry["last_used"] = now
+                        return copy.deepcopy(entry["documents"])
+            self.misses += 1
+            return None
+
+    def store(self, embedding, limit, filters, version, documents):
+        with self._lock:
+            self._check_version(version)
+            now = time.monotonic()
+            self._entries = [entry for entry in self._entries if entry["expires_at"] > now]
+            if len(self._entries) >= self.max_entries:
+                # Remove o resultado usado há mais tempo
+                # (por posição: comparar as entradas compararia os vetores numpy)
+                oldest = min(range(len(self._entries)), key=lambda idx: self._entries[idx]["last_used"])
+                del self._entries[oldest]
+            self._entries.append({
+                "vector": _unit_vector(embedding),
+                "limit": limit,
+                "filters": _filters_key(filters),
+                "documents": copy.deepcopy(documents),
+                "expires_at": now + self.ttl_seconds,
+                "last_used": now,
+            })
+            self._matrix = None
+
+    def clear(self):
+        with self._lock:
+            self._entries = []
+            self._matrix = None
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "threshold": self.threshold,
+                "collection_version": self._version,
+                "hits": self.hits,
+                "misses": self.misses,
+                "invalidations": self.invalidations,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            }
+
+
+# Cache compartilhado por todas as requisições do processo (AgentOS)
+retrieval_cache = SemanticResultCache(
+    threshold=float(os.getenv("RETRIEVAL_CACHE_THRESHOLD", "0.95")),
+    max_entries=int(os.getenv("RETRIEVAL_CACHE_SIZE", "512")),
+    ttl_seconds=float(os.getenv("RETRIEVAL_CACHE_TTL", "3600")),
+)
+
+
+class CachedVectorDb:
+    """Envolve um banco vetorial do Agno e cacheia o resultado de search()
+
+    Todos os outros atributos/métodos são repassados ao banco original,
+    então pode ser usado direto em Knowledge(vector_db=...).
+    """
+
+    def __init__(self, vector_db, cache=None, version_fn=collection_version):
+        self.vector_db = vector_db
+        self.cache = cache or retrieval_cache
+        self.version_fn = version_fn
+
+    def __getattr__(self, name):
+        return getattr(self.vector_db, name)
+
+    def search(self, query, limit=5, filters=None):
+        # Com o CachedEmbedder, este embedding é reaproveitado pelo search() abaixo
+        embedding = self.vector_db.embedder.get_embedding(query)
+        if not embedding:
+            return self.vector_db.search(query=query, limit=limit, filters=filters)
+
+        version = self.version_fn()
+        documents = self.cache.lookup(embedding, limit, filters, version)
+        if documents is None:
+            documents = self.vector_db.search(query=query, limit=limit, filters=filters)
+            self.cache.store(embedding, limit, filters, version, documents)
+        return documents
+
+    async def async_search(self, query, limit=5, filters=None):
+        embedding = await self.vector_db.embedder.async_get_embedding(query)
+        if not embedding:
+            return await self.vector_db.async_search(query=query, limit=limit, filters=filters)
+
+        version = self.version_fn()
+        documents = self.cache.lookup(embedding, limit, filters, version)
+        if documents is None:
+            documents = await self.vector_db.async_search(query=query, limit=limit, filters=filters)
+            self.cache.store(embedding, limit, filters, version, documents)
+        return documents
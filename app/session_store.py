@@ -0,0 +1,269 @@
+"""
+Armazenamento das sessões do agente (mistral_agent.db) otimizado para o histórico
+A busca em sessões anteriores faz sempre a mesma consulta:
+    WHERE session_type=? AND user_id=? ORDER BY created_at DESC LIMIT N
+(mais um COUNT(*) do mesmo filtro). A tabela do Agno não indexa user_id na
+tabela de sessões, então a consulta varre a tabela inteira e fica mais lenta
+a cada usuário novo. Aqui:
+- índices compostos (user_id, session_type, created_at) tornam a consulta e a
+  contagem proporcionais às sessões do usuário, não ao tamanho do banco
+- um cache em memória guarda as sessões recentes de cada usuário, invalidado
+  a cada escrita deste processo (e por tempo, para escritas de outros workers)
+
+Benchmark com banco sintético: python benchmark_sessions.py
+"""
+
+import inspect
+import os
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+
+from agno.db.sqlite import SqliteDb
+from agno.utils.log import log_debug, log_warning
+from sqlalchemy import text
+
+# Sessões recentes em cache por usuário (0 desliga o cache)
+SESSION_CACHE_USERS = int(os.getenv("SESSION_CACHE_USERS", "1000"))
+# Outros workers gravam no mesmo banco: depois disso o cache é relido
+SESSION_CACHE_TTL = float(os.getenv("SESSION_CACHE_TTL", "30"))
+# Maior LIMIT atendido pelo cache (num_history_sessions, busca de sessões)
+SESSION_CACHE_MAX_LIMIT = int(os.getenv("SESSION_CACHE_MAX_LIMIT", "20"))
+
+
+def session_indexes(session_table, runs_table=None):
+    """Índices para as consultas por usuário (nome, tabela, colunas)"""
+    indexes = [
+        (f"ix_{session_table}_user_type_created", session_table, "user_id, session_type, created_at DESC"),
+        (f"ix_{session_table}_user_updated", session_table, "user_id, updated_at DESC"),
+    ]
+    if runs_table:
+        indexes.append((f"ix_{runs_table}_user_created", runs_table, "user_id, created_at DESC"))
+    return indexes
+
+
+def create_session_indexes(engine, session_table="agno_sessions", runs_table="agno_runs"):
+    """Criar os índices que faltam (idempotente)
+
+    Devolve (criados, pendentes): pendentes são os de tabelas que o Agno ainda não criou.
+    """
+    created, pending = [], []
+    with engine.begin() as conn:
+        tables = {row[0] for row in conn.execute(text("SELECT name FROM sqlite_master WHERE type='table'"))}
+        existing = {row[0] for row in conn.execute(text("SELECT name FROM sqlite_master WHERE type='index'"))}
+        for name, table, columns in session_indexes(session_table, runs_table):
+            if table not in tables:
+                pending.append(name)
+                continue
+            if name in existing:
+                continue
+            conn.execute(text(f'CREATE INDEX IF NOT EXISTS "{name}" ON "{table}" ({columns})'))
+            created.append(name)
+        if created:
+            # Estatísticas para o planejador escolher os índices novos
+            conn.execute(text("ANALYZE"))
+    return created, pending
+
+
+def drop_session_indexes(engine, session_table="agno_sessions", runs_table="agno_runs"):
+    """Remover os índices (usado pelo benchmark para medir o antes/depois)"""
+    with engine.begin() as conn:
+        for name, _, _ in session_indexes(session_table, runs_table):
+            conn.execute(text(f'DROP INDEX IF EXISTS "{name}"'))
+
+
+@lru_cache(maxsize=None)
+def _signature(function):
+    return inspect.signature(function)
+
+
+def bound_user_id(function, *args, **kwargs):
+    """user_id de uma chamada a um método do SqliteDb, passado por nome ou por posição"""
+    try:
+        return _signature(function).bind_partial(*args, **kwargs).arguments.get("user_id")
+    except TypeError:
+        return None
+
+
+class RecentSessionCache:
+    """LRU por usuário com as últimas sessões lidas do banco"""
+
+    def __init__(self, max_users=SESSION_CACHE_USERS, ttl=SESSION_CACHE_TTL):
+        self.max_users = max_users
+        self.ttl = ttl
+        self._entries = OrderedDict()  # user_id -> {chave da consulta: (momento, sessões)}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get(self, user_id, key):
+        with self._lock:
+            entry = self._entries.get(user_id, {}).get(key)
+            if entry is None or time.monotonic() - entry[0] > self.ttl:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(user_id)
+            self.hits += 1
+            return list(entry[1])
+
+    def put(self, user_id, key, sessions):
+        if self.max_users <= 0:
+            return
+        with self._lock:
+            self._entries.setdefault(user_id, {})[key] = (time.monotonic(), list(sessions))
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_users:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id=None):
+        """Esquecer um usuário (ou todos, quando a escrita não diz de quem é)"""
+        with self._lock:
+            self.invalidations += 1
+            if user_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(user_id, None)
+
+    def stats(self):
+        with self._lock:
+            users = len(self._entries)
+        total = self.hits + self.misses
+        return {
+            "users": users,
+            "max_users": self.max_users,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+        }
+
+
+class IndexedSqliteDb(SqliteDb):
+    """SqliteDb com índices por usuário e cache das sessões recentes de cada usuário"""
+
+    # Parâmetros de get_sessions que o cache sabe atender
+    _CACHEABLE_ARGS = {"session_type", "user_id", "limit", "sort_by", "sort_order", "deserialize", "include_runs"}
+
+    def __init__(self, *args, session_cache=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.session_cache = session_cache if session_cache is not None else RecentSessionCache()
+        self._indexes_ready = False
+        self._indexes_lock = threading.Lock()
+
+    def ensure_indexes(self):
+        """Criar os índices assim que a tabela de sessões existir (o Agno a cria sob demanda)"""
+        if self._indexes_ready:
+            return
+        with self._indexes_lock:
+            if self._indexes_ready:
+                return
+            try:
+                created, pending = create_session_indexes(
+                    self.db_engine, self.session_table_name, getattr(self, "runs_table_name", None)
+                )
+            except Exception as e:
+                log_warning(f"Não foi possível criar os índices de sessões: {e}")
+                return
+            if created:
+                log_debug(f"Índices de sessões criados: {', '.join(created)}")
+            self._indexes_ready = not pending
+
+    def _cache_key(self, kwargs):
+        """Chave da consulta de sessões recentes de um usuário, ou None se não for cacheável"""
+        if (
+            kwargs.get("user_id") is None
+            or not set(kwargs) <= self._CACHEABLE_ARGS
+            or kwargs.get("deserialize", True) is False
+            or kwargs.get("sort_by") not in (None, "created_at")
+            or kwargs.get("limit") is None
+            or kwargs["limit"] > SESSION_CACHE_MAX_LIMIT
+        ):
+            return None
+        session_type = kwargs.get("session_type")
+        return (
+            getattr(session_type, "value", session_type),
+            kwargs["limit"],
+            kwargs.get("sort_order"),
+            kwargs.get("include_runs", True),
+        )
+
+    # ---------- leitura ----------
+
+    def get_sessions(self, *args, **kwargs):
+        self.ensure_indexes()
+        key = None if args else self._cache_key(kwargs)
+        if key is None:
+            return super().get_sessions(*args, **kwargs)
+
+        user_id = kwargs["user_id"]
+        sessions = self.session_cache.get(user_id, key)
+        if sessions is None:
+            sessions = super().get_sessions(**kwargs)
+            self.session_cache.put(user_id, key, sessions)
+        return sessions
+
+    # ---------- escrita: invalidar o usuário afetado ----------
+
+    @staticmethod
+    def _user_of(session):
+        if isinstance(session, dict):
+            return session.get("user_id")
+        return getattr(session, "user_id", None)
+
+    def upsert_session(self, session, *args, **kwargs):
+        result = super().upsert_session(session, *args, **kwargs)
+        self.ensure_indexes()
+        self.session_cache.invalidate(self._user_of(session))
+        return result
+
+    def upsert_sessions(self, sessions, *args, **kwargs):
+        result = super().upsert_sessions(sessions, *args, **kwargs)
+        self.ensure_indexes()
+        for user_id in {self._user_of(session) for session in sessions}:
+            self.session_cache.invalidate(user_id)
+        return result
+
+    def _written_user(self, name, args, kwargs, record=None):
+        """Usuário afetado por uma escrita (None = não dá para saber: invalida todos)
+
+        O Agno passa session_id/user_id ora por nome, ora por posição.
+        """
+        user_id = bound_user_id(getattr(SqliteDb, name), self, *args, **kwargs)
+        if user_id is None and record is not None:
+            user_id = self._user_of(record)
+        return user_id
+
+    def upsert_run(self, *args, **kwargs):
+        result = super().upsert_run(*args, **kwargs)
+        self.ensure_indexes()
+        run = args[0] if args else kwargs.get("run")
+        self.session_cache.invalidate(self._written_user("upsert_run", args, kwargs, run))
+        return result
+
+    def rename_session(self, *args, **kwargs):
+        result = super().rename_session(*args, **kwargs)
+        self.session_cache.invalidate(self._written_user("rename_session", args, kwargs))
+        return result
+
+    def delete_session(self, *args, **kwargs):
+        result = super().delete_session(*args, **kwargs)
+        self.session_cache.invalidate(self._written_user("delete_session", args, kwargs))
+        return result
+
+    def delete_sessions(self, *args, **kwargs):
+        result = super().delete_sessions(*args, **kwargs)
+        self.session_cache.invalidate(self._written_user("delete_sessions", args, kwargs))
+        return result
+
+    def delete_run(self, *args, **kwargs):
+        result = super().delete_run(*args, **kwargs)
+        self.session_cache.invalidate()
+        return result
+
+    def delete_runs(self, *args, **kwargs):
+        result = super().delete_runs(*args, **kwargs)
+        self.session_cache.invalidate()
+        return result
@@ -0,0 +1,107 @@
+"""
+Resumo contínuo das conversas (uma por sessão, gravado em mistral_agent.db)
+Em vez de reenviar o histórico inteiro ao Mistral, o agente recebe:
+- o resumo da sessão (system prompt, <summary_of_previous_interactions>)
+- as últimas SUMMARY_RAW_RUNS execuções literais
+O resumo é atualizado a cada SUMMARY_EVERY_N_TURNS turnos, de forma
+incremental: resumo anterior + turnos novos (não a conversa toda).
+"""
+
+import os
+from dataclasses import dataclass
+from textwrap import dedent
+
+from agno.models.message import Message
+from agno.models.utils import get_model
+from agno.session.summary import SessionSummaryManager
+from agno.utils.log import log_debug
+
+SUMMARY_EVERY_N_TURNS = max(1, int(os.getenv("SUMMARY_EVERY_N_TURNS", "4")))
+# Execuções literais no contexto; precisa cobrir os turnos ainda não resumidos
+SUMMARY_RAW_RUNS = max(int(os.getenv("SUMMARY_RAW_RUNS", "4")), SUMMARY_EVERY_N_TURNS - 1)
+# Modelo do resumo (mais barato que o das respostas)
+SUMMARY_MODEL = os.getenv("SUMMARY_MODEL", "mistral-small-latest")
+
+# Chave em session_data com o controle do resumo
+SUMMARY_STATE_KEY = "rolling_summary"
+
+ROLLING_SUMMARY_PROMPT = dedent("""\
+    Você mantém o resumo de uma conversa entre um usuário e o assistente virtual da Niara.
+    Atualize o resumo anterior com os novos turnos, extraindo:
+    - Summary (str): resumo conciso em português do que importa para continuar o atendimento
+      (quem é o usuário, o que pediu, o que já foi respondido ou resolvido, pendências).
+    - Topics (Optional[List[str]]): assuntos tratados na conversa.
+    Não repita detalhes irrelevantes e mantenha o resumo curto, mesmo em conversas longas.
+    """)
+
+
+@dataclass
+class RollingSummaryManager(SessionSummaryManager):
+    """SessionSummaryManager incremental, atualizado a cada N turnos"""
+
+    every_n_turns: int = SUMMARY_EVERY_N_TURNS
+
+    def __post_init__(self):
+        if self.session_summary_prompt is None:
+            self.session_summary_prompt = ROLLING_SUMMARY_PROMPT
+        super().__post_init__()
+
+    @staticmethod
+    def _state(session):
+        if session.session_data is None:
+            session.session_data = {}
+        return session.session_data.setdefault(SUMMARY_STATE_KEY, {"summarized_runs": 0})
+
+    def pending_runs(self, session):
+        """Execuções da sessão que ainda não entraram no resumo"""
+        return len(session.runs or []) - self._state(session)["summarized_runs"]
+
+    def _prepare_summary_messages(self, session=None):
+        """Resumo anterior + apenas os turnos novos"""
+        if not session:
+            return None
+        self.model = get_model(self.model)
+        if self.model is None:
+            return None
+
+        # O gerenciador é compartilhado entre requisições: nada de guardar estado em self
+        conversation = session.get_messages(
+            last_n_runs=max(1, self.pending_runs(session)), limit=self.conversation_limit
+        )
+        if not conversation:
+            return None
+        system_message = self.get_system_message(
+            conversation=conversation, response_format=self.get_response_format(self.model)
+        )
+
+        previous = session.summary.summary if session.summary is not None else None
+        if previous:
+            system_message.content = (
+                f"<previous_summary>\n{previous}\n</previous_summary>\n\n" + system_message.content
+            )
+        return [system_message, Message(role="user", content=self.summary_request_message)]
+
+    def _should_update(self, session):
+        pending = self.pending_runs(session)
+        if pending < self.every_n_turns:
+            log_debug(f"Resumo da sessão: {pending}/{self.every_n_turns} turnos novos, sem atualizar")
+            return False
+        return True
+
+    def _mark_updated(self, session, summary):
+        if summary is not None:
+            self._state(session)["summarized_runs"] = len(session.runs or [])
+
+    def create_session_summary(self, session, run_metrics=None):
+        if session is None or not self._should_update(session):
+            return None
+        summary = super().create_session_summary(session, run_metrics=run_metrics)
+        self._mark_updated(session, summary)
+        return summary
+
+    async def acreate_session_summary(self, session, run_metrics=None):
+        if session is None or not self._should_update(session):
+            return None
+        summary = await super().acreate_session_summary(session, run_metrics=run_metrics)
+        self._mark_updated(session, summary)
+        return summary
@@ -0,0 +1,120 @@
+"""
+Deduplicação (single-flight) de mensagens repetidas nos webhooks
+Plataformas de chat reenviam o mesmo webhook e usuários mandam a mesma
+mensagem duas vezes. Cópias com a mesma chave (usuário, mensagem, chave de
+idempotência) se juntam à execução em andamento e recebem o mesmo resultado,
+sem uma segunda chamada ao modelo.
+
+Depois de concluída, a chave só fica na janela quando o chamador mandou uma
+chave de idempotência (ou message_id): sem ela, repetir "sim" ou "ok" dois
+minutos depois é uma mensagem nova e precisa de resposta.
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import time
+
+DEDUP_WINDOW_SECONDS = float(os.getenv("DEDUP_WINDOW_SECONDS", "120"))
+
+
+def dedup_key(user_id, message, idempotency_key=None, scope="webhook"):
+    """Chave de deduplicação: usuário + mensagem normalizada + chave de idempotência
+
+    O escopo separa endpoints que devolvem resultados em formatos diferentes
+    (/webhook entrega no webhook de resposta, /send responde na hora).
+    """
+    normalized = " ".join(message.split()).lower()
+    raw = json.dumps([scope, user_id, normalized, idempotency_key or ""], ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def idempotency_key_from(request, data):
+    """Chave de idempotência enviada pelo chamador (header ou corpo), se houver"""
+    return (
+        request.headers.get("Idempotency-Key")
+        or data.get("idempotency_key")
+        or data.get("message_id")
+    )
+
+
+class SingleFlight:
+    """Uma execução por chave; cópias dentro da janela aguardam o mesmo resultado"""
+
+    def __init__(self, window_seconds=DEDUP_WINDOW_SECONDS):
+        self.window_seconds = window_seconds
+        self._entries = {}
+        self.started = 0
+        self.deduplicated = 0
+
+    def _purge(self):
+        now = time.monotonic()
+        expired = [
+            key for key, entry in self._entries.items()
+            if entry["expires_at"] <= now and entry["future"].done()
+        ]
+        for key in expired:
+            del self._entries[key]
+
+    def claim(self, key, keep=False):
+        """Registrar a chave. Retorna (entrada, nova); nova=False para duplicatas
+
+        keep=True (chamador com chave de idempotência) mantém o resultado na
+        janela depois de concluído; senão a chave sai assim que termina.
+        """
+        self._purge()
+        entry = self._entries.get(key)
+        if entry is not None:
+            self.deduplicated += 1
+            return entry, False
+
+        entry = {
+            "future": asyncio.get_running_loop().create_future(),
+            "expires_at": time.monotonic() + self.window_seconds,
+            "job_id": None,
+            "keep": keep,
+        }
+        self._entries[key] = entry
+        self.started += 1
+        return entry, True
+
+    def resolve(self, key, result):
+        """Entregar o resultado para todas as cópias aguardando"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return
+        if not entry["future"].done():
+            entry["future"].set_result(result)
+        # Erros e mensagens sem chave de idempotência não ficam na janela
+        if not entry["keep"] or (isinstance(result, dict) and "error" in result):
+            self._entries.pop(key, None)
+
+    def release(self, key, error=None):
+        """Liberar a chave sem resultado (ex.: fila cheia ou falha inesperada)"""
+        entry = self._entries.pop(key, None)
+        if entry is not None and not entry["future"].done():
+            entry["future"].set_result({"error": str(error) if error else "Execução cancelada"})
+
+    async def run(self, key, fn, keep=False):
+        """Executar fn() uma vez por chave. Retorna (resultado, compartilhado)"""
+        entry, is_new = self.claim(key, keep=keep)
+        if not is_new:
+            return await asyncio.shield(entry["future"]), True
+
+        try:
+            result = await fn()
+        except BaseException as e:
+            self.release(key, e)
+            raise
+        self.resolve(key, result)
+        return result, False
+
+    def metrics(self):
+        self._purge()
+        return {
+            "window_seconds": self.window_seconds,
+            "tracked_keys": len(self._entries),
+            "started": self.started,
+            "deduplicated": self.deduplicated,
+        }
@@ -0,0 +1,372 @@
+"""
+Modo de armazenamento SQLite ajustado para requisições concorrentes (SQLITE_MODE=tuned)
+- WAL: leitores não bloqueiam o escritor e vice-versa
+- busy_timeout: quem encontra o banco ocupado espera em vez de falhar com
+  "database is locked"
+- synchronous=NORMAL (seguro com WAL), cache e mmap maiores, temp em memória
+- pool de conexões por worker (o engine é recriado após o fork, ver start_agent.py)
+- escritas agrupadas: as várias gravações de uma execução (execução, sessão,
+  métricas, memórias) entram numa fila e são gravadas juntas, numa única
+  transação, no máximo SQLITE_WRITE_BATCH_MS depois. Qualquer leitura grava
+  a fila antes, então o agente sempre lê o que acabou de escrever. Escritas
+  que falham voltam para a fila (SQLITE_WRITE_RETRIES vezes); as que se
+  perdem aparecem em /health/ready e /cache/stats.
+"""
+
+import atexit
+import contextvars
+import os
+import threading
+import time
+
+from agno.utils.log import log_debug, log_warning
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import QueuePool
+
+from session_store import IndexedSqliteDb
+
+SQLITE_MODE = os.getenv("SQLITE_MODE", "tuned").lower()  # tuned | default
+
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL").upper()
+SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", "20000"))
+SQLITE_MMAP_SIZE_MB = int(os.getenv("SQLITE_MMAP_SIZE_MB", "256"))
+SQLITE_POOL_SIZE = int(os.getenv("SQLITE_POOL_SIZE", "5"))
+SQLITE_MAX_OVERFLOW = int(os.getenv("SQLITE_MAX_OVERFLOW", "10"))
+# Janela para juntar as escritas numa transação (0 = gravar na hora)
+SQLITE_WRITE_BATCH_MS = int(os.getenv("SQLITE_WRITE_BATCH_MS", "50"))
+# Novas tentativas de uma escrita agrupada que falhou (depois disso ela é perdida)
+SQLITE_WRITE_RETRIES = int(os.getenv("SQLITE_WRITE_RETRIES", "2"))
+
+
+# Ordem das escritas dentro de um lote
+WRITE_ORDER = {"session": 0, "run": 1, "memory": 2}
+
+
+def sqlite_pragmas():
+    """PRAGMAs aplicados em cada conexão nova"""
+    return [
+        "PRAGMA journal_mode=WAL",
+        f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}",
+        f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}",
+        f"PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KB}",
+        f"PRAGMA mmap_size={SQLITE_MMAP_SIZE_MB * 1024 * 1024}",
+        "PRAGMA temp_store=MEMORY",
+        "PRAGMA foreign_keys=ON",
+    ]
+
+
+def create_sqlite_engine(db_file):
+    """Engine com pool de conexões e PRAGMAs de concorrência"""
+    from pathlib import Path
+
+    db_path = Path(db_file).resolve()
+    db_path.parent.mkdir(parents=True, exist_ok=True)
+    engine = create_engine(
+        f"sqlite:///{db_path}",
+        poolclass=QueuePool,
+        pool_size=SQLITE_POOL_SIZE,
+        max_overflow=SQLITE_MAX_OVERFLOW,
+        # Mesmo timeout no driver (a espera pelo lock acontece no sqlite3)
+        connect_args={"timeout": SQLITE_BUSY_TIMEOUT_MS / 1000, "check_same_thread": False},
+    )
+
+    @event.listens_for(engine, "connect")
+    def _on_connect(dbapi_connection, connection_record):
+        # O sqlite3 abre transações por conta própria e quebra SAVEPOINTs
+        # (usados pelas escritas agrupadas): o SQLAlchemy passa a emitir o BEGIN
+        dbapi_connection.isolation_level = None
+        cursor = dbapi_connection.cursor()
+        for pragma in sqlite_pragmas():
+            cursor.execute(pragma)
+        cursor.close()
+
+    @event.listens_for(engine, "begin")
+    def _on_begin(conn):
+        # Lotes de escrita pegam o lock de escrita já no início (sem upgrade
+        # de leitura para escrita, que falha sem esperar o busy_timeout)
+        conn.exec_driver_sql("BEGIN IMMEDIATE" if conn.info.get("write_batch") else "BEGIN")
+
+    return engine
+
+
+def _snapshot(obj):
+    """Cópia do objeto no momento da escrita (a execução continua alterando o original)"""
+    try:
+        return type(obj).from_dict(obj.to_dict())
+    except Exception:
+        return obj
+
+
+class WriteBatcher:
+    """Fila de escritas gravada em lote, numa única transação
+
+    Escritas do mesmo registro (ex.: a execução salva várias vezes durante o
+    turno) são fundidas: só a última é gravada. Uma escrita que falha volta
+    para a fila no próximo lote (a não ser que uma mais nova do mesmo registro
+    já esteja lá); depois de `retries` novas tentativas ela é contada como perdida.
+    """
+
+    def __init__(self, engine, window_ms=SQLITE_WRITE_BATCH_MS, prepare=None, retries=SQLITE_WRITE_RETRIES):
+        self.engine = engine
+        self.window = window_ms / 1000
+        self.retries = retries
+        # Roda uma vez antes do primeiro lote, fora da transação (ex.: criar tabelas)
+        self.prepare = prepare
+        self._prepared = False
+        self._pending = {}  # chave do registro -> (função, args, kwargs, tentativas)
+        self._flushing = False
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._connection = contextvars.ContextVar(f"write_batch_{id(self)}", default=None)
+        self._bypass = contextvars.ContextVar(f"write_batch_bypass_{id(self)}", default=False)
+        self._thread = None
+        self._pid = None
+        self.batches = 0
+        self.writes = 0
+        self.coalesced = 0
+        self.failures = 0
+        self.retried = 0
+        self.lost = 0
+        self.last_error = None
+        self.last_failure_at = None
+        atexit.register(self.flush)
+
+    @property
+    def enabled(self):
+        return self.window > 0
+
+    def connection(self):
+        """Conexão da transação em lote, se esta thread estiver gravando a fila"""
+        return self._connection.get()
+
+    def bypassed(self):
+        return self._bypass.get()
+
+    def submit(self, key, function, *args, **kwargs):
+        with self._lock:
+            if key in self._pending:
+                self.coalesced += 1
+                del self._pending[key]
+            self._pending[key] = (function, args, kwargs, 0)
+        self._ensure_thread()
+        self._wakeup.set()
+
+    def _ensure_thread(self):
+        # A thread não sobrevive ao fork dos workers: recriar no processo atual
+        if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name="sqlite-write-batcher", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait()
+            time.sleep(self.window)
+            self._wakeup.clear()
+            self.flush()
+
+    def flush(self):
+        """Gravar tudo o que está na fila numa transação; retorna quantas escritas
+
+        Quem chega durante uma gravação espera o commit (para não ler dados antigos).
+        """
+        if not self._pending and not self._flushing:
+            return 0
+        with self._flush_lock:
+            with self._lock:
+                # Tudo vai no mesmo commit: sessões antes das execuções (chave estrangeira)
+                keys = sorted(self._pending, key=lambda key: WRITE_ORDER.get(key[0], len(WRITE_ORDER)))
+                pending, self._pending = [(key, self._pending[key]) for key in keys], {}
+                self._flushing = bool(pending)
+            if not pending:
+                return 0
+            try:
+                try:
+                    failed = self._write(pending)
+                except Exception as e:
+                    # Commit falhou: nada do lote foi gravado
+                    failed = [(key, entry, e) for key, entry in pending]
+                self._retry(failed)
+            finally:
+                self._flushing = False
+            return len(pending) - len(failed)
+
+    def _write(self, pending):
+        """Gravar o lote; retorna as escritas que falharam [(chave, escrita, erro)]"""
+        self._prepare()
+        failed = []
+        with self.engine.connect() as conn:
+            conn.info["write_batch"] = True
+            transaction = conn.begin()
+            token = self._connection.set(conn)
+            try:
+                for key, entry in pending:
+                    function, args, kwargs, _ = entry
+                    try:
+                        function(*args, **kwargs)
+                    except Exception as e:
+                        # Cada escrita roda no seu SAVEPOINT: uma falha não desfaz as outras
+                        failed.append((key, entry, e))
+                transaction.commit()
+            except Exception:
+                transaction.rollback()
+                raise
+            finally:
+                self._connection.reset(token)
+                conn.info.pop("write_batch", None)
+        self.batches += 1
+        self.writes += len(pending) - len(failed)
+        log_debug(f"SQLite: {len(pending) - len(failed)} escritas gravadas numa transação")
+        return failed
+
+    def _retry(self, failed):
+        """Devolver as escritas que falharam para a fila (ou contá-las como perdidas)"""
+        if not failed:
+            return
+        with self._lock:
+            for key, (function, args, kwargs, attempts), error in failed:
+                self.failures += 1
+                self.last_error = f"{function.__name__}: {error}"
+                self.last_failure_at = time.time()
+                if key in self._pending:
+                    # Já existe uma versão mais nova do registro na fila
+                    continue
+                if attempts < self.retries:
+                    self.retried += 1
+                    self._pending[key] = (function, args, kwargs, attempts + 1)
+                    log_warning(f"Falha numa escrita agrupada ({self.last_error}); nova tentativa no próximo lote")
+                else:
+                    self.lost += 1
+                    log_warning(f"Escrita agrupada perdida após {attempts + 1} tentativas ({self.last_error})")
+        if self._pending:
+            self._ensure_thread()
+            self._wakeup.set()
+
+    def _prepare(self):
+        # O Agno cria tabelas por outra conexão: dentro do lote ela esperaria
+        # o lock da própria transação do lote
+        if self.prepare is None or self._prepared:
+            return
+        token = self._bypass.set(True)
+        try:
+            self.prepare()
+            self._prepared = True
+        except Exception as e:
+            log_warning(f"Falha ao preparar as tabelas para as escritas agrupadas: {e}")
+        finally:
+            self._bypass.reset(token)
+
+    def stats(self):
+        return {
+            "window_ms": int(self.window * 1000),
+            "pending": len(self._pending),
+            "batches": self.batches,
+            "writes": self.writes,
+            "coalesced": self.coalesced,
+            "failures": self.failures,
+            "retried": self.retried,
+            "lost": self.lost,
+            "last_error": self.last_error,
+            "last_failure_at": self.last_failure_at,
+            "writes_per_batch": round(self.writes / self.batches, 2) if self.batches else 0.0,
+        }
+
+
+class _BatchAwareSessionFactory:
+    """Substitui db.Session: dentro do lote, sessões presas à transação do lote
+    (cada uma num SAVEPOINT); fora dele, grava a fila antes de qualquer acesso"""
+
+    def __init__(self, scoped_session, batcher):
+        self.scoped_session = scoped_session
+        self.batcher = batcher
+
+    def __call__(self):
+        conn = self.batcher.connection()
+        if conn is not None:
+            return Session(bind=conn, join_transaction_mode="create_savepoint")
+        if not self.batcher.bypassed():
+            self.batcher.flush()
+        return self.scoped_session()
+
+    def __getattr__(self, name):
+        return getattr(self.scoped_session, name)
+
+
+class TunedSqliteDb(IndexedSqliteDb):
+    """IndexedSqliteDb com WAL, busy_timeout, pool de conexões e escritas agrupadas"""
+
+    def __init__(self, db_file=None, db_engine=None, write_batch_ms=SQLITE_WRITE_BATCH_MS, **kwargs):
+        if db_engine is None and db_file is not None:
+            db_engine = create_sqlite_engine(db_file)
+        super().__init__(db_engine=db_engine, **kwargs)
+        self.db_file = db_file
+        self.write_batcher = WriteBatcher(self.db_engine, window_ms=write_batch_ms, prepare=self._prepare_tables)
+        self.Session = _BatchAwareSessionFactory(self.Session, self.write_batcher)
+
+    def reset_after_fork(self):
+        """Chamado em cada worker: conexões do processo mestre não podem ser reusadas"""
+        self.db_engine.dispose(close=False)
+
+    def flush(self):
+        return self.write_batcher.flush()
+
+    def _prepare_tables(self):
+        for table_type in ("sessions", "runs", "memories"):
+            try:
+                self._get_table(table_type=table_type, create_table_if_not_found=True)
+            except Exception as e:
+                log_debug(f"Tabela {table_type} não criada: {e}")
+        self.ensure_indexes()
+
+    # ---------- escritas enfileiradas ----------
+
+    def _queued(self, args, kwargs):
+        """Só as escritas "dispare e esqueça" do agente vão para a fila
+
+        O agente passa tudo por nome. Quem passa deserialize (ex.: routers do
+        AgentOS) ou argumentos por posição usa o retorno, que precisa ser o
+        registro gravado: essas escritas vão direto (a fila é gravada antes,
+        pelo db.Session).
+        """
+        return self.write_batcher.enabled and not args and "deserialize" not in kwargs
+
+    def upsert_session(self, session, *args, **kwargs):
+        if not self._queued(args, kwargs):
+            return super().upsert_session(session, *args, **kwargs)
+        # O cache de sessões recentes não pode responder antes da gravação
+        self.session_cache.invalidate(self._user_of(session))
+        self.write_batcher.submit(
+            ("session", session.session_id), super().upsert_session, _snapshot(session), *args, **kwargs
+        )
+        return session
+
+    def upsert_run(self, run, *args, **kwargs):
+        if not self._queued(args, kwargs):
+            return super().upsert_run(run, *args, **kwargs)
+        self.session_cache.invalidate(self._written_user("upsert_run", (run,), kwargs, run))
+        run_id = run.get("run_id") if isinstance(run, dict) else run.run_id
+        data = run if isinstance(run, dict) else run.to_dict()
+        self.write_batcher.submit(("run", run_id), super().upsert_run, data, *args, **kwargs)
+
+    def upsert_user_memory(self, memory, *args, **kwargs):
+        if not self._queued(args, kwargs):
+            return super().upsert_user_memory(memory, *args, **kwargs)
+        self.write_batcher.submit(
+            ("memory", memory.memory_id or id(memory)), super().upsert_user_memory, _snapshot(memory), *args, **kwargs
+        )
+        return memory
+
+
+def build_agent_db(db_file, mode=None):
+    """Banco do agente conforme SQLITE_MODE (tuned | default)"""
+    mode = (mode or SQLITE_MODE).lower()
+    if mode == "tuned":
+        return TunedSqliteDb(db_file=db_file)
+    return IndexedSqliteDb(db_file=db_file)
@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+Entrada de produção do Assistente Niara (usada pelo render.yaml e pelo Dockerfile)
+- N workers (gunicorn + uvicorn) para o app do AgentOS
+- O processo mestre carrega o modelo de embeddings uma vez antes do fork:
+  os workers compartilham os mesmos pesos por copy-on-write em vez de N cópias
+- Desligamento gracioso e reciclagem de workers após um número de requisições
+
+Desenvolvimento (reload automático): DEBUG=true python start_agent.py
+"""
+
+import gc
+import os
+import sys
+
+if sys.platform == "win32":
+    sys.stdout.reconfigure(encoding='utf-8')
+    sys.stderr.reconfigure(encoding='utf-8')
+
+# Modelo carregado no mestre, ChromaDB aberto em cada worker (ver preload_agent)
+os.environ.setdefault("STARTUP_MODE", "lazy")
+
+HOST = os.getenv("HOST", "0.0.0.0")
+PORT = int(os.getenv("PORT", "8000"))
+DEBUG = os.getenv("DEBUG", "false").lower() in ("1", "true", "yes")
+LOG_LEVEL = os.getenv("LOG_LEVEL", "info")
+
+# Reciclagem: cada worker é reiniciado após MAX_REQUESTS (+ jitter, para não
+# reiniciarem todos juntos), limitando vazamentos de memória
+MAX_REQUESTS = int(os.getenv("MAX_REQUESTS", "1000"))
+MAX_REQUESTS_JITTER = int(os.getenv("MAX_REQUESTS_JITTER", "100"))
+# Tempo para terminar as requisições em andamento ao desligar/reciclar
+GRACEFUL_TIMEOUT = int(os.getenv("GRACEFUL_TIMEOUT", "30"))
+# Respostas do modelo podem demorar: worker sem sinal de vida por mais que isso é reiniciado
+WORKER_TIMEOUT = int(os.getenv("WORKER_TIMEOUT", "120"))
+KEEPALIVE = int(os.getenv("KEEPALIVE", "5"))
+
+
+def cpu_count():
+    """CPUs disponíveis para este processo (respeita affinity/cgroups quando possível)"""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def worker_count():
+    """WEB_CONCURRENCY (padrão do Render/Heroku) ou uma por CPU"""
+    workers = os.getenv("WEB_CONCURRENCY")
+    if workers:
+        return max(1, int(workers))
+    return cpu_count()
+
+
+def threads_per_worker(workers):
+    """Dividir as CPUs entre os workers para a inferência (torch/ONNX) não disputar núcleos"""
+    return max(1, cpu_count() // workers)
+
+
+def preload_agent():
+    """Importar o agente e carregar o modelo no processo mestre (antes do fork)"""
+    import klona_agent
+
+    # Só os pesos: a primeira inferência (e o ChromaDB, que usa SQLite e não
+    # pode ser compartilhado entre processos) ficam para o aquecimento de cada worker
+    klona_agent.model_embedder.load()
+
+    # Tudo o que existe até aqui é permanente: tirar do GC evita que as
+    # coletas nos workers escrevam nessas páginas e quebrem o copy-on-write
+    gc.collect()
+    gc.freeze()
+    return klona_agent.app
+
+
+def worker_class():
+    try:
+        import uvicorn_worker  # noqa: F401
+
+        return "uvicorn_worker.UvicornWorker"
+    except ImportError:
+        return "uvicorn.workers.UvicornWorker"
+
+
+def post_fork(server, worker):
+    """Configurar cada worker logo após o fork"""
+    threads = threads_per_worker(server.cfg.workers)
+    try:
+        import torch
+
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+
+    # Backend ONNX: a sessão é criada no worker, já com o limite de threads
+    import klona_agent
+
+    embedder = klona_agent.model_embedder.load()
+    if getattr(embedder, "num_threads", None) == 0:
+        embedder.num_threads = threads
+
+    # Conexões (SQLite ou Postgres) abertas no mestre não podem ser usadas depois do fork
+    from storage import reset_after_fork
+
+    reset_after_fork(klona_agent.mistral_agent.db)
+    print(f"👷 Worker {worker.pid} iniciado ({threads} threads de inferência)")
+
+
+def worker_exit(server, worker):
+    # Gravar as escritas agrupadas que ainda estão na fila
+    import klona_agent
+    from storage import flush_storage
+
+    flush_storage(klona_agent.mistral_agent.db)
+    print(f"👋 Worker {worker.pid} encerrado")
+
+
+def serve_gunicorn(workers):
+    from gunicorn.app.base import BaseApplication
+
+    class AgentApplication(BaseApplication):
+        def __init__(self, app, options):
+            self.application = app
+            self.options = options
+            super().__init__()
+
+        def load_config(self):
+            for key, value in self.options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            return self.application
+
+    options = {
+        "bind": f"{HOST}:{PORT}",
+        "workers": workers,
+        "worker_class": worker_class(),
+        "preload_app": True,
+        "max_requests": MAX_REQUESTS,
+        "max_requests_jitter": MAX_REQUESTS_JITTER,
+        "graceful_timeout": GRACEFUL_TIMEOUT,
+        "timeout": WORKER_TIMEOUT,
+        "keepalive": KEEPALIVE,
+        "loglevel": LOG_LEVEL,
+        "accesslog": "-",
+        "post_fork": post_fork,
+        "worker_exit": worker_exit,
+    }
+    AgentApplication(preload_agent(), options).run()
+
+
+def serve_uvicorn(workers):
+    """Sem gunicorn (ex.: Windows): workers do uvicorn, cada um com seu modelo"""
+    import uvicorn
+
+    uvicorn.run(
+        "klona_agent:app",
+        host=HOST,
+        port=PORT,
+        workers=workers,
+        log_level=LOG_LEVEL,
+        timeout_graceful_shutdown=GRACEFUL_TIMEOUT,
+        limit_max_requests=MAX_REQUESTS or None,
+    )
+
+
+def main():
+    if DEBUG:
+        # Modo desenvolvimento: um processo com reload automático
+        import klona_agent
+
+        klona_agent.agent_os.serve(app="klona_agent:app", host=HOST, port=PORT, reload=True)
+        return
+
+    workers = worker_count()
+    print("🚀 Assistente Niara - modo produção")
+    print(f"   • Endereço: http://{HOST}:{PORT}")
+    print(f"   • Workers: {workers} (CPUs disponíveis: {cpu_count()})")
+    print(f"   • Reciclagem: a cada {MAX_REQUESTS} requisições (+ até {MAX_REQUESTS_JITTER})")
+    print(f"   • Desligamento gracioso: {GRACEFUL_TIMEOUT}s")
+
+    try:
+        import gunicorn  # noqa: F401
+    except ImportError:
+        print("⚠️ gunicorn não disponível: usando workers do uvicorn (sem modelo compartilhado)")
+        serve_uvicorn(workers)
+        return
+
+    print("   • Modelo de embeddings: carregado uma vez no mestre (compartilhado via copy-on-write)")
+    serve_gunicorn(workers)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+"""
+Streaming das respostas do Assistente Niara
+- Leitura dos eventos SSE (ou JSON por linha) de uma execução do AgentOS
+- Agrupamento dos tokens em pedaços de tamanho configurável para repasse
+  (o que acumulou sai após STREAM_FLUSH_SECONDS mesmo se o modelo parar de gerar)
+"""
+
+import asyncio
+import json
+import os
+import time
+
+TRUTHY = ("1", "true", "yes", "on")
+
+
+def parse_flag(value, default=False):
+    """Booleano de um env var ou de um campo JSON ("false" e "0" são falsos)"""
+    if value is None:
+        return default
+    if isinstance(value, str):
+        return value.strip().lower() in TRUTHY
+    return bool(value)
+
+
+STREAM_MODE = parse_flag(os.getenv("STREAM_MODE"), default=False)
+STREAM_CHUNK_CHARS = int(os.getenv("STREAM_CHUNK_CHARS", "120"))
+STREAM_FLUSH_SECONDS = float(os.getenv("STREAM_FLUSH_SECONDS", "0.5"))
+
+# Eventos do AgentOS com um pedaço novo da resposta
+CONTENT_EVENTS = ("RunContent", "RunResponseContent", "TeamRunContent")
+COMPLETED_EVENTS = ("RunCompleted", "TeamRunCompleted")
+ERROR_EVENTS = ("RunError", "TeamRunError")
+
+
+class NiaraStreamError(Exception):
+    """Erro reportado pelo agente (ou pela conexão) durante o streaming"""
+
+
+async def iter_run_events(lines):
+    """Converter as linhas da resposta (SSE ou JSON por linha) em eventos (nome, dados)"""
+    event_name = None
+    async for line in lines:
+        line = line.strip()
+        if not line:
+            event_name = None
+            continue
+        if line.startswith("event:"):
+            event_name = line[len("event:"):].strip()
+            continue
+        if line.startswith("data:"):
+            line = line[len("data:"):].strip()
+        if not line.startswith("{"):
+            continue
+        try:
+            data = json.loads(line)
+        except ValueError:
+            continue
+        yield data.get("event") or event_name, data
+
+
+async def iter_content_deltas(lines):
+    """Gerar apenas os trechos de texto novos da resposta do agente"""
+    received = False
+    async for event, data in iter_run_events(lines):
+        content = data.get("content")
+        if event in ERROR_EVENTS:
+            raise NiaraStreamError(content or "Erro durante a execução do agente")
+        if event in COMPLETED_EVENTS:
+            # Sem eventos parciais (ex.: modelo sem streaming): usa a resposta completa
+            if not received and isinstance(content, str) and content:
+                yield content
+            return
+        if event in CONTENT_EVENTS and isinstance(content, str) and content:
+            received = True
+            yield content
+
+
+class ChunkBuffer:
+    """Junta os tokens em pedaços de ~chunk_chars, cortando em espaços
+
+    Também libera o que tiver acumulado após flush_seconds, para o usuário
+    ver o começo da resposta rápido mesmo quando o modelo gera devagar.
+    """
+
+    def __init__(self, chunk_chars=STREAM_CHUNK_CHARS, flush_seconds=STREAM_FLUSH_SECONDS):
+        self.chunk_chars = chunk_chars
+        self.flush_seconds = flush_seconds
+        self._buffer = ""
+        self._last_flush = time.monotonic()
+
+    def add(self, delta):
+        """Adicionar um trecho; retorna a lista de pedaços prontos para envio"""
+        self._buffer += delta
+        chunks = []
+        while len(self._buffer) >= self.chunk_chars:
+            cut = self._buffer.rfind(" ", 0, self.chunk_chars + 1)
+            if cut <= 0:
+                cut = self.chunk_chars
+            chunks.append(self._buffer[:cut])
+            self._buffer = self._buffer[cut:]
+        if not chunks and self._buffer and time.monotonic() - self._last_flush >= self.flush_seconds:
+            chunks.append(self._buffer)
+            self._buffer = ""
+        if chunks:
+            self._last_flush = time.monotonic()
+        return chunks
+
+    def flush(self):
+        """Retornar o que sobrou no buffer (fim da resposta)"""
+        chunks = [self._buffer] if self._buffer else []
+        self._buffer = ""
+        return chunks
+
+    def pending_timeout(self):
+        """Segundos até o que está no buffer precisar sair (None = buffer vazio)"""
+        if not self._buffer:
+            return None
+        return max(0.0, self._last_flush + self.flush_seconds - time.monotonic())
+
+    def flush_due(self):
+        """Flush por tempo, sem esperar o próximo trecho do modelo"""
+        chunks = self.flush()
+        if chunks:
+            self._last_flush = time.monotonic()
+        return chunks
+
+
+_END = object()
+
+
+async def iter_chunks(deltas, buffer=None):
+    """Pedaços prontos para envio a partir dos trechos do modelo
+
+    Uma tarefa lê os trechos para uma fila; aqui a espera pela fila tem prazo,
+    então o buffer sai após flush_seconds mesmo quando o modelo fica parado.
+    """
+    buffer = buffer if buffer is not None else ChunkBuffer()
+    queue = asyncio.Queue()
+
+    async def produce():
+        try:
+            async for delta in deltas:
+                await queue.put(delta)
+            await queue.put(_END)
+        except Exception as e:
+            await queue.put(e)
+
+    producer = asyncio.create_task(produce())
+    try:
+        while True:
+            try:
+                item = await asyncio.wait_for(queue.get(), buffer.pending_timeout())
+            except asyncio.TimeoutError:
+                for chunk in buffer.flush_due():
+                    yield chunk
+                continue
+            if item is _END:
+                break
+            if isinstance(item, Exception):
+                # O que já chegou sai antes do erro
+                for chunk in buffer.flush():
+                    yield chunk
+                raise item
+            for chunk in buffer.add(item):
+                yield chunk
+        for chunk in buffer.flush():
+            yield chunk
+    finally:
+        # Consumidor saiu antes do fim (ex.: cliente desconectou): fecha o stream do agente
+        producer.cancel()
@@ -0,0 +1,105 @@
+"""
+Testes do cache de respostas completas (python -m unittest test_answer_cache)
+"""
+
+import unittest
+from unittest import mock
+
+from agno.models.message import Message
+from agno.models.response import ModelResponse
+from agno.run.agent import RunInput, RunOutput
+
+from answer_cache import AnswerCache, CachedAnswerMistralChat
+from context_budget import BudgetedMistralChat
+
+PIX = [1.0, 0.0, 0.0]
+CHATBOT = [0.0, 1.0, 0.0]
+REFERENCES = "\n\n<references>\nPara configurar o PIX acesse Pagamentos > PIX.\n</references>"
+
+
+class FakeEmbedder:
+    def get_embedding(self, text):
+        return PIX if "pix" in text.lower() else CHATBOT
+
+
+def run_response(question):
+    return RunOutput(run_id="r1", input=RunInput(input_content=question))
+
+
+def turn(question, history=None, tool=None):
+    """Mensagens de um turno: sistema, histórico opcional e a pergunta com o RAG"""
+    messages = [Message(role="system", content="Você é o assistente da Klona.")]
+    messages += history or []
+    messages.append(Message(role="user", content=question + ("" if tool else REFERENCES)))
+    if tool:
+        messages.append(Message(role="assistant", tool_calls=[{"id": "c1", "type": "function",
+                                                               "function": {"name": tool, "arguments": "{}"}}]))
+        messages.append(Message(role="tool", tool_call_id="c1", content="resultado"))
+    return messages
+
+
+class AnswerCacheTest(unittest.TestCase):
+    def test_hit_counts_saved_tokens(self):
+        cache = AnswerCache(threshold=0.97)
+        cache.put(PIX, "instr", "v1", {"content": "Resposta", "tokens": 120})
+        self.assertEqual(cache.get(PIX, "instr", "v1")["content"], "Resposta")
+        self.assertIsNone(cache.get(PIX, "outras instruções", "v1"))
+        self.assertEqual(cache.stats()["saved_tokens"], 120)
+
+    def test_purge_removes_only_similar_questions(self):
+        cache = AnswerCache(threshold=0.97)
+        cache.put(PIX, "instr", "v1", {"content": "pix"})
+        cache.put(CHATBOT, "instr", "v1", {"content": "chatbot"})
+        self.assertEqual(cache.purge(PIX), 1)
+        self.assertIsNone(cache.get(PIX, "instr", "v1"))
+        self.assertIsNotNone(cache.get(CHATBOT, "instr", "v1"))
+
+
+class CachedAnswerMistralChatTest(unittest.TestCase):
+    def setUp(self):
+        self.model = CachedAnswerMistralChat(id="mistral-small-latest", api_key="test",
+                                             answer_cache=AnswerCache(), embedder=FakeEmbedder())
+        self.calls = []
+
+        def fake_response(model, messages, *args, **kwargs):
+            self.calls.append(messages[-1].content)
+            messages.append(Message(role="assistant", content="Acesse Pagamentos > PIX."))
+            return ModelResponse(role="assistant", content="Acesse Pagamentos > PIX.")
+
+        patcher = mock.patch.object(BudgetedMistralChat, "response", fake_response)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def ask(self, question, **turn_kwargs):
+        response = run_response(question)
+        model_response = self.model.response(turn(question, **turn_kwargs), run_response=response)
+        return model_response, response
+
+    def test_recurring_question_is_served_from_cache(self):
+        self.ask("Como configurar o PIX?")
+        model_response, response = self.ask("Como configuro o PIX no painel?")
+        self.assertEqual(model_response.content, "Acesse Pagamentos > PIX.")
+        self.assertEqual(len(self.calls), 1)
+        self.assertEqual(response.metadata, {"answer_cache": "hit"})
+
+    def test_personal_question_is_not_cached(self):
+        self.ask("Meu PIX não funciona, o que faço?")
+        self.ask("Meu PIX não funciona, o que faço?")
+        self.assertEqual(len(self.calls), 2)
+
+    def test_answer_that_used_other_tools_is_not_stored(self):
+        self.ask("Qual o status do PIX da conta?", tool="get_account_status")
+        self.ask("Qual o status do PIX da conta?")
+        self.assertEqual(len(self.calls), 2)
+
+    def test_cached_answer_is_not_served_mid_conversation(self):
+        self.ask("Como configurar o PIX?")
+        history = [Message(role="user", content="Oi", from_history=True),
+                   Message(role="assistant", content="Olá!", from_history=True)]
+        _, response = self.ask("Como configurar o PIX?", history=history)
+        self.assertEqual(len(self.calls), 2)
+        self.assertIsNone(response.metadata)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,125 @@
+"""
+Testes do cache HTTP das ferramentas de API contra um servidor stub local
+(python -m unittest test_api_cache)
+"""
+
+import json
+import threading
+import unittest
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from api_cache import CachedApiTools, HttpResponseCache
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """/users com ETag (304 no If-None-Match), /nostore com Cache-Control: no-store"""
+
+    requests = Counter()
+
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, status, body=None, headers=None):
+        data = json.dumps(body).encode("utf-8") if body is not None else b""
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        self.requests[("GET", self.path)] += 1
+        if self.path == "/nostore":
+            return self._reply(200, {"id": 1}, {"Cache-Control": "no-store"})
+        if self.path.startswith("/users"):
+            if self.headers.get("If-None-Match") == '"v1"':
+                return self._reply(304, headers={"ETag": '"v1"'})
+            return self._reply(200, [{"id": 1, "name": "Ana"}], {"ETag": '"v1"'})
+        self._reply(404, {"error": "not found"})
+
+    def do_PUT(self):
+        self.requests[("PUT", self.path)] += 1
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self._reply(200, {"id": 1, "name": "Bia"})
+
+
+class CachedApiToolsTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+        cls.thread = threading.Thread(target=cls.server.serve_forever, daemon=True)
+        cls.thread.start()
+        cls.base_url = f"http://127.0.0.1:{cls.server.server_address[1]}"
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        StubHandler.requests.clear()
+        self.cache = HttpResponseCache(default_ttl=60, endpoint_ttls={})
+        self.tools = CachedApiTools(base_url=self.base_url, cache=self.cache)
+
+    def request(self, endpoint, method="GET", **kwargs):
+        result = json.loads(self.tools.make_request(endpoint, method=method, **kwargs))
+        return result["headers"]["X-Cache"], result
+
+    def expire_all(self):
+        for entry in self.cache._entries.values():
+            entry["expires_at"] = 0
+
+    def test_miss_hit_then_revalidated(self):
+        self.assertEqual(self.request("/users")[0], "MISS")
+        self.assertEqual(self.request("/users")[0], "HIT")
+        self.assertEqual(StubHandler.requests[("GET", "/users")], 1)
+
+        self.expire_all()
+        origin, result = self.request("/users")
+        self.assertEqual(origin, "REVALIDATED")
+        self.assertEqual(result["status_code"], 200)
+        self.assertEqual(result["data"]["rows"], [[1, "Ana"]])
+        self.assertEqual(StubHandler.requests[("GET", "/users")], 2)
+        self.assertEqual(self.request("/users")[0], "HIT")
+
+        stats = self.cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"], stats["revalidated"]), (2, 1, 1))
+
+    def test_no_store_is_not_cached(self):
+        self.assertEqual(self.request("/nostore")[0], "MISS")
+        self.assertEqual(self.request("/nostore")[0], "MISS")
+        self.assertEqual(StubHandler.requests[("GET", "/nostore")], 2)
+
+    def test_write_to_item_evicts_collection(self):
+        self.request("/users")
+        self.request("/users/1")
+        self.assertEqual(self.request("/users")[0], "HIT")
+
+        self.request("/users/1", method="PUT", json_data={"name": "Bia"})
+        self.assertEqual(self.request("/users")[0], "MISS")
+        self.assertEqual(self.request("/users/1")[0], "MISS")
+        self.assertEqual(StubHandler.requests[("GET", "/users")], 2)
+
+    def test_concurrent_identical_gets_share_one_request(self):
+        barrier = threading.Barrier(8)
+        origins = []
+
+        def call():
+            barrier.wait()
+            origins.append(self.request("/users")[0])
+
+        threads = [threading.Thread(target=call) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(origins), 8)
+        self.assertEqual(StubHandler.requests[("GET", "/users")], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,139 @@
+"""
+Testes da ordem de corte do orçamento de contexto (python -m unittest test_context_budget)
+"""
+
+import json
+import unittest
+
+from agno.models.message import Message
+
+from context_budget import ContextBudget, ContextTelemetry, ToolsTokenCache, message_tokens
+
+INSTRUCTIONS = "Você é o assistente virtual da NIARA. Responda em português."
+MEMORIES = ["- Mora em Recife e torce pelo Sport", "- Usa o PIX Getnet na pousada", "- Prefere respostas curtas"]
+QUESTION = "Como configurar o PIX Getnet?"
+REFERENCES = [
+    {"name": "pix.pdf", "content": "PIX Getnet: acesse Pagamentos > PIX. " * 20},
+    {"name": "boletos.pdf", "content": "Boletos do Itaú: acesse Pagamentos > Boletos. " * 20},
+    {"name": "faq.pdf", "content": "Perguntas frequentes sobre o painel. " * 20},
+]
+
+
+def system_message():
+    memories = "\n".join(MEMORIES)
+    return Message(role="system", content=(
+        f"{INSTRUCTIONS}\n<memories_from_previous_interactions>\n{memories}\n</memories_from_previous_interactions>"
+    ))
+
+
+def user_message():
+    references = json.dumps(REFERENCES, indent=2, ensure_ascii=False)
+    return Message(role="user", content=f"{QUESTION}\n\n<references>\n{references}\n</references>")
+
+
+def history_run(question, answer):
+    return [Message(role="user", content=question, from_history=True),
+            Message(role="assistant", content=answer, from_history=True)]
+
+
+def turn(history=()):
+    return [system_message(), *[m for run in history for m in run], user_message()]
+
+
+HISTORY = [
+    history_run("Onde ativo o PIX Getnet?", "Em Pagamentos > PIX, com a chave da conta. " * 3),
+    history_run("Qual o horário do suporte?", "De segunda a sexta, das 8h às 18h. " * 3),
+    history_run("E aos sábados?", "Aos sábados o suporte não abre, só o chat automático. " * 3),
+]
+
+
+def history_contents(messages):
+    return [m.content for m in messages if m.from_history and m.role == "user"]
+
+
+class ContextBudgetTest(unittest.TestCase):
+    def fit(self, budget, messages, **kwargs):
+        return ContextBudget(budget=budget, telemetry=None, **kwargs).fit(messages)
+
+    def fixed_tokens(self):
+        report = self.fit(10**6, turn(HISTORY))
+        return sum(report["sources"][source] for source in ("instructions", "summary", "user", "tools"))
+
+    def knowledge_and_memories(self):
+        report = self.fit(10**6, turn())
+        return report["sources"]["knowledge"] + report["sources"]["memories"]
+
+    def test_everything_fits_without_cuts(self):
+        messages = turn(HISTORY)
+        report = self.fit(10**6, messages)
+        self.assertEqual(report["dropped"], {"memories": 0, "knowledge": 0, "history_runs": 0})
+        self.assertEqual(len(messages), 2 + 2 * len(HISTORY))
+
+    def test_least_relevant_chunks_are_cut_from_the_end(self):
+        messages = turn()
+        report = self.fit(10**6, messages, knowledge_tokens=400)
+        kept = json.loads(messages[-1].content.split("<references>\n")[1].split("\n</references>")[0])
+        self.assertEqual([r["name"] for r in kept], ["pix.pdf"])
+        self.assertEqual(report["dropped"]["knowledge"], 2)
+        self.assertTrue(messages[-1].content.startswith(QUESTION))
+
+    def test_memories_are_ranked_by_the_question(self):
+        messages = turn()
+        self.fit(10**6, messages, memory_tokens=12)
+        self.assertIn("PIX Getnet na pousada", messages[0].content)
+        self.assertNotIn("Recife", messages[0].content)
+        self.assertTrue(messages[0].content.startswith(INSTRUCTIONS))
+
+    def test_history_keeps_recent_runs_then_the_most_relevant(self):
+        costs = [sum(message_tokens(m) for m in run) for run in HISTORY]
+        # Memórias e chunks cabem inteiros: sobram para o histórico só a 1ª e a 3ª execuções
+        budget = self.fixed_tokens() + self.knowledge_and_memories() + costs[0] + costs[2]
+        messages = turn(HISTORY)
+        report = self.fit(budget, messages, min_history_runs=1, knowledge_tokens=10**4, memory_tokens=10**4)
+        self.assertEqual(history_contents(messages), ["Onde ativo o PIX Getnet?", "E aos sábados?"])
+        self.assertEqual(report["dropped"]["history_runs"], 1)
+
+    def test_history_is_cut_before_knowledge_and_memories(self):
+        budget = self.fixed_tokens() + self.knowledge_and_memories()
+        messages = turn(HISTORY)
+        report = self.fit(budget, messages, knowledge_tokens=10**4, memory_tokens=10**4)
+        self.assertEqual(report["dropped"], {"memories": 0, "knowledge": 0, "history_runs": len(HISTORY)})
+        self.assertEqual(history_contents(messages), [])
+
+    def test_tool_calls_stay_with_their_results(self):
+        run = [Message(role="user", content="Liste os usuários", from_history=True),
+               Message(role="assistant", tool_calls=[{"id": "c1", "type": "function",
+                                                     "function": {"name": "make_request", "arguments": "{}"}}],
+                       from_history=True),
+               Message(role="tool", tool_call_id="c1", content="[]", from_history=True),
+               Message(role="assistant", content="Não há usuários.", from_history=True)]
+        messages = turn([run, HISTORY[1]])
+        # Cabe a execução mais recente, mas não a das ferramentas inteira
+        budget = self.fixed_tokens() + self.knowledge_and_memories() + sum(message_tokens(m) for m in run) - 1
+        self.fit(budget, messages, min_history_runs=1, knowledge_tokens=10**4, memory_tokens=10**4)
+        self.assertFalse(any(m.role == "tool" for m in messages))
+        self.assertFalse(any(m.tool_calls for m in messages))
+        self.assertEqual(history_contents(messages), ["Qual o horário do suporte?"])
+
+    def test_disabled_budget_changes_nothing(self):
+        messages = turn(HISTORY)
+        self.assertIsNone(self.fit(0, messages))
+        self.assertEqual(len(messages), 2 + 2 * len(HISTORY))
+
+    def test_report_is_recorded(self):
+        telemetry = ContextTelemetry()
+        ContextBudget(budget=10**6, telemetry=telemetry).fit(turn(), run_id="r1")
+        self.assertEqual(telemetry.stats()["last"]["run_id"], "r1")
+
+
+class ToolsTokenCacheTest(unittest.TestCase):
+    def test_same_tool_set_is_serialized_once(self):
+        cache = ToolsTokenCache()
+        tools = [{"type": "function", "function": {"name": "make_request", "parameters": {}}}]
+        tokens = cache.tokens(tools)
+        self.assertEqual(cache.tokens([dict(tools[0])]), tokens)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+
+if __name__ == "__main__":
+    unittest.main()
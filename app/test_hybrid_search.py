@@ -0,0 +1,105 @@
+"""
+Testes da busca híbrida BM25 + vetores (python -m unittest test_hybrid_search)
+"""
+
+import os
+import tempfile
+import unittest
+
+from agno.knowledge.document import Document
+
+from hybrid_search import HybridVectorDb, KeywordIndex, reciprocal_rank_fusion
+
+
+class FakeVectorDb:
+    """Banco vetorial que devolve sempre o mesmo ranking"""
+
+    embedder = None
+
+    def __init__(self, documents):
+        self.documents = documents
+        self.limits = []
+
+    def search(self, query, limit=5, filters=None):
+        self.limits.append(limit)
+        return [Document(id=doc.id, content=doc.content, meta_data=dict(doc.meta_data)) for doc in self.documents[:limit]]
+
+
+class KeywordIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "kb.bm25.json")
+        self.index = KeywordIndex(path=self.path)
+        self.index.add("pix", "Como configurar o PIX Getnet no checkout", {"name": "pix.pdf"})
+        self.index.add("itau", "Integração com o banco Itaú para boletos", {"name": "itau.pdf"})
+        self.index.add("mfa", "Ative o MFA para proteger a conta", {"name": "mfa.pdf"})
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_exact_term_ranks_its_chunk_first(self):
+        self.assertEqual(self.index.search("erro no pix getnet")[0][0], "pix")
+
+    def test_accents_and_case_are_ignored(self):
+        self.assertEqual([doc_id for doc_id, _ in self.index.search("ITAU")], ["itau"])
+
+    def test_saved_index_is_reloaded(self):
+        self.index.save()
+        reloaded = KeywordIndex(path=self.path)
+        self.assertEqual(reloaded.search("mfa")[0][0], "mfa")
+
+    def test_removed_chunk_is_not_found(self):
+        self.index.remove("mfa")
+        self.assertEqual(self.index.search("mfa"), [])
+        self.assertNotIn("mfa", self.index.postings)
+
+    def test_filters_use_metadata(self):
+        self.assertEqual(self.index.search("pix itau", filters={"name": "itau.pdf"})[0][0], "itau")
+
+
+class ReciprocalRankFusionTest(unittest.TestCase):
+    def test_document_in_both_rankings_wins(self):
+        fused = reciprocal_rank_fusion([["a", "b", "c"], ["c", "d"]], k=60)
+        self.assertEqual(fused[0][0], "c")
+        self.assertAlmostEqual(fused[0][1], 1 / 63 + 1 / 61)
+
+    def test_ties_keep_first_ranking_order(self):
+        fused = reciprocal_rank_fusion([["a"], ["b"]], k=60)
+        self.assertEqual([doc_id for doc_id, _ in fused], ["a", "b"])
+
+
+class HybridVectorDbTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.index = KeywordIndex(path=os.path.join(self.tmp.name, "kb.bm25.json"))
+        self.index.add("asksuite", "Asksuite: conectar o chatbot ao CRM", {"name": "asksuite.pdf"})
+        self.index.add("v1", "Como trocar a senha do painel", {})
+        self.vector_db = FakeVectorDb([
+            Document(id="v1", content="Como trocar a senha do painel"),
+            Document(id="v2", content="Perguntas frequentes sobre o painel"),
+        ])
+        self.hybrid = HybridVectorDb(self.vector_db, keyword_index=self.index, rrf_k=60, candidates=10)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_keyword_only_chunk_is_fused_in(self):
+        documents = self.hybrid.search("integração asksuite", limit=3)
+        self.assertIn("asksuite", [doc.id for doc in documents])
+        asksuite = next(doc for doc in documents if doc.id == "asksuite")
+        self.assertEqual(asksuite.name, "asksuite.pdf")
+        self.assertIn("rrf_score", asksuite.meta_data)
+
+    def test_chunk_found_by_both_ranks_first(self):
+        documents = self.hybrid.search("trocar senha", limit=2)
+        self.assertEqual(documents[0].id, "v1")
+        self.assertEqual(self.vector_db.limits, [10])
+
+    def test_without_keyword_hits_vector_order_is_kept(self):
+        documents = self.hybrid.search("xyz", limit=1)
+        self.assertEqual([doc.id for doc in documents], ["v1"])
+        self.assertNotIn("rrf_score", documents[0].meta_data)
+
+
+if __name__ == "__main__":
+    unittest.main()
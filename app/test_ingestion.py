@@ -0,0 +1,146 @@
+"""
+Testes da ingestão incremental pelo manifesto (python -m unittest test_ingestion)
+"""
+
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import numpy as np
+
+import ingestion
+from hybrid_search import KeywordIndex
+from ingestion import IngestManifest, chunk_id, sync_pdfs
+
+
+def read_text_chunks(pdf_file):
+    """Substitui o PDFReader: cada linha do arquivo é um chunk"""
+    pdf_file = Path(pdf_file)
+    text = pdf_file.read_text(encoding="utf-8")
+    if text.startswith("corrompido"):
+        raise ValueError("PDF inválido")
+    lines = [line for line in text.splitlines() if line.strip()]
+    return [(chunk_id(pdf_file.name, line), line, {"name": pdf_file.stem}) for line in lines]
+
+
+class FakeEmbedder:
+    dimensions = 3
+
+    def __init__(self):
+        self.texts = []
+
+    def encode(self, texts, batch_size=None):
+        self.texts.extend(texts)
+        return np.ones((len(texts), self.dimensions), dtype=np.float32)
+
+
+class FakeCollection:
+    def __init__(self):
+        self.rows = {}
+
+    def upsert(self, ids, embeddings, documents, metadatas):
+        self.rows.update(zip(ids, documents))
+
+    def delete(self, ids):
+        for doc_id in ids:
+            self.rows.pop(doc_id, None)
+
+    def get(self, include=None):
+        ids = list(self.rows)
+        return {"ids": ids, "documents": [self.rows[i] for i in ids], "metadatas": [{} for _ in ids]}
+
+
+class FakeVectorDb:
+    def __init__(self):
+        self.embedder = FakeEmbedder()
+        self.collection = FakeCollection()
+
+    def create(self):
+        pass
+
+    def get_collection(self):
+        return self.collection
+
+
+class SyncPdfsTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self.tmp.name)
+        self.vector_db = FakeVectorDb()
+        self.reads = []
+
+        def read(pdf_file):
+            self.reads.append(Path(pdf_file).name)
+            return read_text_chunks(pdf_file)
+
+        patcher = mock.patch.object(ingestion, "read_pdf_chunks", read)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.write("pix.pdf", "Como configurar o PIX\nChave aleatória")
+        self.write("chatbot.pdf", "Conectar o chatbot ao CRM")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write(self, name, text):
+        (self.root / name).write_text(text, encoding="utf-8")
+
+    def sync(self, keyword_index=None):
+        self.reads.clear()
+        self.vector_db.embedder.texts.clear()
+        manifest = IngestManifest(self.root / "kb.manifest.json")
+        stats = sync_pdfs(sorted(self.root.glob("*.pdf")), self.vector_db, manifest, log=lambda message: None,
+                          keyword_index=keyword_index)
+        return stats, manifest
+
+    def test_unchanged_files_are_skipped(self):
+        self.sync()
+        stats, manifest = self.sync()
+        self.assertEqual((stats["unchanged"], stats["updated"]), (2, 0))
+        self.assertEqual(self.reads, [])
+        self.assertEqual(self.vector_db.embedder.texts, [])
+        self.assertEqual(manifest.version, 1)
+
+    def test_changed_file_only_embeds_new_chunks(self):
+        self.sync()
+        self.write("pix.pdf", "Como configurar o PIX\nChave por CPF")
+        stats, manifest = self.sync()
+        self.assertEqual(self.reads, ["pix.pdf"])
+        self.assertEqual(self.vector_db.embedder.texts, ["Chave por CPF"])
+        self.assertEqual((stats["chunks_embedded"], stats["chunks_deleted"]), (1, 1))
+        self.assertNotIn("Chave aleatória", self.vector_db.collection.rows.values())
+        self.assertEqual(len(manifest.get("pix.pdf")["chunks"]), 2)
+        self.assertEqual(manifest.version, 2)
+
+    def test_removed_file_deletes_its_chunks(self):
+        self.sync()
+        (self.root / "chatbot.pdf").unlink()
+        stats, manifest = self.sync()
+        self.assertEqual(stats["removed"], 1)
+        self.assertIsNone(manifest.get("chatbot.pdf"))
+        self.assertEqual(sorted(self.vector_db.collection.rows.values()), ["Chave aleatória", "Como configurar o PIX"])
+
+    def test_failed_file_is_retried_on_the_next_sync(self):
+        self.write("chatbot.pdf", "corrompido")
+        stats, manifest = self.sync()
+        self.assertEqual(stats["failed"], 1)
+        self.assertIsNone(manifest.get("chatbot.pdf"))
+
+        self.write("chatbot.pdf", "Conectar o chatbot ao CRM")
+        stats, _ = self.sync()
+        self.assertEqual(self.reads, ["chatbot.pdf"])
+        self.assertEqual((stats["unchanged"], stats["updated"]), (1, 1))
+
+    def test_keyword_index_follows_the_collection(self):
+        keyword_index = KeywordIndex(path=self.root / "kb.bm25.json")
+        self.sync(keyword_index)
+        self.write("pix.pdf", "Como configurar o PIX")
+        self.sync(keyword_index)
+        self.assertEqual(keyword_index.search("aleatória"), [])
+        self.assertEqual(len(KeywordIndex(path=self.root / "kb.bm25.json").docs), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
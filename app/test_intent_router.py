@@ -0,0 +1,122 @@
+"""
+Testes da escolha de plano do roteador de intenções (python -m unittest test_intent_router)
+"""
+
+import unittest
+
+from intent_router import INTENT_PLANS, IntentRouter, RoutedVectorDb, current_plan, intent_examples
+
+INSTRUCTIONS = [
+    "QUANDO USAR make_request:",
+    "- Palavras-chave: 'listar usuários', 'criar usuário'",
+    "QUANDO USAR update_user_memory:",
+    "- Frases: 'meu nome é', 'lembre que'",
+    "QUANDO USAR BASE DE CONHECIMENTO:",
+    "- Palavras-chave: 'configurar pix', 'chatbot'",
+    "EXEMPLOS PRÁTICOS:",
+    "Usuário: 'Como conecto o chatbot ao CRM?' → [RAG]",
+]
+
+# Uma dimensão por intenção: smalltalk, knowledge, api, memory
+KEYWORDS = [("oi", "olá", "obrigado", "tchau", "bom", "boa", "valeu", "vlw", "tudo", "até", "como vai", "e aí"),
+            ("pix", "chatbot", "configurar"), ("usuário", "usuários"), ("nome", "lembre")]
+
+
+class KeywordEmbedder:
+    def __init__(self):
+        self.calls = []
+
+    def get_embedding(self, text):
+        self.calls.append(text)
+        text = text.lower()
+        return [0.01 + sum(word in text for word in words) for words in KEYWORDS]
+
+
+class FakeVectorDb:
+    def __init__(self):
+        self.queries = []
+
+    def search(self, query, limit=5, filters=None):
+        self.queries.append(query)
+        return ["doc"]
+
+    async def async_search(self, query, limit=5, filters=None):
+        return self.search(query, limit, filters)
+
+
+class IntentExamplesTest(unittest.TestCase):
+    def test_examples_come_from_the_instruction_sections(self):
+        examples = intent_examples(INSTRUCTIONS)
+        self.assertEqual(examples["api"], ["listar usuários", "criar usuário"])
+        self.assertEqual(examples["memory"], ["meu nome é", "lembre que"])
+        self.assertEqual(examples["knowledge"], ["configurar pix", "chatbot", "Como conecto o chatbot ao CRM?"])
+        self.assertIn("bom dia", examples["smalltalk"])
+
+
+class IntentRouterTest(unittest.TestCase):
+    def setUp(self):
+        self.embedder = KeywordEmbedder()
+        self.router = IntentRouter(self.embedder, INSTRUCTIONS, min_score=0.35, min_margin=0.08)
+
+    def test_greeting_is_smalltalk_without_embedding(self):
+        self.assertEqual(self.router.plan("Bom dia!"), ("smalltalk", INTENT_PLANS["smalltalk"]))
+        self.assertEqual(self.embedder.calls, [])
+
+    def test_acknowledgement_goes_to_full(self):
+        self.assertEqual(self.router.classify("Sim"), ("full", 0.0))
+
+    def test_before_load_everything_goes_to_full(self):
+        self.assertEqual(self.router.classify("Como configurar o PIX?"), ("full", 0.0))
+        self.router._loader.join()
+        self.assertTrue(self.router.loaded)
+        self.assertEqual(self.router.classify("Como configurar o PIX?")[0], "knowledge")
+
+    def test_message_goes_to_the_nearest_intent(self):
+        self.router.load()
+        self.assertEqual(self.router.plan("Como configurar o PIX?")[0], "knowledge")
+        self.assertEqual(self.router.plan("Liste os usuários da conta")[0], "api")
+        self.assertEqual(self.router.plan("Meu nome é Ana")[0], "memory")
+
+    def test_ambiguous_message_goes_to_full(self):
+        self.router.load()
+        self.assertEqual(self.router.classify("pix do usuário")[0], "full")
+
+    def test_repeated_message_uses_the_cache(self):
+        self.router.load()
+        self.router.classify("Como configurar o PIX?")
+        calls = len(self.embedder.calls)
+        self.router.classify("como   configurar o pix?")
+        self.assertEqual(len(self.embedder.calls), calls)
+
+    def test_empty_message_goes_to_full(self):
+        self.assertEqual(self.router.plan("  ")[0], "full")
+        self.assertEqual(self.router.plan(None)[0], "full")
+
+
+class RoutedRunTest(unittest.IsolatedAsyncioTestCase):
+    async def test_run_plan_skips_rag_for_smalltalk(self):
+        router = IntentRouter(KeywordEmbedder(), INSTRUCTIONS).load()
+        vector_db = RoutedVectorDb(FakeVectorDb(), router)
+
+        class RunInput:
+            input_content = "Obrigado!"
+
+        self.assertEqual((await router.aroute_run(RunInput()))[0], "smalltalk")
+        self.assertEqual(current_plan()[0], "smalltalk")
+        # A busca escrita pelo modelo não é reclassificada: vale o plano da execução
+        self.assertEqual(await vector_db.async_search("como configurar o pix"), [])
+        self.assertEqual(vector_db.vector_db.queries, [])
+
+    async def test_knowledge_run_searches(self):
+        router = IntentRouter(KeywordEmbedder(), INSTRUCTIONS).load()
+        vector_db = RoutedVectorDb(FakeVectorDb(), router)
+
+        class RunInput:
+            input_content = "Como configurar o chatbot?"
+
+        await router.aroute_run(RunInput())
+        self.assertEqual(await vector_db.async_search("chatbot"), ["doc"])
+
+
+if __name__ == "__main__":
+    unittest.main()
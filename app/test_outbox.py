@@ -0,0 +1,137 @@
+"""
+Testes do outbox (python -m unittest test_outbox)
+"""
+
+import asyncio
+import os
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+import outbox
+from outbox import Outbox
+
+
+class OutboxOrderTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.outbox = Outbox(db_file=os.path.join(self.tmp.name, "outbox.db"), base_delay=0.2, max_delay=0.2)
+
+    async def asyncTearDown(self):
+        await self.outbox.stop()
+        self.outbox.close()
+        self.tmp.cleanup()
+
+    async def test_failed_delivery_blocks_newer_ones_for_same_receiver(self):
+        delivered, failures = [], {1}
+
+        async def send(url, payload):
+            if payload["n"] in failures:
+                failures.discard(payload["n"])
+                return False
+            delivered.append((url, payload["n"]))
+            return True
+
+        for n in (1, 2, 3):
+            await self.outbox.enqueue("http://a", {"n": n})
+        await self.outbox.enqueue("http://b", {"n": 4})
+
+        # Backoff fixo: sem o jitter, a primeira entrega volta em 0.2s
+        with mock.patch.object(outbox, "POLL_INTERVAL", 0.02), mock.patch.object(outbox.random, "uniform", return_value=0.2):
+            await self.outbox.start(send)
+            for _ in range(100):
+                if len(delivered) == 4:
+                    break
+                await asyncio.sleep(0.02)
+
+        self.assertEqual([n for url, n in delivered if url == "http://a"], [1, 2, 3])
+        # Outro receptor não espera o backoff do primeiro
+        self.assertEqual(delivered[0], ("http://b", 4))
+        self.assertEqual((await self.outbox.metrics())["delivered"], 4)
+
+
+class OutboxWorkersTest(unittest.IsolatedAsyncioTestCase):
+    """Vários workers (processos do gunicorn) com o mesmo OUTBOX_DB"""
+
+    async def asyncSetUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db_file = os.path.join(self.tmp.name, "outbox.db")
+        self.workers = [Outbox(db_file=self.db_file) for _ in range(3)]
+
+    async def asyncTearDown(self):
+        for worker in self.workers:
+            await worker.stop()
+            worker.close()
+        self.tmp.cleanup()
+
+    async def test_each_row_is_delivered_once_and_in_order(self):
+        delivered = []
+
+        async def send(url, payload):
+            await asyncio.sleep(0.01)
+            delivered.append(payload["n"])
+            return True
+
+        for n in range(20):
+            await self.workers[0].enqueue("http://a", {"n": n})
+
+        with mock.patch.object(outbox, "POLL_INTERVAL", 0.02):
+            for worker in self.workers:
+                await worker.start(send)
+            for _ in range(200):
+                if len(delivered) >= 20:
+                    break
+                await asyncio.sleep(0.02)
+            await asyncio.sleep(0.1)
+
+        self.assertEqual(delivered, list(range(20)))
+        self.assertEqual(sum(worker.delivered for worker in self.workers), 20)
+
+    async def test_expired_lease_returns_to_pending(self):
+        delivered = []
+
+        async def send(url, payload):
+            delivered.append(payload["n"])
+            return True
+
+        # Worker que reservou as entregas e morreu antes de enviar
+        row_id = await self.workers[0].enqueue("http://a", {"n": 1})
+        await self.workers[0].enqueue("http://a", {"n": 2})
+        await self.workers[0]._db(
+            "UPDATE outbox SET status = 'sending', lease_until = ? WHERE id = ?", (time.time() - 1, row_id)
+        )
+
+        with mock.patch.object(outbox, "POLL_INTERVAL", 0.02):
+            await self.workers[1].start(send)
+            for _ in range(100):
+                if len(delivered) == 2:
+                    break
+                await asyncio.sleep(0.02)
+
+        self.assertEqual(delivered, [1, 2])
+
+    async def test_live_lease_blocks_newer_rows(self):
+        delivered = []
+
+        async def send(url, payload):
+            delivered.append(payload["n"])
+            return True
+
+        # Entrega em envio por outro worker: a seguinte não pode passar na frente
+        row_id = await self.workers[0].enqueue("http://a", {"n": 1})
+        await self.workers[0].enqueue("http://a", {"n": 2})
+        await self.workers[0]._db(
+            "UPDATE outbox SET status = 'sending', lease_until = ? WHERE id = ?", (time.time() + 60, row_id)
+        )
+
+        with mock.patch.object(outbox, "POLL_INTERVAL", 0.02):
+            await self.workers[1].start(send)
+            await asyncio.sleep(0.2)
+
+        self.assertEqual(delivered, [])
+        self.assertEqual((await self.workers[1].metrics())["sending"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,91 @@
+"""
+Testes do cache semântico de resultados da busca (python -m unittest test_retrieval_cache)
+"""
+
+import unittest
+
+from agno.knowledge.document import Document
+
+from retrieval_cache import CachedVectorDb, SemanticResultCache
+
+PIX = [1.0, 0.0, 0.0]
+PIX_PARAPHRASE = [0.99, 0.05, 0.0]
+CHATBOT = [0.0, 1.0, 0.0]
+
+
+class FakeEmbedder:
+    def __init__(self, vectors):
+        self.vectors = vectors
+
+    def get_embedding(self, text):
+        return self.vectors.get(text, [])
+
+
+class FakeVectorDb:
+    def __init__(self, embedder):
+        self.embedder = embedder
+        self.queries = []
+
+    def search(self, query, limit=5, filters=None):
+        self.queries.append(query)
+        return [Document(id=f"{query}-{i}", content=query) for i in range(limit)]
+
+
+class SemanticResultCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.cache = SemanticResultCache(threshold=0.95, max_entries=2, ttl_seconds=60)
+        self.cache.store(PIX, 5, None, "v1", ["pix"])
+
+    def test_similar_question_hits(self):
+        self.assertEqual(self.cache.lookup(PIX_PARAPHRASE, 5, None, "v1"), ["pix"])
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 0))
+
+    def test_different_question_misses(self):
+        self.assertIsNone(self.cache.lookup(CHATBOT, 5, None, "v1"))
+
+    def test_limit_and_filters_are_part_of_the_key(self):
+        self.assertIsNone(self.cache.lookup(PIX, 3, None, "v1"))
+        self.assertIsNone(self.cache.lookup(PIX, 5, {"name": "pix.pdf"}, "v1"))
+
+    def test_new_collection_version_invalidates(self):
+        self.assertIsNone(self.cache.lookup(PIX, 5, None, "v2"))
+        self.assertEqual(self.cache.invalidations, 1)
+        self.assertEqual(self.cache.stats()["size"], 0)
+
+    def test_least_recently_used_entry_is_evicted(self):
+        self.cache.store(CHATBOT, 5, None, "v1", ["chatbot"])
+        self.cache.lookup(PIX, 5, None, "v1")
+        self.cache.store([0.0, 0.0, 1.0], 5, None, "v1", ["mfa"])
+        self.assertEqual(self.cache.lookup(PIX, 5, None, "v1"), ["pix"])
+        self.assertIsNone(self.cache.lookup(CHATBOT, 5, None, "v1"))
+
+    def test_expired_entry_misses(self):
+        cache = SemanticResultCache(ttl_seconds=0)
+        cache.store(PIX, 5, None, "v1", ["pix"])
+        self.assertIsNone(cache.lookup(PIX, 5, None, "v1"))
+
+    def test_cached_documents_are_copies(self):
+        self.cache.lookup(PIX, 5, None, "v1").append("alterado")
+        self.assertEqual(self.cache.lookup(PIX, 5, None, "v1"), ["pix"])
+
+
+class CachedVectorDbTest(unittest.TestCase):
+    def setUp(self):
+        embedder = FakeEmbedder({"como configurar pix": PIX, "configurar o pix": PIX_PARAPHRASE, "chatbot": CHATBOT})
+        self.vector_db = FakeVectorDb(embedder)
+        self.db = CachedVectorDb(self.vector_db, cache=SemanticResultCache(), version_fn=lambda: "v1")
+
+    def test_paraphrase_reuses_the_search(self):
+        first = self.db.search("como configurar pix", limit=2)
+        second = self.db.search("configurar o pix", limit=2)
+        self.assertEqual([doc.id for doc in second], [doc.id for doc in first])
+        self.assertEqual(self.vector_db.queries, ["como configurar pix"])
+
+    def test_query_without_embedding_goes_to_the_database(self):
+        self.db.search("sem embedding")
+        self.db.search("sem embedding")
+        self.assertEqual(self.vector_db.queries, ["sem embedding", "sem embedding"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,67 @@
+"""
+Testes do cache de sessões recentes do IndexedSqliteDb (python -m unittest test_session_store)
+"""
+
+import os
+import tempfile
+import time
+import unittest
+
+from agno.db.base import SessionType
+from agno.db.sqlite import SqliteDb
+from agno.session.agent import AgentSession
+
+from session_store import IndexedSqliteDb, bound_user_id
+
+
+def recent(db, user_id):
+    return db.get_sessions(session_type=SessionType.AGENT, user_id=user_id, limit=5)
+
+
+class IndexedSqliteDbCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db = IndexedSqliteDb(db_file=os.path.join(self.tmp.name, "agent.db"))
+        now = int(time.time())
+        for session_id, user_id in (("s1", "u1"), ("s2", "u2")):
+            self.db.upsert_session(AgentSession(session_id=session_id, user_id=user_id, agent_id="a",
+                                                created_at=now, updated_at=now))
+
+    def tearDown(self):
+        self.db.db_engine.dispose()
+        self.tmp.cleanup()
+
+    def test_repeated_reads_are_served_from_cache(self):
+        self.assertEqual([s.session_id for s in recent(self.db, "u1")], ["s1"])
+        self.assertEqual([s.session_id for s in recent(self.db, "u1")], ["s1"])
+        self.assertEqual(self.db.session_cache.hits, 1)
+
+    def test_positional_rename_invalidates_the_user(self):
+        recent(self.db, "u1")
+        # session_id, session_type, session_name, user_id: tudo por posição
+        self.db.rename_session("s1", SessionType.AGENT, "Suporte PIX", "u1")
+        self.assertEqual(recent(self.db, "u1")[0].session_data.get("session_name"), "Suporte PIX")
+
+    def test_positional_upsert_run_only_invalidates_that_user(self):
+        recent(self.db, "u1")
+        recent(self.db, "u2")
+        run = {"run_id": "r1", "session_id": "s1", "user_id": "u1", "agent_id": "a", "created_at": int(time.time())}
+        self.db.upsert_run(run, "s1", "u1")
+        hits = self.db.session_cache.hits
+        recent(self.db, "u1")
+        recent(self.db, "u2")
+        self.assertEqual(self.db.session_cache.hits, hits + 1)
+
+    def test_delete_without_user_invalidates_everyone(self):
+        recent(self.db, "u1")
+        self.db.delete_session("s1")
+        self.assertEqual(recent(self.db, "u1"), [])
+
+    def test_bound_user_id(self):
+        self.assertEqual(bound_user_id(SqliteDb.delete_session, self.db, "s1", "u1"), "u1")
+        self.assertEqual(bound_user_id(SqliteDb.delete_session, self.db, "s1", user_id="u2"), "u2")
+        self.assertIsNone(bound_user_id(SqliteDb.delete_session, self.db, "s1"))
+
+
+if __name__ == "__main__":
+    unittest.main()
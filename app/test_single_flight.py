@@ -0,0 +1,89 @@
+"""
+Testes da deduplicação single-flight dos webhooks (python -m unittest test_single_flight)
+"""
+
+import asyncio
+import unittest
+
+from single_flight import SingleFlight, dedup_key
+
+
+class DedupKeyTest(unittest.TestCase):
+    def test_whitespace_and_case_are_ignored(self):
+        self.assertEqual(dedup_key("u1", "Como  configurar o PIX?"), dedup_key("u1", "como configurar o pix?"))
+
+    def test_user_scope_and_idempotency_key_separate_messages(self):
+        key = dedup_key("u1", "sim")
+        self.assertNotEqual(key, dedup_key("u2", "sim"))
+        self.assertNotEqual(key, dedup_key("u1", "sim", scope="send"))
+        self.assertNotEqual(key, dedup_key("u1", "sim", idempotency_key="m2"))
+
+
+class SingleFlightTest(unittest.IsolatedAsyncioTestCase):
+    async def test_concurrent_copies_share_one_execution(self):
+        flight = SingleFlight(window_seconds=60)
+        calls = []
+
+        async def answer():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return {"response": "Olá!"}
+
+        results = await asyncio.gather(*(flight.run("k", answer) for _ in range(3)))
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(sorted(shared for _, shared in results), [False, True, True])
+        self.assertTrue(all(result == {"response": "Olá!"} for result, _ in results))
+        self.assertEqual(flight.metrics()["deduplicated"], 2)
+
+    async def test_completed_key_is_kept_only_with_idempotency_key(self):
+        flight = SingleFlight(window_seconds=60)
+
+        async def answer():
+            return {"response": "ok"}
+
+        await flight.run("sem-chave", answer)
+        self.assertEqual(await flight.run("sem-chave", answer), ({"response": "ok"}, False))
+
+        await flight.run("com-chave", answer, keep=True)
+        self.assertEqual(await flight.run("com-chave", answer, keep=True), ({"response": "ok"}, True))
+
+    async def test_kept_key_expires_after_the_window(self):
+        flight = SingleFlight(window_seconds=0.01)
+
+        async def answer():
+            return {"response": "ok"}
+
+        await flight.run("k", answer, keep=True)
+        await asyncio.sleep(0.02)
+        self.assertEqual((await flight.run("k", answer, keep=True))[1], False)
+        self.assertEqual(flight.started, 2)
+
+    async def test_failure_is_shared_and_not_kept(self):
+        flight = SingleFlight(window_seconds=60)
+        started = asyncio.Event()
+
+        async def failing():
+            started.set()
+            await asyncio.sleep(0.02)
+            raise RuntimeError("modelo fora do ar")
+
+        first = asyncio.create_task(flight.run("k", failing, keep=True))
+        await started.wait()
+        copy = await flight.run("k", failing, keep=True)
+        with self.assertRaises(RuntimeError):
+            await first
+        self.assertEqual(copy, ({"error": "modelo fora do ar"}, True))
+        self.assertEqual(flight.metrics()["tracked_keys"], 0)
+
+    async def test_error_result_is_not_kept(self):
+        flight = SingleFlight(window_seconds=60)
+
+        async def error():
+            return {"error": "fila cheia"}
+
+        await flight.run("k", error, keep=True)
+        self.assertEqual(flight.metrics()["tracked_keys"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
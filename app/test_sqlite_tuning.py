@@ -0,0 +1,110 @@
+"""
+Testes das escritas agrupadas do TunedSqliteDb (python -m unittest test_sqlite_tuning)
+"""
+
+import os
+import tempfile
+import time
+import unittest
+
+from agno.db.base import SessionType
+from agno.session.agent import AgentSession
+
+from sqlite_tuning import TunedSqliteDb
+
+
+def recent(db, user_id):
+    return db.get_sessions(session_type=SessionType.AGENT, user_id=user_id, limit=5)
+
+
+def new_session(session_id, user_id):
+    now = int(time.time())
+    return AgentSession(session_id=session_id, user_id=user_id, agent_id="a", created_at=now, updated_at=now)
+
+
+class TunedSqliteDbTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        # Janela longa: só a leitura (ou o flush) grava a fila durante o teste
+        self.db = TunedSqliteDb(db_file=os.path.join(self.tmp.name, "agent.db"), write_batch_ms=60_000)
+        self.batcher = self.db.write_batcher
+
+    def tearDown(self):
+        self.batcher.window = 0
+        self.db.flush()
+        self.db.db_engine.dispose()
+        self.tmp.cleanup()
+
+    def test_read_flushes_queued_writes(self):
+        self.db.upsert_session(new_session("s1", "u1"))
+        self.assertEqual(self.batcher.stats()["pending"], 1)
+        session = self.db.get_session("s1", SessionType.AGENT)
+        self.assertEqual(session.user_id, "u1")
+        self.assertEqual(self.batcher.stats()["pending"], 0)
+
+    def test_queued_write_invalidates_recent_sessions(self):
+        self.db.upsert_session(new_session("s1", "u1"))
+        self.assertEqual([s.session_id for s in recent(self.db, "u1")], ["s1"])
+        self.db.upsert_session(new_session("s2", "u1"))
+        self.assertEqual({s.session_id for s in recent(self.db, "u1")}, {"s1", "s2"})
+
+    def test_deserialize_false_writes_immediately(self):
+        row = self.db.upsert_session(new_session("s1", "u1"), deserialize=False)
+        self.assertEqual(row["session_id"], "s1")
+        self.assertEqual(self.batcher.stats()["pending"], 0)
+
+    def test_upsert_run_positional_goes_direct_and_keyword_is_queued(self):
+        self.db.upsert_session(new_session("s1", "u1"), deserialize=False)
+        run = {"run_id": "r1", "session_id": "s1", "user_id": "u1", "agent_id": "a", "created_at": int(time.time())}
+        self.db.upsert_run(run, "s1", "u1")
+        self.assertEqual(self.batcher.stats()["pending"], 0)
+
+        recent(self.db, "u1")
+        hits = self.db.session_cache.hits
+        self.db.upsert_run(run={**run, "run_id": "r2"}, session_id="s1", user_id="u1")
+        self.assertEqual(self.batcher.stats()["pending"], 1)
+        recent(self.db, "u1")
+        self.assertEqual(self.db.session_cache.hits, hits)
+        self.assertEqual(self.batcher.stats()["pending"], 0)
+
+    def test_failed_write_is_retried_then_counted_as_lost(self):
+        calls = []
+
+        def flaky_write():
+            calls.append("flaky")
+            if len(calls) < 2:
+                raise RuntimeError("disco cheio")
+
+        def broken_write():
+            raise RuntimeError("tabela corrompida")
+
+        self.batcher.submit(("test", "flaky"), flaky_write)
+        self.batcher.submit(("test", "broken"), broken_write)
+        for _ in range(self.batcher.retries + 1):
+            self.db.flush()
+
+        stats = self.batcher.stats()
+        self.assertEqual(calls, ["flaky", "flaky"])
+        self.assertEqual(stats["pending"], 0)
+        self.assertEqual(stats["lost"], 1)
+        self.assertEqual(stats["failures"], 1 + self.batcher.retries + 1)
+        self.assertIn("tabela corrompida", stats["last_error"])
+
+    def test_newer_write_replaces_the_retry(self):
+        written = []
+
+        def failed_write():
+            # Uma versão mais nova do registro chega enquanto o lote grava
+            self.batcher.submit(("test", 1), written.append, "nova")
+            raise RuntimeError("falhou")
+
+        self.batcher.submit(("test", 1), failed_write)
+        self.db.flush()
+        self.db.flush()
+        stats = self.batcher.stats()
+        self.assertEqual(written, ["nova"])
+        self.assertEqual((stats["failures"], stats["retried"], stats["lost"]), (1, 0, 0))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,182 @@
+"""
+Execução concorrente das chamadas de ferramenta de um mesmo turno
+Quando o Mistral pede várias ferramentas numa resposta (ex.: make_request em
+/users/1 e /posts?userId=1), elas rodam ao mesmo tempo, no máximo
+TOOL_PARALLELISM por turno, cada uma com TOOL_CALL_TIMEOUT segundos.
+Os resultados voltam ao modelo na ordem original das chamadas; uma chamada
+que estoura o tempo vira um erro só dela ("Tempo esgotado...").
+
+- execução síncrona (agent.run): o Agno roda as chamadas em série; aqui elas
+  rodam num pool de threads por turno
+- execução assíncrona (agent.arun, AgentOS): o Agno já dispara todas juntas;
+  aqui entram o limite por turno e o timeout
+"""
+
+import asyncio
+import contextvars
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from dataclasses import dataclass
+
+from agno.models.message import Message
+from agno.models.response import ModelResponse, ModelResponseEvent, ToolExecution
+from agno.tools.function import FunctionExecutionResult
+from agno.utils.log import log_debug, log_warning
+from agno.utils.timer import Timer
+
+from intent_router import RoutedMistralChat
+
+TOOL_PARALLELISM = int(os.getenv("TOOL_PARALLELISM", "4"))
+TOOL_CALL_TIMEOUT = float(os.getenv("TOOL_CALL_TIMEOUT", "30"))
+
+# Ferramentas de controle do usuário (HITL) seguem o caminho original do Agno
+_HITL_TOOLS = {"get_user_input", "ask_user"}
+
+# Limite de chamadas simultâneas do turno atual (execução assíncrona)
+_turn_semaphore = contextvars.ContextVar("tool_turn_semaphore", default=None)
+
+
+def timeout_message(function_call, timeout):
+    return f"Tempo esgotado: {function_call.function.name} não respondeu em {timeout:g}s."
+
+
+def _is_plain(function_call):
+    function = function_call.function
+    return not (
+        function.requires_confirmation
+        or function.requires_user_input
+        or function.external_execution
+        or function.name in _HITL_TOOLS
+    )
+
+
+@dataclass
+class ParallelToolsMistralChat(RoutedMistralChat):
+    """RoutedMistralChat que executa as chamadas de ferramenta de um turno em paralelo"""
+
+    tool_parallelism: int = TOOL_PARALLELISM
+    tool_call_timeout: float = TOOL_CALL_TIMEOUT
+
+    # ---------- execução síncrona ----------
+
+    def _timed_out(self, function_call, function_call_results):
+        """Eventos e mensagem de erro de uma chamada que estourou o tempo"""
+        error = timeout_message(function_call, self.tool_call_timeout)
+        log_warning(error)
+        function_call.error = error
+        yield ModelResponse(
+            content=function_call.get_call_str(),
+            tool_executions=[ToolExecution(tool_call_id=function_call.call_id, tool_name=function_call.function.name,
+                                           tool_args=function_call.arguments)],
+            event=ModelResponseEvent.tool_call_started.value,
+        )
+        result = Message(
+            role=self.tool_message_role,
+            content=error,
+            tool_call_id=function_call.call_id,
+            tool_name=function_call.function.name,
+            tool_args=function_call.arguments,
+            tool_call_error=True,
+        )
+        yield ModelResponse(
+            content=f"{function_call.get_call_str()} timed out after {self.tool_call_timeout:g}s. ",
+            tool_executions=[ToolExecution(tool_call_id=function_call.call_id, tool_name=function_call.function.name,
+                                           tool_args=function_call.arguments, tool_call_error=True, result=error)],
+            event=ModelResponseEvent.tool_call_completed.value,
+        )
+        function_call_results.append(result)
+
+    def run_function_calls(self, function_calls, function_call_results, additional_input=None,
+                           current_function_call_count=0, function_call_limit=None, result_store=None):
+        if (
+            self.tool_parallelism <= 1
+            or function_call_limit is not None
+            or not function_calls
+            or not all(_is_plain(fc) for fc in function_calls)
+        ):
+            yield from super().run_function_calls(
+                function_calls, function_call_results, additional_input=additional_input,
+                current_function_call_count=current_function_call_count,
+                function_call_limit=function_call_limit, result_store=result_store,
+            )
+            return
+
+        if additional_input is None:
+            additional_input = []
+
+        def run(function_call, started):
+            # Cada chamada junta seus eventos e resultados; a ordem é refeita abaixo
+            started["at"] = time.monotonic()
+            events, results, extra = [], [], []
+            for event in self.run_function_call(function_call, results, additional_input=extra,
+                                                result_store=result_store):
+                events.append(event)
+            return events, results, extra
+
+        log_debug(f"{len(function_calls)} chamadas de ferramenta em paralelo (até {self.tool_parallelism})")
+        executor = ThreadPoolExecutor(max_workers=min(self.tool_parallelism, len(function_calls)),
+                                      thread_name_prefix="tool-call")
+        try:
+            jobs = []
+            for function_call in function_calls:
+                started = {}
+                # Cada thread com uma cópia do contexto (contextvars do Agno)
+                context = contextvars.copy_context()
+                jobs.append((function_call, started, executor.submit(context.run, run, function_call, started)))
+
+            for function_call, started, future in jobs:
+                try:
+                    events, results, extra = self._wait(future, started)
+                except FutureTimeoutError:
+                    yield from self._timed_out(function_call, function_call_results)
+                    continue
+                yield from events
+                function_call_results.extend(results)
+                additional_input.extend(extra)
+        finally:
+            # Chamadas presas continuam na thread, mas o turno não espera por elas
+            executor.shutdown(wait=False, cancel_futures=True)
+
+        if additional_input:
+            function_call_results.extend(additional_input)
+
+    def _wait(self, future, started):
+        """Resultado da chamada; o prazo conta a partir do início dela (não da fila)"""
+        while True:
+            begin = started.get("at")
+            remaining = self.tool_call_timeout if begin is None else begin + self.tool_call_timeout - time.monotonic()
+            try:
+                return future.result(timeout=max(0.0, remaining))
+            except FutureTimeoutError:
+                begin = started.get("at")
+                if begin is not None and time.monotonic() >= begin + self.tool_call_timeout:
+                    raise
+
+    # ---------- execução assíncrona ----------
+
+    async def arun_function_calls(self, function_calls, *args, **kwargs):
+        # O Agno usa asyncio.gather: as tarefas herdam este contexto (e o semáforo do turno)
+        _turn_semaphore.set(asyncio.Semaphore(max(1, self.tool_parallelism)))
+        async for event in super().arun_function_calls(function_calls, *args, **kwargs):
+            yield event
+
+    async def arun_function_call(self, function_call):
+        semaphore = _turn_semaphore.get()
+        if semaphore is None:
+            return await self._arun_with_timeout(function_call)
+        async with semaphore:
+            return await self._arun_with_timeout(function_call)
+
+    async def _arun_with_timeout(self, function_call):
+        timer = Timer()
+        timer.start()
+        try:
+            return await asyncio.wait_for(super().arun_function_call(function_call), self.tool_call_timeout)
+        except asyncio.TimeoutError:
+            timer.stop()
+            error = timeout_message(function_call, self.tool_call_timeout)
+            log_warning(error)
+            function_call.error = error
+            return False, timer, function_call, FunctionExecutionResult(status="failure", error=error)
@@ -0,0 +1,158 @@
+"""
+Formatação das respostas de ferramentas antes de irem para o contexto do Mistral
+Endpoints como /photos (5000 itens) ou /comments (500) devolveriam o JSON
+inteiro para o prompt. Aqui a resposta é reduzida:
+- projeção de campos: só as colunas pedidas pelo modelo (fields) ou as
+  configuradas por endpoint (API_FIELDS="/photos=id,title;/comments=id,name,email");
+  objetos aninhados viram colunas com ponto ("address.city")
+- paginação: no máximo TOOL_MAX_ITEMS itens por chamada; o modelo pede a
+  próxima página com offset (com o cache HTTP, a página seguinte não vai à API)
+- teto de TOOL_MAX_BYTES: menos linhas e textos longos cortados até caber
+- codificação tabular compacta: listas de objetos viram
+  {"columns": [...], "rows": [[...], ...]} (os nomes dos campos aparecem uma vez)
+"""
+
+import json
+import os
+
+TOOL_MAX_ITEMS = int(os.getenv("TOOL_MAX_ITEMS", "20"))
+TOOL_MAX_BYTES = int(os.getenv("TOOL_MAX_BYTES", "6000"))
+TOOL_MAX_STRING = int(os.getenv("TOOL_MAX_STRING", "300"))
+# Campos por endpoint (prefixo do caminho): "/photos=id,title;/comments=id,name,email"
+API_FIELDS = os.getenv("API_FIELDS", "")
+
+# Cabeçalhos da resposta que interessam ao modelo (o resto só gasta tokens)
+TOOL_RESULT_HEADERS = ("Content-Type", "X-Cache", "X-Total-Count", "Link")
+
+
+def parse_endpoint_fields(value):
+    """ "/photos=id,title;/comments=id,name" -> {"/photos": ["id", "title"], ...}"""
+    fields = {}
+    for item in (value or "").split(";"):
+        if "=" in item:
+            endpoint, names = item.split("=", 1)
+            fields["/" + endpoint.strip().strip("/")] = [name.strip() for name in names.split(",") if name.strip()]
+    return fields
+
+
+ENDPOINT_FIELDS = parse_endpoint_fields(API_FIELDS)
+
+
+def fields_for(path, endpoint_fields=None):
+    """Campos configurados para o endpoint (prefixo mais longo), ou None"""
+    endpoint_fields = ENDPOINT_FIELDS if endpoint_fields is None else endpoint_fields
+    path = "/" + (path or "").split("?")[0].strip("/")
+    matches = [prefix for prefix in endpoint_fields if path == prefix or path.startswith(prefix + "/")]
+    return endpoint_fields[max(matches, key=len)] if matches else None
+
+
+def encode(value):
+    """JSON compacto (sem indentação nem espaços)"""
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"), default=str)
+
+
+def flatten(item, prefix=""):
+    """{"address": {"city": "X"}} -> {"address.city": "X"}"""
+    flat = {}
+    for key, value in item.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict) and value:
+            flat.update(flatten(value, f"{name}."))
+        else:
+            flat[name] = value
+    return flat
+
+
+def project(item, fields):
+    """Só os campos pedidos; um campo pai ("address") traz todas as colunas dele"""
+    flat = flatten(item)
+    if not fields:
+        return flat
+    return {
+        name: value for name, value in flat.items()
+        if any(name == field or name.startswith(field + ".") for field in fields)
+    }
+
+
+def clip(value, max_length):
+    """Cortar textos longos (recursivo)"""
+    if isinstance(value, str) and len(value) > max_length:
+        return value[:max_length] + "…"
+    if isinstance(value, list):
+        return [clip(v, max_length) for v in value]
+    if isinstance(value, dict):
+        return {k: clip(v, max_length) for k, v in value.items()}
+    return value
+
+
+def tabular(items):
+    """Lista de objetos -> {"columns", "rows"}; outras listas ficam como estão"""
+    if not items or not all(isinstance(item, dict) for item in items):
+        return items
+    columns = []
+    for item in items:
+        columns.extend(name for name in item if name not in columns)
+    return {"columns": columns, "rows": [[item.get(name) for name in columns] for item in items]}
+
+
+def _largest_list(data):
+    """Chave da maior lista de objetos dentro de um objeto ({"data": [...], "meta": ...})"""
+    lists = [
+        (len(value), key) for key, value in data.items()
+        if isinstance(value, list) and value and all(isinstance(item, dict) for item in value)
+    ]
+    return max(lists)[1] if lists else None
+
+
+def shape(data, fields=None, offset=0, limit=None, max_items=TOOL_MAX_ITEMS, max_bytes=TOOL_MAX_BYTES,
+          max_string=TOOL_MAX_STRING):
+    """(dados reduzidos, informações da página ou None)"""
+    container, key = None, None
+    if isinstance(data, dict):
+        key = _largest_list(data)
+        if key is None:
+            shaped = clip(project(data, fields) if fields else data, max_string)
+            return _fit_object(shaped, max_bytes, max_string), None
+        container = {k: clip(v, max_string) for k, v in data.items() if k != key}
+        data = data[key]
+    if not isinstance(data, list):
+        return clip(data, max_string), None
+
+    total = len(data)
+    offset = max(0, int(offset or 0))
+    size = max(1, min(int(limit or max_items), max_items))
+    items = [clip(project(item, fields) if isinstance(item, dict) else item, max_string)
+             for item in data[offset:offset + size]]
+
+    # Menos linhas até caber no teto de bytes (sempre pelo menos uma)
+    while True:
+        body = tabular(items)
+        if container is not None:
+            body = dict(container, **{key: body})
+        if len(items) <= 1 or len(encode(body).encode("utf-8")) <= max_bytes:
+            break
+        items = items[:max(1, len(items) * 3 // 4)]
+
+    page = {"total": total, "offset": offset, "returned": len(items)}
+    if key is not None:
+        page["list"] = key
+    if offset + len(items) < total:
+        page["next_offset"] = offset + len(items)
+    if len(items) == 1 and len(encode(body).encode("utf-8")) > max_bytes:
+        body = _fit_object(body, max_bytes, max_string)
+    return body, page
+
+
+def _fit_object(value, max_bytes, max_string):
+    """Um objeto só que não cabe: textos cada vez mais curtos; por fim, o JSON cortado"""
+    while len(encode(value).encode("utf-8")) > max_bytes and max_string > 20:
+        max_string //= 2
+        value = clip(value, max_string)
+    text = encode(value)
+    if len(text.encode("utf-8")) > max_bytes:
+        return {"truncated": True, "text": text.encode("utf-8")[:max_bytes].decode("utf-8", "ignore")}
+    return value
+
+
+def shape_headers(headers):
+    return {name: headers[name] for name in TOOL_RESULT_HEADERS if name in headers}
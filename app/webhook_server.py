@@ -2,199 +2,251 @@
 """
 Webhook Server para Assistente Niara
 Versão simplificada - sempre envia respostas para webhook específico
+Servidor ASGI (FastAPI + uvicorn): cada conversa em andamento é uma tarefa
+assíncrona, não um worker bloqueado, e as chamadas HTTP usam um pool keep-alive.
 """
 
 import os
 import sys
-import json
-import requests
-from flask import Flask, request, jsonify
+from contextlib import asynccontextmanager
 from datetime import datetime
 
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+from message_queue import MessageQueue, QueueFull
+from niara_relay import AGENT_NAME, RESPONSE_WEBHOOK_URL, NiaraRelay
+from single_flight import dedup_key, idempotency_key_from
+from streaming import STREAM_MODE, parse_flag
+
 if sys.platform == "win32":
     sys.stdout.reconfigure(encoding='utf-8')
     sys.stderr.reconfigure(encoding='utf-8')
 
-app = Flask(__name__)
 
-# Webhook fixo para respostas
-RESPONSE_WEBHOOK_URL = "https://webhook.fiqon.app/webhook/a02bb210-fabb-4bcf-9976-601014ae05af/05e23f61-0a62-48da-b7c1-a31507aab6a2"
-
-class NiaraWebhookServer:
+class NiaraWebhookServer(NiaraRelay):
     def __init__(self):
-        self.niara_api = os.getenv("NIARA_API_URL", "https://assistente-niara.onrender.com")
-        self.agent_name = "assistente-niara"
-        
-    def send_to_niara(self, message, user_id=None, metadata=None):
-        """Enviar mensagem para o Assistente Niara"""
-        try:
-            payload = {
-                "message": message,
-                "stream": False,
-                "webhook_url": RESPONSE_WEBHOOK_URL  # Sempre usar o webhook fixo
-            }
-            
-            if user_id:
-                payload["user_id"] = user_id
-            
-            if metadata:
-                payload["metadata"] = metadata
-            
-            response = requests.post(
-                f"{self.niara_api}/agents/{self.agent_name}/run",
-                json=payload,
-                timeout=30
-            )
-            
-            if response.status_code == 200:
-                return response.json()
-            else:
-                return {"error": f"Erro HTTP {response.status_code}: {response.text}"}
-                
-        except requests.exceptions.Timeout:
-            return {"error": "Timeout ao conectar com Niara"}
-        except requests.exceptions.ConnectionError:
-            return {"error": "Erro de conexão com Niara"}
-        except Exception as e:
-            return {"error": f"Erro inesperado: {str(e)}"}
-    
-    def send_webhook_response(self, webhook_url, data):
-        """Enviar resposta para webhook externo"""
-        try:
-            response = requests.post(
-                webhook_url,
-                json=data,
-                timeout=10
-            )
-            return response.status_code == 200
-        except Exception as e:
-            print(f"❌ Erro ao enviar webhook: {e}")
-            return False
+        super().__init__(
+            niara_api=os.getenv("NIARA_API_URL", "https://assistente-niara.onrender.com"),
+            agent_name=AGENT_NAME,
+            response_webhook_url=RESPONSE_WEBHOOK_URL,
+        )
 
 # Instanciar o servidor
 server = NiaraWebhookServer()
 
-@app.route("/", methods=["GET"])
-def home():
+# Fila de mensagens: /webhook enfileira, os workers chamam o agente e o webhook de resposta
+message_queue = MessageQueue(server.process_job)
+
+
+@asynccontextmanager
+async def lifespan(app):
+    """Abrir/fechar o pool de conexões HTTP e os workers da fila junto com o app"""
+    await server.start()
+    await message_queue.start()
+    yield
+    await message_queue.stop()
+    await server.close()
+
+
+app = FastAPI(title="Niara Webhook Server", lifespan=lifespan)
+
+
+async def get_json(request):
+    """Ler o corpo JSON da requisição (None se ausente ou inválido)"""
+    try:
+        return await request.json()
+    except Exception:
+        return None
+
+
+@app.get("/")
+async def home():
     """Página inicial"""
-    return jsonify({
+    return {
         "service": "Niara Webhook Server",
         "status": "online",
         "timestamp": datetime.now().isoformat(),
         "endpoints": {
             "webhook": "/webhook",
             "send": "/send",
-            "health": "/health"
+            "stream": "/stream",
+            "health": "/health",
+            "metrics": "/metrics"
         }
-    })
+    }
 
-@app.route("/health", methods=["GET"])
-def health():
+@app.get("/health")
+async def health():
     """Health check"""
-    return jsonify({
+    return {
         "status": "ok",
         "service": "Niara Webhook Server",
         "timestamp": datetime.now().isoformat()
-    })
+    }
 
-@app.route("/webhook", methods=["POST"])
-def webhook():
+@app.get("/metrics")
+async def metrics():
+    """Métricas da fila de mensagens, do outbox de respostas e da deduplicação"""
+    return {
+        "queue": message_queue.metrics(),
+        "outbox": await server.outbox.metrics() if server.outbox else None,
+        "dedup": server.single_flight.metrics(),
+        "timestamp": datetime.now().isoformat()
+    }
+
+@app.post("/webhook")
+async def webhook(request: Request):
     """Receber mensagens via webhook"""
     try:
         # Obter dados da requisição
-        data = request.get_json()
-        
+        data = await get_json(request)
+
         if not data:
-            return jsonify({"error": "No JSON data provided"}), 400
-        
+            return JSONResponse({"error": "No JSON data provided"}, status_code=400)
+
         # Extrair informações
         message = data.get("message", "")
         user_id = data.get("user_id", "webhook_user")
         metadata = data.get("metadata", {})
-        
+        # Streaming: a resposta chega ao webhook em pedaços (partial) antes da final
+        stream = parse_flag(data.get("stream"), default=STREAM_MODE)
+
         if not message:
-            return jsonify({"error": "Message is required"}), 400
-        
+            return JSONResponse({"error": "Message is required"}, status_code=400)
+
         print(f"📨 Mensagem recebida de {user_id}: {message}")
-        
-        # Enviar para o Assistente Niara
-        niara_response = server.send_to_niara(message, user_id, metadata)
-        
-        # Preparar resposta
-        response_data = {
-            "success": "error" not in niara_response,
+
+        # Reenvio/duplicata de uma mensagem em andamento: anexa ao job existente
+        idempotency_key = idempotency_key_from(request, data)
+        key = dedup_key(user_id, message, idempotency_key)
+        entry, is_new = server.single_flight.claim(key, keep=bool(idempotency_key))
+        if not is_new:
+            print(f"🔁 Mensagem duplicada de {user_id}, anexada ao job {entry['job_id']}")
+            return JSONResponse({
+                "success": True,
+                "accepted": True,
+                "deduplicated": True,
+                "job_id": entry["job_id"],
+                "user_id": user_id,
+                "message": message,
+                "timestamp": datetime.now().isoformat(),
+                "response_webhook": RESPONSE_WEBHOOK_URL
+            }, status_code=202)
+
+        # Enfileirar para o Assistente Niara (a resposta vai para o webhook fixo)
+        try:
+            job = message_queue.submit(user_id, message, metadata, dedup_key=key, stream=stream)
+        except QueueFull as e:
+            server.single_flight.release(key, e)
+            print(f"⚠️ Mensagem recusada ({user_id}): {e}")
+            return JSONResponse(
+                {"success": False, "user_id": user_id, "error": str(e)},
+                status_code=429 if e.per_user else 503,
+                headers={"Retry-After": "5"},
+            )
+        entry["job_id"] = job.id
+
+        return JSONResponse({
+            "success": True,
+            "accepted": True,
+            "deduplicated": False,
+            "job_id": job.id,
             "user_id": user_id,
             "message": message,
+            "stream": stream,
+            "queue_depth": message_queue.metrics()["depth"],
             "timestamp": datetime.now().isoformat(),
             "response_webhook": RESPONSE_WEBHOOK_URL
-        }
-        
-        # Se houver erro, incluir na resposta
-        if "error" in niara_response:
-            response_data["error"] = niara_response["error"]
-            print(f"❌ Erro do Niara: {niara_response['error']}")
-        else:
-            print(f"✅ Mensagem enviada para Niara, resposta será enviada para: {RESPONSE_WEBHOOK_URL}")
-        
-        return jsonify(response_data)
-        
+        }, status_code=202)
+
     except Exception as e:
         print(f"❌ Erro no webhook: {e}")
-        return jsonify({"error": str(e)}), 500
+        return JSONResponse({"error": str(e)}, status_code=500)
 
-@app.route("/send", methods=["POST"])
-def send_message():
+@app.post("/send")
+async def send_message(request: Request):
     """Enviar mensagem diretamente (sem webhook de resposta)"""
     try:
-        data = request.get_json()
-        
+        data = await get_json(request)
+
         if not data:
-            return jsonify({"error": "No JSON data provided"}), 400
-        
+            return JSONResponse({"error": "No JSON data provided"}, status_code=400)
+
         message = data.get("message", "")
         user_id = data.get("user_id", "anonymous")
         metadata = data.get("metadata", {})
-        
+
         if not message:
-            return jsonify({"error": "Message is required"}), 400
-        
+            return JSONResponse({"error": "Message is required"}, status_code=400)
+
         print(f"📤 Enviando mensagem para Niara: {message}")
-        
+
         # Enviar para o Assistente Niara
-        niara_response = server.send_to_niara(message, user_id, metadata)
-        
+        # (duplicatas em andamento aguardam o mesmo resultado, com uma única chamada ao modelo)
+        idempotency_key = idempotency_key_from(request, data)
+        key = dedup_key(user_id, message, idempotency_key, scope="send")
+        niara_response, deduplicated = await server.single_flight.run(
+            key, lambda: server.send_to_niara(message, user_id, metadata), keep=bool(idempotency_key)
+        )
+
         response_data = {
             "success": "error" not in niara_response,
             "user_id": user_id,
             "message": message,
             "response": niara_response.get("content", "Erro ao processar mensagem"),
+            "deduplicated": deduplicated,
             "timestamp": datetime.now().isoformat()
         }
-        
+
         if "error" in niara_response:
             response_data["error"] = niara_response["error"]
-        
-        return jsonify(response_data)
-        
+
+        return response_data
+
     except Exception as e:
         print(f"❌ Erro ao enviar mensagem: {e}")
-        return jsonify({"error": str(e)}), 500
+        return JSONResponse({"error": str(e)}, status_code=500)
+
+@app.post("/stream")
+async def stream_message(request: Request):
+    """Enviar mensagem e receber a resposta em pedaços (Server-Sent Events)"""
+    data = await get_json(request)
+
+    if not data:
+        return JSONResponse({"error": "No JSON data provided"}, status_code=400)
+
+    message = data.get("message", "")
+    user_id = data.get("user_id", "anonymous")
+    metadata = data.get("metadata", {})
+
+    if not message:
+        return JSONResponse({"error": "Message is required"}, status_code=400)
 
-@app.route("/test", methods=["GET"])
-def test():
+    print(f"📡 Streaming de mensagem para Niara: {message}")
+
+    return StreamingResponse(
+        server.stream_events(message, user_id, metadata),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.get("/test")
+async def test():
     """Endpoint de teste"""
     test_message = "Olá, como configurar o chatbot Asksuite?"
-    
+
     print(f"🧪 Testando com mensagem: {test_message}")
-    
-    niara_response = server.send_to_niara(test_message, "test_user")
-    
-    return jsonify({
+
+    niara_response = await server.send_to_niara(test_message, "test_user")
+
+    return {
         "test": True,
         "message": test_message,
         "niara_response": niara_response,
         "timestamp": datetime.now().isoformat()
-    })
+    }
 
 if __name__ == "__main__":
     print("🤖 Niara Webhook Server iniciando...")
@@ -204,12 +256,17 @@ if __name__ == "__main__":
     print("\n📋 Endpoints disponíveis:")
     print("   • GET  / - Informações do serviço")
     print("   • GET  /health - Health check")
-    print("   • POST /webhook - Receber mensagens")
+    print("   • POST /webhook - Receber mensagens (enfileira e responde 202)")
     print("   • POST /send - Enviar mensagens")
+    print("   • POST /stream - Enviar mensagens e receber a resposta em streaming (SSE)")
     print("   • GET  /test - Teste de conectividade")
+    print("   • GET  /metrics - Métricas da fila")
     print("\n🔧 Configurações:")
     print(f"   • Niara API: {server.niara_api}")
     print(f"   • Agent: {server.agent_name}")
     print(f"   • Response Webhook: {RESPONSE_WEBHOOK_URL}")
-    
-    app.run(host="0.0.0.0", port=5000, debug=True)
+    print("   • Servidor: ASGI (uvicorn) com pool HTTP keep-alive")
+    print(f"   • Fila: {message_queue.workers} workers, até {message_queue.max_pending} mensagens")
+    print(f"   • Streaming no webhook: {'ativado' if STREAM_MODE else 'desativado'} (campo \"stream\" por mensagem)")
+
+    uvicorn.run(app, host="0.0.0.0", port=5000)